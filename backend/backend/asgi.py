@@ -0,0 +1,14 @@
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+
+application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.EMBEDDINGS_WARMUP:
+    from chat.langchain_utils import warm_up_embeddings
+
+    warm_up_embeddings()
@@ -21,6 +21,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "chat.middleware.ServerTimingMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -50,6 +51,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = "backend.wsgi.application"
+ASGI_APPLICATION = "backend.asgi.application"
 
 DATABASES = {
     "default": {
@@ -69,8 +71,87 @@ STATIC_URL = "/static/"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 VECTORSTORE_ROOT = BASE_DIR / "vectorstores"
+# Extracted document text keyed by content hash, reused across KB rebuilds.
+TEXT_CACHE_ROOT = BASE_DIR / "textcache"
+# Per-document chunk embeddings keyed by content hash, embedding model and chunking;
+# agent indexes are assembled from them so unchanged documents are not re-embedded.
+SHARD_ROOT = BASE_DIR / "shards"
+
+# Embeddings are loaded once per process; set EMBEDDINGS_WARMUP=True to load at worker boot.
+EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+EMBEDDINGS_WARMUP = os.environ.get("EMBEDDINGS_WARMUP", "False") == "True"
+EMBEDDING_BATCH_SIZE = int(os.environ.get("EMBEDDING_BATCH_SIZE", 64))
+# ONNX Runtime backend, used for model names prefixed with "onnx:". Exported (and
+# int8-quantized) models are cached under ONNX_MODEL_ROOT; 0 threads = ORT default.
+ONNX_MODEL_ROOT = BASE_DIR / "onnx_models"
+EMBEDDING_ONNX_QUANTIZE = os.environ.get("EMBEDDING_ONNX_QUANTIZE", "True") == "True"
+EMBEDDING_ONNX_BATCH_SIZE = int(os.environ.get("EMBEDDING_ONNX_BATCH_SIZE", 32))
+EMBEDDING_ONNX_THREADS = int(os.environ.get("EMBEDDING_ONNX_THREADS", 0))
+# Query text -> vector cache per process; set QUERY_EMBEDDING_CACHE_PATH to also share
+# vectors between workers through an SQLite file.
+QUERY_EMBEDDING_CACHE_MAX_ENTRIES = int(os.environ.get("QUERY_EMBEDDING_CACHE_MAX_ENTRIES", 10_000))
+QUERY_EMBEDDING_CACHE_MAX_BYTES = int(os.environ.get("QUERY_EMBEDDING_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+QUERY_EMBEDDING_CACHE_PATH = os.environ.get("QUERY_EMBEDDING_CACHE_PATH", "")
+
+# Vectorstore builds run in a per-process background worker pool.
+BUILD_WORKERS = int(os.environ.get("BUILD_WORKERS", 2))
+# How often a job re-checks an agent that another process is building (seconds).
+BUILD_LOCK_RETRY_SECONDS = float(os.environ.get("BUILD_LOCK_RETRY_SECONDS", 5))
+# Processes used to parse the files of one build in parallel (1 disables the pool).
+PARSE_WORKERS = int(os.environ.get("PARSE_WORKERS", os.cpu_count() or 1))
+
+# Index selection for index_type="auto": exact flat below HNSW_MIN, HNSW below IVF_MIN, IVF above.
+FAISS_HNSW_MIN_CHUNKS = int(os.environ.get("FAISS_HNSW_MIN_CHUNKS", 20_000))
+FAISS_IVF_MIN_CHUNKS = int(os.environ.get("FAISS_IVF_MIN_CHUNKS", 500_000))
+
+# Threads for the BM25 leg of hybrid retrieval (runs alongside the vector search).
+RETRIEVAL_WORKERS = int(os.environ.get("RETRIEVAL_WORKERS", 8))
+
+# Default tokens of retrieved context per prompt (capped by the model's context window).
+# 1000 matches the original four 1000-character chunks, so packing never grows the prompt.
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", 1000))
+
+# Conversation sessions: recent turns kept verbatim in the prompt (tokens), the
+# target size of the rolling summary of older turns, and whether follow-up
+# questions are rewritten into standalone retrieval queries.
+CONVERSATION_WINDOW_TOKENS = int(os.environ.get("CONVERSATION_WINDOW_TOKENS", 1000))
+CONVERSATION_SUMMARY_TOKENS = int(os.environ.get("CONVERSATION_SUMMARY_TOKENS", 300))
+CONVERSATION_REWRITE_QUERIES = os.environ.get("CONVERSATION_REWRITE_QUERIES", "True") == "True"
+
+# Per-worker cache of loaded FAISS stores, bounded by total index size on disk.
+VECTORSTORE_CACHE_MAX_BYTES = int(os.environ.get("VECTORSTORE_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+VECTORSTORE_CACHE_MAX_ENTRIES = int(os.environ.get("VECTORSTORE_CACHE_MAX_ENTRIES", 32))
+
+# Reused provider clients / compiled QA chains per agent configuration.
+CHAIN_CACHE_MAX_ENTRIES = int(os.environ.get("CHAIN_CACHE_MAX_ENTRIES", 128))
+CHAIN_CACHE_TTL_SECONDS = float(os.environ.get("CHAIN_CACHE_TTL_SECONDS", 900))
+
+# Opt-in per-agent semantic answer cache (Agent.semantic_cache_enabled).
+SEMANTIC_CACHE_MAX_AGENTS = int(os.environ.get("SEMANTIC_CACHE_MAX_AGENTS", 256))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.environ.get("SEMANTIC_CACHE_MAX_ENTRIES", 512))
+SEMANTIC_CACHE_TTL_SECONDS = float(os.environ.get("SEMANTIC_CACHE_TTL_SECONDS", 24 * 3600))
+
+# /api/chat/batch limits.
+CHAT_BATCH_MAX_QUESTIONS = int(os.environ.get("CHAT_BATCH_MAX_QUESTIONS", 100))
+CHAT_BATCH_MAX_CONCURRENCY = int(os.environ.get("CHAT_BATCH_MAX_CONCURRENCY", 4))
+
+# /api/search: largest accepted k (results per request).
+SEARCH_MAX_K = int(os.environ.get("SEARCH_MAX_K", 50))
+
+# Threads that run embedding/search for the async chat views under ASGI; provider
+# calls themselves are awaited on the event loop and do not hold a thread.
+ASYNC_CPU_WORKERS = int(os.environ.get("ASYNC_CPU_WORKERS", os.cpu_count() or 1))
+
+# Bearer token required by /api/metrics; while empty the endpoint is disabled (403).
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
 
 CORS_ALLOW_ALL_ORIGINS = True
+CORS_EXPOSE_HEADERS = ["Server-Timing"]
+
+# Cursor pagination of the agent and document lists (?page_size= up to the maximum).
+API_PAGE_SIZE = int(os.environ.get("API_PAGE_SIZE", 50))
+API_MAX_PAGE_SIZE = int(os.environ.get("API_MAX_PAGE_SIZE", 500))
+
 REST_FRAMEWORK = {
     "DEFAULT_RENDERER_CLASSES": ["rest_framework.renderers.JSONRenderer"],
     "DEFAULT_PARSER_CLASSES": [
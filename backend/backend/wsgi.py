@@ -5,3 +5,10 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
 
 application = get_wsgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.EMBEDDINGS_WARMUP:
+    from chat.langchain_utils import warm_up_embeddings
+
+    warm_up_embeddings()
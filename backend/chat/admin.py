@@ -1,7 +1,7 @@
 # admin.py
 from django.contrib import admin
 
-from .models import Agent, UploadedDocument
+from .models import Agent, BuildJob, Conversation, UploadedDocument
 
 
 @admin.register(UploadedDocument)
@@ -19,3 +19,18 @@ class AgentAdmin(admin.ModelAdmin):
     search_fields = ("name", "owner__username", "owner__email", "model")
     readonly_fields = ("id", "created_at", "updated_at")
     filter_horizontal = ("documents",)  # nice UI for ManyToMany
+
+
+@admin.register(BuildJob)
+class BuildJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "agent", "owner", "status", "stage", "progress", "created_at", "finished_at")
+    list_filter = ("status", "created_at")
+    search_fields = ("agent__name", "owner__username")
+    readonly_fields = ("id", "created_at", "started_at", "finished_at")
+
+
+@admin.register(Conversation)
+class ConversationAdmin(admin.ModelAdmin):
+    list_display = ("id", "title", "agent", "owner", "created_at", "updated_at")
+    search_fields = ("title", "agent__name", "owner__username")
+    readonly_fields = ("id", "created_at", "updated_at")
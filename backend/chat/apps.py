@@ -1,6 +1,20 @@
 from django.apps import AppConfig
+from django.core.signals import request_started
+
+
+def _reap_orphaned_jobs(**kwargs):
+    from .jobs import reap_orphaned_jobs_once
+
+    reap_orphaned_jobs_once()
 
 
 class ChatConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "chat"
+
+    def ready(self):
+        # Jobs queued or running in a process that no longer exists will never finish.
+        # Reaped on the first request rather than when the server imports the app:
+        # ASGI workers import it inside a running event loop, where the ORM refuses
+        # to query, and Django runs sync request_started receivers off the loop.
+        request_started.connect(_reap_orphaned_jobs, dispatch_uid="chat.reap_orphaned_jobs")
@@ -0,0 +1,196 @@
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Hashable, Optional, Sequence
+
+import numpy as np
+
+
+class LRUCache:
+    """Thread-safe in-process LRU cache bounded by total entry size and entry count.
+
+    Each entry carries a caller-supplied ``size`` (bytes, or 1 for count-only caches);
+    least recently used entries are evicted until both bounds hold again. With ``ttl``
+    set, entries older than ``ttl`` seconds are treated as missing.
+    """
+
+    def __init__(
+        self,
+        max_bytes: Optional[int] = None,
+        max_entries: Optional[int] = None,
+        ttl: Optional[float] = None,
+    ):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[2] is not None and entry[2] <= time.monotonic():
+                self._remove(key)
+                self.evictions += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key: Hashable, value: Any, size: int = 1) -> bool:
+        """Store ``value``; returns False if it is larger than the whole cache."""
+        with self._lock:
+            self._remove(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                return False
+            expires_at = time.monotonic() + self.ttl if self.ttl else None
+            self._data[key] = (value, size, expires_at)
+            self._bytes += size
+            self._evict()
+            return True
+
+    def items(self) -> list:
+        """Return live (key, value) pairs without changing recency or hit counters."""
+        now = time.monotonic()
+        with self._lock:
+            return [(key, entry[0]) for key, entry in self._data.items() if entry[2] is None or entry[2] > now]
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._remove(key)
+            return default if entry is None else entry[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def _remove(self, key: Hashable):
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+        return entry
+
+    def _evict(self) -> None:
+        while self._data and (
+            (self.max_bytes is not None and self._bytes > self.max_bytes)
+            or (self.max_entries is not None and len(self._data) > self.max_entries)
+        ):
+            _, entry = self._data.popitem(last=False)
+            self._bytes -= entry[1]
+            self.evictions += 1
+
+
+class SemanticCache:
+    """Answers keyed by query embedding; a new query whose embedding has cosine
+    similarity >= ``threshold`` with a cached query is served the cached answer."""
+
+    def __init__(self, threshold: float, max_entries: int, ttl: Optional[float] = None):
+        self.threshold = threshold
+        self._entries = LRUCache(max_entries=max_entries, ttl=ttl)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(vector: Sequence[float]) -> np.ndarray:
+        vector = np.asarray(vector, dtype="float32")
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, vector: Sequence[float]) -> Optional[dict]:
+        """Return the cached payload for the most similar query above the threshold, if any."""
+        items = self._entries.items()
+        if items:
+            keys = [key for key, _ in items]
+            matrix = np.stack([entry["vector"] for _, entry in items])
+            scores = matrix @ self._normalize(vector)
+            best = int(np.argmax(scores))
+            if scores[best] >= self.threshold:
+                entry = self._entries.get(keys[best])  # refresh LRU position
+                if entry is not None:
+                    self.hits += 1
+                    return {**entry["payload"], "similarity": float(scores[best])}
+        self.misses += 1
+        return None
+
+    def store(self, query: str, vector: Sequence[float], payload: dict) -> None:
+        key = " ".join(query.lower().split())
+        self._entries.set(key, {"vector": self._normalize(vector), "payload": payload})
+
+    def stats(self) -> dict:
+        return {**self._entries.stats(), "hits": self.hits, "misses": self.misses}
+
+
+class DiskVectorCache:
+    """SQLite-backed vector cache shared by every worker on a host.
+
+    ``hits``/``misses`` count this process's lookups.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS vectors (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        try:
+            row = self._connection().execute("SELECT vector FROM vectors WHERE key = ?", (key,)).fetchone()
+        except sqlite3.OperationalError:
+            row = None  # locked or unavailable; treat as a miss and compute the vector
+        with self._lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return None if row is None else np.frombuffer(row[0], dtype="float32")
+
+    def set(self, key: str, vector: Sequence[float]) -> None:
+        try:
+            with self._connection() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO vectors (key, vector) VALUES (?, ?)",
+                    (key, np.asarray(vector, dtype="float32").tobytes()),
+                )
+        except sqlite3.OperationalError:
+            pass  # another worker holds the write lock; the vector is still cached in memory
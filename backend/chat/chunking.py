@@ -0,0 +1,150 @@
+import re
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from .context import CHARS_PER_TOKEN
+
+# Bump when chunk boundaries change so document shards are re-embedded.
+CHUNKER_VERSION = 1
+
+DEFAULT_CHUNK_SIZE = 1000
+DEFAULT_CHUNK_OVERLAP = 200
+
+# Preferred break points, strongest first: paragraph, line, sentence, word.
+SEPARATORS = ("\n\n", "\n", ". ", " ")
+
+# Markdown headings, numbered headings ("2.3 Results") and short all-caps title lines.
+_HEADING_RE = re.compile(
+    r"^(?:#{1,6}[ \t]+\S.*|\d+(?:\.\d+)*\.?[ \t]+[A-Z][^\n]{0,80}|[A-Z][A-Z0-9 \t\-:,&/()]{3,80})[ \t]*$",
+    re.MULTILINE,
+)
+
+
+class ChunkingConfig(NamedTuple):
+    """How pages are cut into chunks.
+
+    ``mode`` is ``recursive`` (``chunk_size``/``chunk_overlap`` in characters),
+    ``tokens`` (the same, measured in tokens) or ``structure`` (like ``recursive``,
+    but chunks never cross a heading and record it as ``section`` metadata).
+    """
+
+    mode: str = "recursive"
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+    chunk_overlap: int = DEFAULT_CHUNK_OVERLAP
+
+    @classmethod
+    def from_params(cls, params: Optional[dict]) -> "ChunkingConfig":
+        return cls(**{k: v for k, v in (params or {}).items() if v is not None})
+
+    def cache_key(self) -> dict:
+        return {"chunker": CHUNKER_VERSION, **self._asdict()}
+
+
+_tokenizer = None
+
+
+def count_tokens(text: str) -> int:
+    """Tokens in ``text`` with tiktoken's cl100k_base when installed, else the CHARS_PER_TOKEN estimate."""
+    global _tokenizer
+    if _tokenizer is None:
+        try:
+            import tiktoken
+
+            _tokenizer = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _tokenizer = False
+    if _tokenizer:
+        return len(_tokenizer.encode(text, disallowed_special=()))
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def windows(text: str, size: int, overlap: int, start: int = 0, stop: Optional[int] = None) -> Iterator[Tuple[int, int]]:
+    """Yield ``(start, end)`` offsets of chunks of ``text[start:stop]``.
+
+    Each chunk ends at the strongest separator in the second half of its window
+    (hard cut if there is none) and the next one starts about ``overlap`` characters
+    earlier, at a word boundary. Boundaries are found with ``str.rfind``/``find``
+    rather than by splitting and re-merging pieces, so cost is linear in the text.
+    """
+    stop = len(text) if stop is None else stop
+    while start < stop and text[start].isspace():
+        start += 1
+    while start < stop:
+        limit = start + size
+        if limit >= stop:
+            end = stop
+        else:
+            end = limit
+            for separator in SEPARATORS:
+                found = text.rfind(separator, start + size // 2, limit)
+                if found != -1:
+                    end = found + len(separator)
+                    break
+        chunk_end = end
+        while chunk_end > start and text[chunk_end - 1].isspace():
+            chunk_end -= 1
+        if chunk_end > start:
+            yield start, chunk_end
+        if end >= stop:
+            return
+
+        next_start = max(end - overlap, start + 1)
+        if next_start < end and overlap:
+            space = text.find(" ", next_start, end)
+            if space != -1:
+                next_start = space + 1
+        while next_start < stop and text[next_start].isspace():
+            next_start += 1
+        start = next_start
+
+
+def sections(text: str, max_size: int) -> List[Tuple[int, int, str]]:
+    """Split a page at heading lines into ``(start, end, heading)`` spans.
+
+    Consecutive short sections are merged while they fit in ``max_size`` (keeping
+    the first heading), so heading-dense documents do not produce tiny chunks.
+    """
+    starts = [match.start() for match in _HEADING_RE.finditer(text)]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+    bounds = starts + [len(text)]
+    spans: List[Tuple[int, int, str]] = []
+    for start, end in zip(bounds, bounds[1:]):
+        match = _HEADING_RE.match(text, start)
+        heading = match.group(0).strip().lstrip("#").strip() if match and match.end() <= end else ""
+        if spans and end - spans[-1][0] <= max_size:
+            spans[-1] = (spans[-1][0], end, spans[-1][2] or heading)
+        else:
+            spans.append((start, end, heading))
+    return spans
+
+
+def iter_chunks(pages: Iterable[Document], config: ChunkingConfig = ChunkingConfig()) -> Iterator[Document]:
+    """Lazily split pages into chunk Documents with ``start_index`` (offset into the page) metadata.
+
+    Pages are consumed one at a time, so a build never holds more than the current
+    page plus the chunks it has already taken.
+    """
+    if config.mode not in ("recursive", "tokens", "structure"):
+        raise ValueError(f"Unsupported chunking mode: {config.mode}")
+
+    for page in pages:
+        text = page.page_content
+        size, overlap = config.chunk_size, config.chunk_overlap
+        if config.mode == "tokens":
+            # Convert the token budget to characters at this page's own chars-per-token ratio.
+            ratio = len(text) / max(count_tokens(text), 1)
+            size, overlap = max(int(size * ratio), 1), int(overlap * ratio)
+
+        if config.mode == "structure":
+            spans = sections(text, size)
+        else:
+            spans = [(0, len(text), "")]
+
+        for span_start, span_end, heading in spans:
+            for start, end in windows(text, size, overlap, span_start, span_end):
+                metadata = {**page.metadata, "start_index": start}
+                if heading:
+                    metadata["section"] = heading
+                yield Document(page_content=text[start:end], metadata=metadata)
@@ -0,0 +1,115 @@
+import re
+from typing import List, Optional
+
+from django.conf import settings
+from langchain_core.documents import Document
+
+# Rough tokens-per-character ratio for English text across provider tokenizers; we
+# only need a conservative budget, not exact counts.
+CHARS_PER_TOKEN = 4
+# Tokens kept free for the system prompt, question and message framing.
+PROMPT_RESERVE_TOKENS = 512
+NEAR_DUPLICATE_JACCARD = 0.9
+_WORD_RE = re.compile(r"\w+")
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def context_budget(context_window: Optional[int], max_tokens: int, agent_budget: Optional[int] = None) -> int:
+    """Tokens available for retrieved context: the agent's budget (or the default),
+    capped by what the model's context window leaves after the answer and prompt."""
+    budget = agent_budget or settings.CONTEXT_TOKEN_BUDGET
+    if context_window:
+        budget = min(budget, context_window - max_tokens - PROMPT_RESERVE_TOKENS)
+    return max(budget, 1)
+
+
+def _shingles(text: str, size: int = 5) -> set:
+    words = _WORD_RE.findall(text.lower())
+    if len(words) <= size:
+        return {tuple(words)}
+    return {tuple(words[i : i + size]) for i in range(len(words) - size + 1)}
+
+
+def _is_near_duplicate(shingles: set, seen: List[set]) -> bool:
+    for other in seen:
+        overlap = len(shingles & other)
+        if overlap and overlap / len(shingles | other) >= NEAR_DUPLICATE_JACCARD:
+            return True
+        if shingles <= other:
+            return True
+    return False
+
+
+def merge_adjacent(docs: List[Document]) -> List[Document]:
+    """Merge chunks from the same page of one document whose character ranges overlap or touch.
+
+    Documents are told apart by ``source`` (the stored file), never by the display
+    ``name``, which several uploads may share.
+
+    Chunks are split with overlap, so neighbouring hits repeat text. Each page's
+    chunks are sorted by offset and swept once, so the result does not depend on
+    rank order and no two returned passages overlap. Merged passages keep the rank
+    and metadata of their best-ranked chunk. Chunks without ``start_index`` metadata
+    (stores built before it was recorded) are passed through unchanged.
+    """
+    passages = []  # (rank, start, text, metadata)
+    by_page = {}
+    for rank, doc in enumerate(docs):
+        start = doc.metadata.get("start_index")
+        if start is None:
+            passages.append((rank, None, doc.page_content, doc.metadata))
+            continue
+        key = (doc.metadata.get("source"), doc.metadata.get("page"))
+        by_page.setdefault(key, []).append((start, rank, doc))
+
+    for chunks in by_page.values():
+        chunks.sort(key=lambda chunk: (chunk[0], chunk[1]))
+        current = None  # [rank, start, end, text, metadata]
+        for start, rank, doc in chunks:
+            end = start + len(doc.page_content)
+            if current is not None and start <= current[2]:
+                # Stitch on the part beyond the current end without repeating the overlap.
+                if end > current[2]:
+                    current[3] += doc.page_content[current[2] - start :]
+                    current[2] = end
+                if rank < current[0]:
+                    current[0], current[4] = rank, doc.metadata
+                continue
+            if current is not None:
+                passages.append((current[0], current[1], current[3], current[4]))
+            current = [rank, start, end, doc.page_content, doc.metadata]
+        passages.append((current[0], current[1], current[3], current[4]))
+
+    passages.sort(key=lambda passage: passage[0])
+    return [
+        Document(
+            page_content=text,
+            metadata=metadata if start is None else {**metadata, "start_index": start},
+        )
+        for _, start, text, metadata in passages
+    ]
+
+
+def pack_context(docs: List[Document], token_budget: int) -> List[Document]:
+    """Merge overlapping chunks, drop near-duplicates and keep passages (in rank order)
+    until ``token_budget`` is used up; the first passage is truncated if it alone is too big."""
+    packed: List[Document] = []
+    seen: List[set] = []
+    used = 0
+    for doc in merge_adjacent(docs):
+        shingles = _shingles(doc.page_content)
+        if _is_near_duplicate(shingles, seen):
+            continue
+        cost = estimate_tokens(doc.page_content)
+        if used + cost > token_budget:
+            if not packed:
+                text = doc.page_content[: token_budget * CHARS_PER_TOKEN]
+                packed.append(Document(page_content=text, metadata=doc.metadata))
+            continue
+        packed.append(doc)
+        seen.append(shingles)
+        used += cost
+    return packed
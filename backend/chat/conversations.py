@@ -0,0 +1,132 @@
+from typing import List, NamedTuple, Sequence, Tuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+
+from . import metrics
+from .context import CHARS_PER_TOKEN, estimate_tokens
+from .models import Conversation, ConversationTurn
+
+ROLE_LABELS = {ConversationTurn.ROLE_USER: "User", ConversationTurn.ROLE_ASSISTANT: "Assistant"}
+TITLE_LENGTH = 80
+
+
+class History(NamedTuple):
+    """What the prompt sees of a conversation: the running summary plus recent ``(role, content)`` turns."""
+
+    summary: str = ""
+    turns: Sequence[Tuple[str, str]] = ()
+
+    @property
+    def is_empty(self) -> bool:
+        return not self.summary and not self.turns
+
+    def render(self) -> str:
+        lines = [f"(Summary of earlier messages) {self.summary}"] if self.summary else []
+        lines.extend(f"{ROLE_LABELS.get(role, role)}: {content}" for role, content in self.turns)
+        return "\n".join(lines)
+
+
+def split_window(turns: Sequence[ConversationTurn], budget: int) -> Tuple[list, list]:
+    """Split turns (oldest first) into ``(evicted, recent)``; ``recent`` is the longest
+    suffix whose stored token counts fit in ``budget``."""
+    used = 0
+    cut = len(turns)
+    for i in range(len(turns) - 1, -1, -1):
+        used += turns[i].tokens
+        if used > budget:
+            break
+        cut = i
+    return list(turns[:cut]), list(turns[cut:])
+
+
+def _load_window(conversation: Conversation) -> Tuple[List[ConversationTurn], List[ConversationTurn]]:
+    turns = conversation.turns.filter(id__gt=conversation.summarized_through).only("id", "role", "content", "tokens")
+    return split_window(list(turns), settings.CONVERSATION_WINDOW_TOKENS)
+
+
+def _summary_input(conversation: Conversation, evicted: List[ConversationTurn]) -> dict:
+    return {
+        "summary": conversation.summary or "(none)",
+        "turns": History(turns=[(turn.role, turn.content) for turn in evicted]).render(),
+        # Roughly 0.75 words per token.
+        "max_words": max(settings.CONVERSATION_SUMMARY_TOKENS * 3 // 4, 1),
+    }
+
+
+def _save_summary(conversation: Conversation, summary: str, evicted: List[ConversationTurn]) -> None:
+    # Hard cap in case the model ignores the requested length: the summary must not grow the prompt.
+    conversation.summary = summary.strip()[: settings.CONVERSATION_SUMMARY_TOKENS * CHARS_PER_TOKEN]
+    conversation.summarized_through = evicted[-1].id
+    conversation.save(update_fields=["summary", "summarized_through", "updated_at"])
+
+
+def prepare_history(conversation: Conversation, qa) -> History:
+    """Return the conversation's prompt history, first folding turns that no longer fit
+    the window into the summary with ``qa.summarize``.
+
+    Only turns evicted since the last request are summarized, so each call costs at
+    most one short model call and the rendered history stays within
+    ``CONVERSATION_WINDOW_TOKENS`` plus ``CONVERSATION_SUMMARY_TOKENS``.
+    """
+    evicted, recent = _load_window(conversation)
+    if evicted:
+        with metrics.timed("summarize"):
+            summary = qa.summarize.invoke(_summary_input(conversation, evicted))
+        _save_summary(conversation, summary, evicted)
+    return History(conversation.summary, [(turn.role, turn.content) for turn in recent])
+
+
+async def aprepare_history(conversation: Conversation, qa) -> History:
+    """``prepare_history`` for async views: database work in a thread, the summary via ``ainvoke``."""
+    evicted, recent = await sync_to_async(_load_window)(conversation)
+    if evicted:
+        with metrics.timed("summarize"):
+            summary = await qa.summarize.ainvoke(_summary_input(conversation, evicted))
+        await sync_to_async(_save_summary)(conversation, summary, evicted)
+    return History(conversation.summary, [(turn.role, turn.content) for turn in recent])
+
+
+def search_query(qa, history: History, message: str) -> str:
+    """The retrieval query for ``message``: rewritten to stand alone when there is history."""
+    if history.is_empty or not settings.CONVERSATION_REWRITE_QUERIES:
+        return message
+    with metrics.timed("rewrite"):
+        rewritten = qa.rewrite.invoke({"history": history.render(), "question": message})
+    return rewritten.strip() or message
+
+
+async def asearch_query(qa, history: History, message: str) -> str:
+    if history.is_empty or not settings.CONVERSATION_REWRITE_QUERIES:
+        return message
+    with metrics.timed("rewrite"):
+        rewritten = await qa.rewrite.ainvoke({"history": history.render(), "question": message})
+    return rewritten.strip() or message
+
+
+def record_exchange(conversation: Conversation, question: str, answer: str, query: str = "") -> None:
+    """Append a question/answer pair; the first question becomes the title if there is none."""
+    with transaction.atomic():
+        ConversationTurn.objects.bulk_create(
+            [
+                ConversationTurn(
+                    conversation=conversation,
+                    role=ConversationTurn.ROLE_USER,
+                    content=question,
+                    tokens=estimate_tokens(question),
+                    search_query=query if query != question else "",
+                ),
+                ConversationTurn(
+                    conversation=conversation,
+                    role=ConversationTurn.ROLE_ASSISTANT,
+                    content=answer,
+                    tokens=estimate_tokens(answer),
+                ),
+            ]
+        )
+        update_fields = ["updated_at"]
+        if not conversation.title:
+            conversation.title = " ".join(question.split())[:TITLE_LENGTH]
+            update_fields.append("title")
+        conversation.save(update_fields=update_fields)
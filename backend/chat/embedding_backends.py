@@ -0,0 +1,207 @@
+# Alternative embedding backends selected by an "<backend>:" prefix on the model
+# name (e.g. EMBEDDING_MODEL="onnx:sentence-transformers/all-MiniLM-L6-v2").
+import inspect
+import json
+import os
+import uuid
+from importlib.util import find_spec
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+ONNX_PREFIX = "onnx:"
+FP32_FILE = "model.onnx"
+INT8_FILE = "model_int8.onnx"
+
+
+def split_backend(model_name: str):
+    """Return ``(backend, model)`` for a possibly prefixed model name; the default backend is ``hf``."""
+    if model_name.startswith(ONNX_PREFIX):
+        return "onnx", model_name[len(ONNX_PREFIX) :]
+    return "hf", model_name
+
+
+def _hub_json(model_name: str, filename: str) -> Optional[object]:
+    """Read a sentence-transformers config file from the model repo (or local dir), if present."""
+    local = Path(model_name) / filename
+    try:
+        if local.exists():
+            return json.loads(local.read_text(encoding="utf-8"))
+        from huggingface_hub import hf_hub_download
+
+        return json.loads(Path(hf_hub_download(model_name, filename)).read_text(encoding="utf-8"))
+    except Exception:
+        return None
+
+
+def _require(*modules: str) -> None:
+    """Fail with one clear error naming every missing package, before any export work starts."""
+    missing = [module for module in modules if find_spec(module) is None]
+    if missing:
+        raise ImportError(
+            f"The ONNX embedding backend needs {', '.join(missing)}; install backend/requirements.txt."
+        )
+
+
+def export_onnx_model(model_name: str, root: Path, quantize: bool = True) -> Path:
+    """Export a transformer encoder to ONNX (once) and optionally int8-quantize its weights.
+
+    Files are cached under ``root/<model>/``; concurrent exports of the same model
+    write to temporary names and the last rename wins with identical content.
+    Raises ``ImportError`` if a package needed for the missing files is not installed.
+    """
+    target = Path(root) / model_name.replace("/", "__")
+    fp32_path = target / FP32_FILE
+    int8_path = target / INT8_FILE
+
+    needed = []
+    if not fp32_path.exists():
+        needed += ["torch", "transformers", "onnx"]
+    if quantize and not int8_path.exists():
+        needed += ["onnx", "onnxruntime"]
+    _require(*dict.fromkeys(needed))
+    target.mkdir(parents=True, exist_ok=True)
+
+    if not fp32_path.exists():
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModel.from_pretrained(model_name).eval()
+        sample = tokenizer(["hello world"], return_tensors="pt")
+        input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+
+        class Encoder(torch.nn.Module):
+            def __init__(self, inner):
+                super().__init__()
+                self.inner = inner
+
+            def forward(self, *inputs):
+                return self.inner(**dict(zip(input_names, inputs)), return_dict=False)[0]
+
+        dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names + ["last_hidden_state"]}
+        tmp_path = target / f"{FP32_FILE}.{uuid.uuid4().hex[:8]}"
+        # Newer torch defaults to the dynamo exporter (which needs onnxscript); the
+        # TorchScript exporter handles these encoders with dynamic axes as is.
+        options = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+        with torch.no_grad():
+            torch.onnx.export(
+                Encoder(model),
+                tuple(sample[name] for name in input_names),
+                str(tmp_path),
+                input_names=input_names,
+                output_names=["last_hidden_state"],
+                dynamic_axes=dynamic_axes,
+                opset_version=17,
+                **options,
+            )
+        os.replace(tmp_path, fp32_path)
+
+    if not quantize:
+        return fp32_path
+    if not int8_path.exists():
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        tmp_path = target / f"{INT8_FILE}.{uuid.uuid4().hex[:8]}"
+        quantize_dynamic(str(fp32_path), str(tmp_path), weight_type=QuantType.QInt8)
+        os.replace(tmp_path, int8_path)
+    return int8_path
+
+
+class OnnxEmbeddings(Embeddings):
+    """Sentence-transformers compatible embeddings run with ONNX Runtime on CPU.
+
+    Pooling, normalisation and maximum sequence length follow the model's
+    sentence-transformers config. Texts are sorted by length before batching so
+    each batch pads to a similar length, then returned in input order.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        model_root: Path,
+        quantize: bool = True,
+        batch_size: int = 32,
+        intra_op_threads: int = 0,
+    ):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+
+        modules = _hub_json(model_name, "modules.json") or []
+        pooling = _hub_json(model_name, "1_Pooling/config.json") or {}
+        bert_config = _hub_json(model_name, "sentence_bert_config.json") or {}
+        self.normalize = any(str(m.get("type", "")).endswith("Normalize") for m in modules)
+        self.cls_pooling = bool(pooling.get("pooling_mode_cls_token")) and not pooling.get("pooling_mode_mean_tokens")
+        self.max_length = int(bert_config.get("max_seq_length") or min(self.tokenizer.model_max_length, 512))
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        self.session = ort.InferenceSession(
+            str(export_onnx_model(model_name, model_root, quantize)), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    def _encode(self, texts: Sequence[str]) -> np.ndarray:
+        batch = self.tokenizer(
+            list(texts), padding=True, truncation=True, max_length=self.max_length, return_tensors="np"
+        )
+        feeds = {}
+        for name in self.input_names:
+            values = batch.get(name)
+            if values is None:  # e.g. token_type_ids for tokenizers that do not emit them
+                values = np.zeros_like(batch["input_ids"])
+            feeds[name] = values.astype("int64")
+        hidden = self.session.run(None, feeds)[0]
+
+        if self.cls_pooling:
+            pooled = hidden[:, 0]
+        else:
+            mask = batch["attention_mask"][..., None].astype(hidden.dtype)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        if self.normalize:
+            pooled = pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled.astype("float32")
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors: List[Optional[List[float]]] = [None] * len(texts)
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        for start in range(0, len(order), self.batch_size):
+            positions = order[start : start + self.batch_size]
+            for position, vector in zip(positions, self._encode([texts[i] for i in positions])):
+                vectors[position] = vector.tolist()
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+def embedding_parity(reference: Embeddings, candidate: Embeddings, texts: List[str], k: int = 10) -> dict:
+    """Compare two embedding models on ``texts``: per-text cosine similarity and top-k neighbour overlap."""
+    a = np.asarray(reference.embed_documents(texts), dtype="float32")
+    b = np.asarray(candidate.embed_documents(texts), dtype="float32")
+    a /= np.clip(np.linalg.norm(a, axis=1, keepdims=True), 1e-12, None)
+    b /= np.clip(np.linalg.norm(b, axis=1, keepdims=True), 1e-12, None)
+    cosine = (a * b).sum(axis=1)
+
+    k = min(k, len(texts) - 1)
+    overlap = 1.0
+    if k > 0:
+        neighbours_a = np.argsort(-(a @ a.T), axis=1)[:, 1 : k + 1]
+        neighbours_b = np.argsort(-(b @ b.T), axis=1)[:, 1 : k + 1]
+        overlap = float(
+            np.mean([len(set(x) & set(y)) / k for x, y in zip(neighbours_a.tolist(), neighbours_b.tolist())])
+        )
+    return {
+        "texts": len(texts),
+        "cosine_min": round(float(cosine.min()), 6),
+        "cosine_mean": round(float(cosine.mean()), 6),
+        f"neighbour_overlap_at_{k}": round(overlap, 4),
+    }
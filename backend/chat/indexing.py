@@ -0,0 +1,368 @@
+import json
+import math
+import re
+import sqlite3
+import threading
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Union
+
+import numpy as np
+from django.conf import settings
+from langchain_community.docstore.base import Docstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+INDEX_FILE = "index.faiss"
+DOCSTORE_FILE = "docstore.sqlite3"
+INDEX_PARAMS_FILE = "index_params.json"
+# Vectors kept next to compressed indexes for re-scoring (memory-mapped). float16 is
+# plenty to re-rank a candidate pool and halves the file; stores written with float32
+# vectors still load.
+EXACT_VECTORS_FILE = "vectors.npy"
+EXACT_VECTORS_DTYPE = "float16"
+
+# Lexical (BM25) index over chunk text. Hyphens/underscores are token characters so
+# identifiers such as ERR-4021 or PN_77 match as a whole.
+LEXICAL_TOKENIZER = "unicode61 tokenchars '-_'"
+_LEXICAL_TERM_RE = re.compile(r"[\w\-]+")
+
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+# faiss warns below ~39 training points per centroid and samples at most 256.
+IVF_MIN_POINTS_PER_LIST = 39
+IVF_MAX_POINTS_PER_LIST = 256
+
+# Vector storage: full float32, float16 / int8 scalar quantization, or 1-bit codes.
+QUANTIZATIONS = ("none", "fp16", "int8", "binary")
+_SQ_FACTORY = {"fp16": "SQfp16", "int8": "SQ8"}
+# int8 and binary indexes over-fetch this many candidates per hit and re-rank them
+# with the exact vectors; fp16 is close enough to float32 to rank directly. One bit
+# per dimension loses much more ordering than int8, hence the wider candidate pool.
+RESCORE_FACTORS = {"int8": 4, "binary": 10}
+
+
+def choose_index_type(n_vectors: int, requested: str = "auto") -> str:
+    """Resolve ``auto`` to flat, HNSW or IVF from the number of vectors."""
+    if requested and requested != "auto":
+        return requested
+    if n_vectors >= settings.FAISS_IVF_MIN_CHUNKS:
+        return "ivf"
+    if n_vectors >= settings.FAISS_HNSW_MIN_CHUNKS:
+        return "hnsw"
+    return "flat"
+
+
+def create_index(vectors: np.ndarray, index_type: str = "auto", quantization: str = "none"):
+    """Return an empty (trained, if needed) L2 index suited to ``vectors`` and its parameters.
+
+    IVF coarse quantizers and int8 scalar quantizers are trained on a random sample
+    of ``vectors``; callers add the vectors afterwards. ``quantization`` other than
+    ``none`` stores compressed vectors (see ``QUANTIZATIONS``); ``binary`` always
+    uses an exhaustive Hamming index.
+    """
+    import faiss
+
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f"Unsupported quantization: {quantization}")
+    n_vectors, dim = vectors.shape
+    index_type = "flat" if quantization == "binary" else choose_index_type(n_vectors, index_type)
+    params: Dict[str, object] = {"index_type": index_type, "dim": dim, "ntotal": n_vectors}
+    if quantization != "none":
+        params["quantization"] = quantization
+    rng = np.random.default_rng(0)
+
+    if quantization == "binary":
+        # Threshold each dimension at its mean so the bits split the data evenly.
+        thresholds = vectors.mean(axis=0)
+        factor = RESCORE_FACTORS[quantization]
+        index = RescoringIndex(faiss.IndexBinaryFlat(_binary_bits(dim)), thresholds=thresholds, factor=factor)
+        params.update({"thresholds": thresholds.tolist(), "rescore_factor": factor})
+        return index, params
+
+    if index_type == "hnsw":
+        if quantization == "none":
+            index = faiss.IndexHNSWFlat(dim, HNSW_M)
+        else:
+            index = faiss.index_factory(dim, f"HNSW{HNSW_M},{_SQ_FACTORY[quantization]}")
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        params.update({"M": HNSW_M, "ef_construction": HNSW_EF_CONSTRUCTION, "ef_search": HNSW_EF_SEARCH})
+    elif index_type == "ivf":
+        nlist = int(4 * math.sqrt(n_vectors))
+        nlist = max(1, min(nlist, n_vectors // IVF_MIN_POINTS_PER_LIST))
+        if quantization == "none":
+            index = faiss.IndexIVFFlat(faiss.IndexFlatL2(dim), dim, nlist)
+        else:
+            index = faiss.index_factory(dim, f"IVF{nlist},{_SQ_FACTORY[quantization]}")
+        sample_size = min(n_vectors, nlist * IVF_MAX_POINTS_PER_LIST)
+        sample = vectors[rng.choice(n_vectors, size=sample_size, replace=False)]
+        index.train(sample)
+        nprobe = min(nlist, max(8, nlist // 32))
+        faiss.extract_index_ivf(index).nprobe = nprobe
+        params.update({"nlist": nlist, "nprobe": nprobe, "train_size": sample_size})
+    elif index_type == "flat":
+        if quantization == "none":
+            index = faiss.IndexFlatL2(dim)
+        else:
+            index = faiss.index_factory(dim, _SQ_FACTORY[quantization])
+    else:
+        raise ValueError(f"Unsupported index type: {index_type}")
+
+    if not index.is_trained:
+        # Scalar quantizers learn per-dimension ranges (HNSW/flat + int8).
+        index.train(vectors[rng.choice(n_vectors, size=min(n_vectors, 65536), replace=False)])
+    if quantization in RESCORE_FACTORS:
+        index = RescoringIndex(index, factor=RESCORE_FACTORS[quantization])
+        params["rescore_factor"] = RESCORE_FACTORS[quantization]
+    return index, params
+
+
+def _binary_bits(dim: int) -> int:
+    return (dim + 7) // 8 * 8
+
+
+class RescoringIndex:
+    """A compressed FAISS index whose candidates are re-ranked with exact vectors.
+
+    Searches over-fetch ``k * factor`` candidates from ``inner`` (an int8 scalar
+    quantized index, or a binary index searched by Hamming distance when
+    ``thresholds`` is set), then rank them by L2 distance to the uncompressed
+    (float16) vectors, memory-mapped from disk so only candidate rows are paged in.
+    Exposes the ``search``/``add``/``ntotal``/``d`` subset used by the vectorstore.
+    """
+
+    def __init__(self, inner, exact: Optional[np.ndarray] = None, thresholds=None, factor: int = 4):
+        self.inner = inner
+        self.exact = exact
+        self.thresholds = None if thresholds is None else np.asarray(thresholds, dtype="float32")
+        self.factor = factor
+        self.d = len(self.thresholds) if self.thresholds is not None else inner.d
+
+    @property
+    def binary(self) -> bool:
+        return self.thresholds is not None
+
+    @property
+    def ntotal(self) -> int:
+        return self.inner.ntotal
+
+    def _codes(self, vectors: np.ndarray) -> np.ndarray:
+        if not self.binary:
+            return vectors
+        return np.packbits(vectors > self.thresholds, axis=1)
+
+    def add(self, vectors: np.ndarray) -> None:
+        vectors = np.ascontiguousarray(vectors, dtype="float32")
+        self.inner.add(self._codes(vectors))
+        exact = vectors.astype(EXACT_VECTORS_DTYPE)
+        self.exact = exact if self.exact is None else np.vstack([self.exact, exact])
+
+    def search(self, queries: np.ndarray, k: int):
+        queries = np.ascontiguousarray(queries, dtype="float32")
+        _, candidates = self.inner.search(self._codes(queries), min(self.ntotal, k * self.factor))
+        distances = np.full((len(queries), k), np.inf, dtype="float32")
+        labels = np.full((len(queries), k), -1, dtype="int64")
+        for row, (query, ids) in enumerate(zip(queries, candidates)):
+            # Sorted ids read the memory-mapped vectors sequentially.
+            ids = np.sort(ids[ids != -1])
+            if not len(ids):
+                continue
+            exact = ((np.asarray(self.exact[ids], dtype="float32") - query) ** 2).sum(axis=1)
+            top = np.argsort(exact)[:k]
+            labels[row, : len(top)] = ids[top]
+            distances[row, : len(top)] = exact[top]
+        return distances, labels
+
+
+def apply_search_params(index, params: Optional[dict]) -> None:
+    """Set query-time recall/latency knobs (``nprobe`` for IVF, ``ef_search`` for HNSW)."""
+    import faiss
+
+    if not params:
+        return
+    index = getattr(index, "inner", index)
+    if params.get("nprobe"):
+        try:
+            faiss.extract_index_ivf(index).nprobe = int(params["nprobe"])
+        except (RuntimeError, TypeError):
+            pass  # not an IVF index
+    if params.get("ef_search") and hasattr(index, "hnsw"):
+        index.hnsw.efSearch = int(params["ef_search"])
+
+
+def save_index_params(store_path: Path, params: dict) -> None:
+    (Path(store_path) / INDEX_PARAMS_FILE).write_text(json.dumps(params), encoding="utf-8")
+
+
+def load_index_params(store_path: Path) -> dict:
+    """Return the parameters persisted with a store (empty for stores built before they existed)."""
+    try:
+        return json.loads((Path(store_path) / INDEX_PARAMS_FILE).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def effective_search_params(index_params: dict, overrides: Optional[dict]) -> dict:
+    """Merge the defaults persisted with a store with per-agent overrides."""
+    params = {k: index_params[k] for k in ("nprobe", "ef_search") if k in index_params}
+    params.update({k: v for k, v in (overrides or {}).items() if v})
+    return params
+
+
+class SQLiteDocstore(Docstore):
+    """Read-only docstore backed by a SQLite table keyed by FAISS row position.
+
+    Only the chunks for top-k hits are read, so loading a store does not pull every
+    chunk text into memory (and needs no pickle).
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Stores are swapped in whole and never modified in place, hence immutable.
+            conn = sqlite3.connect(f"{self.path.resolve().as_uri()}?mode=ro&immutable=1", uri=True)
+            self._local.conn = conn
+        return conn
+
+    def search(self, search: str) -> Union[str, Document]:
+        row = self._connection().execute(
+            "SELECT text, metadata FROM chunks WHERE id = ?", (int(search),)
+        ).fetchone()
+        if row is None:
+            return f"ID {search} not found."
+        return Document(page_content=row[0], metadata=json.loads(row[1]))
+
+    def lexical_search(self, query: str, k: int) -> List[int]:
+        """Return chunk ids ranked by BM25 for the terms in ``query`` (any term may match)."""
+        terms = _LEXICAL_TERM_RE.findall(query)
+        if not terms:
+            return []
+        match = " OR ".join('"{}"'.format(term.replace('"', '""')) for term in terms)
+        try:
+            rows = self._connection().execute(
+                "SELECT rowid FROM chunks_fts WHERE chunks_fts MATCH ? ORDER BY bm25(chunks_fts) LIMIT ?",
+                (match, k),
+            ).fetchall()
+        except sqlite3.OperationalError:
+            return []  # store built without FTS5
+        return [row[0] for row in rows]
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        raise NotImplementedError("SQLiteDocstore is read-only; rebuild the store instead.")
+
+    def delete(self, ids: List) -> None:
+        raise NotImplementedError("SQLiteDocstore is read-only; rebuild the store instead.")
+
+
+class PositionIds(Mapping):
+    """``index_to_docstore_id`` for stores whose docstore ids are the FAISS row positions."""
+
+    def __init__(self, size: int):
+        self.size = size
+
+    def __getitem__(self, position: int) -> int:
+        if not 0 <= position < self.size:
+            raise KeyError(position)
+        return position
+
+    def __iter__(self):
+        return iter(range(self.size))
+
+    def __len__(self) -> int:
+        return self.size
+
+
+def write_store(store_path: Path, index, docs: Iterable[Document]) -> None:
+    """Write a FAISS index and its chunks (in index order) as index.faiss + docstore.sqlite3."""
+    import faiss
+
+    store_path = Path(store_path)
+    if isinstance(index, RescoringIndex):
+        np.save(store_path / EXACT_VECTORS_FILE, np.asarray(index.exact, dtype=EXACT_VECTORS_DTYPE))
+        write = faiss.write_index_binary if index.binary else faiss.write_index
+        write(index.inner, str(store_path / INDEX_FILE))
+    else:
+        faiss.write_index(index, str(store_path / INDEX_FILE))
+    conn = sqlite3.connect(store_path / DOCSTORE_FILE)
+    try:
+        with conn:
+            conn.execute("CREATE TABLE chunks (id INTEGER PRIMARY KEY, text TEXT NOT NULL, metadata TEXT NOT NULL)")
+            conn.executemany(
+                "INSERT INTO chunks (id, text, metadata) VALUES (?, ?, ?)",
+                ((i, doc.page_content, json.dumps(doc.metadata)) for i, doc in enumerate(docs)),
+            )
+        _write_lexical_index(conn)
+    finally:
+        conn.close()
+
+
+def _write_lexical_index(conn: sqlite3.Connection) -> None:
+    """Add an FTS5 inverted index over the chunks table (skipped if SQLite lacks FTS5)."""
+    try:
+        with conn:
+            conn.execute(
+                "CREATE VIRTUAL TABLE chunks_fts USING fts5("
+                f"text, content='chunks', content_rowid='id', tokenize=\"{LEXICAL_TOKENIZER}\")"
+            )
+            conn.execute("INSERT INTO chunks_fts(chunks_fts) VALUES ('rebuild')")
+    except sqlite3.OperationalError:
+        pass
+
+
+def _mmap_flags(faiss, index_type: str) -> int:
+    """faiss read flags that memory-map the bulk of ``index_type``, or 0 if this faiss cannot.
+
+    ``IO_FLAG_MMAP`` only maps IVF inverted lists; flat codes (the flat index, HNSW
+    storage, scalar-quantized codes) need ``IO_FLAG_MMAP_IFC`` (faiss >= 1.11). The
+    HNSW graph itself is always read into memory.
+    """
+    if index_type == "ivf":
+        return faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+    mmap_ifc = getattr(faiss, "IO_FLAG_MMAP_IFC", None)
+    return mmap_ifc | faiss.IO_FLAG_READ_ONLY if mmap_ifc is not None else 0
+
+
+def read_index(store_path: Path):
+    """Open index.faiss with its vectors memory-mapped (shared page cache across workers)
+    where faiss supports it for the index type.
+
+    Quantized stores that re-score come back wrapped in a RescoringIndex over the
+    memory-mapped exact vectors.
+    """
+    import faiss
+
+    store_path = Path(store_path)
+    path = str(store_path / INDEX_FILE)
+    params = load_index_params(store_path)
+    quantization = params.get("quantization", "none")
+    if quantization == "binary":
+        index = faiss.read_index_binary(path)
+    else:
+        flags = _mmap_flags(faiss, params.get("index_type", "flat"))
+        try:
+            index = faiss.read_index(path, flags) if flags else faiss.read_index(path)
+        except RuntimeError:
+            index = faiss.read_index(path)
+    if quantization in RESCORE_FACTORS:
+        exact = np.load(store_path / EXACT_VECTORS_FILE, mmap_mode="r")
+        return RescoringIndex(
+            index,
+            exact,
+            thresholds=params.get("thresholds"),
+            factor=params.get("rescore_factor", RESCORE_FACTORS[quantization]),
+        )
+    return index
+
+
+def open_store(store_path: Path, embeddings) -> FAISS:
+    index = read_index(store_path)
+    return FAISS(embeddings, index, SQLiteDocstore(Path(store_path) / DOCSTORE_FILE), PositionIds(index.ntotal))
+
+
+def is_compact_store(store_path: Path) -> bool:
+    return (Path(store_path) / DOCSTORE_FILE).exists()
@@ -0,0 +1,234 @@
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, transaction
+from django.utils import timezone
+
+from . import metrics
+from .langchain_utils import build_vectorstore, remove_store
+from .locks import hold_process_lock, process_alive, try_build_lock
+from .models import Agent, BuildJob
+
+# Identifies this process on the jobs it runs; the matching process lock tells other
+# processes whether those jobs still have a live worker.
+WORKER_ID = f"{os.getpid()}-{uuid.uuid4().hex[:12]}"
+ORPHANED_ERROR = "The build worker exited before the job finished."
+
+_executor: Optional[ThreadPoolExecutor] = None
+# Per-agent dispatch: at most one job per agent holds (or waits for) a pool slot in
+# this process; later jobs of the agent wait here instead of blocking a worker thread.
+_dispatch_lock = threading.Lock()
+_active_agents: Set[str] = set()
+_deferred: Dict[str, List] = {}
+_startup_reaped = threading.Event()
+
+
+class BuildCancelled(Exception):
+    """Raised from the progress callback when a job's cancellation was requested."""
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.BUILD_WORKERS, thread_name_prefix="kb-build")
+    return _executor
+
+
+def _worker_lock_name(worker_id: str) -> str:
+    return f"build-worker-{worker_id}"
+
+
+def _worker_alive(worker_id: str) -> bool:
+    if worker_id == WORKER_ID:
+        return True
+    return bool(worker_id) and process_alive(_worker_lock_name(worker_id))
+
+
+def reap_orphaned_jobs(agent: Optional[Agent] = None) -> int:
+    """Fail queued/running jobs whose worker process is gone (restart or crash).
+
+    Jobs live only in their process's thread pool, so such rows would otherwise stay
+    active forever and absorb every later rebuild request. Called on a process's first
+    request and before each enqueue; returns the number of jobs failed.
+    """
+    jobs = BuildJob.objects.filter(status__in=BuildJob.ACTIVE_STATUSES)
+    if agent is not None:
+        jobs = jobs.filter(agent=agent)
+    orphaned = [job.pk for job in jobs.only("pk", "worker_id") if not _worker_alive(job.worker_id)]
+    if not orphaned:
+        return 0
+    failed = BuildJob.objects.filter(pk__in=orphaned, status__in=BuildJob.ACTIVE_STATUSES).update(
+        status=BuildJob.STATUS_FAILED, error=ORPHANED_ERROR, finished_at=timezone.now()
+    )
+    metrics.builds_total.inc(failed, status=BuildJob.STATUS_FAILED)
+    return failed
+
+
+def reap_orphaned_jobs_once() -> None:
+    """Reap jobs left by earlier processes; only the first call in a process queries."""
+    with _dispatch_lock:
+        if _startup_reaped.is_set():
+            return
+        _startup_reaped.set()
+    try:
+        reap_orphaned_jobs()
+    except DatabaseError:
+        pass  # e.g. before the first migrate
+
+
+def enqueue_build(agent: Agent) -> BuildJob:
+    """Schedule a build of the agent's current documents after commit.
+
+    Jobs read the agent's documents when they start, so a job that is still queued
+    (by a live worker) already covers this request and is returned instead of a
+    duplicate. A running build works from an older snapshot and is superseded: it is
+    cancelled and the new job waits for it to stop.
+    """
+    hold_process_lock(_worker_lock_name(WORKER_ID))
+    reap_orphaned_jobs(agent)
+    with transaction.atomic():
+        pending = (
+            BuildJob.objects.select_for_update()
+            .filter(agent=agent, status=BuildJob.STATUS_QUEUED, cancel_requested=False)
+            .first()
+        )
+        if pending is not None:
+            return pending
+        BuildJob.objects.filter(agent=agent, status=BuildJob.STATUS_RUNNING).update(cancel_requested=True)
+        job = BuildJob.objects.create(owner=agent.owner, agent=agent, worker_id=WORKER_ID)
+    transaction.on_commit(lambda: _dispatch(job.id, str(agent.pk)))
+    return job
+
+
+def _dispatch(job_id, agent_id: str) -> None:
+    """Give the job a pool slot unless another job of its agent has one; then it waits its turn."""
+    with _dispatch_lock:
+        if agent_id in _active_agents:
+            _deferred.setdefault(agent_id, []).append(job_id)
+            return
+        _active_agents.add(agent_id)
+    _get_executor().submit(run_build, job_id, agent_id)
+
+
+def _release(agent_id: str) -> None:
+    """Hand the agent's slot to its next deferred job, if any."""
+    with _dispatch_lock:
+        waiting = _deferred.get(agent_id)
+        if not waiting:
+            _deferred.pop(agent_id, None)
+            _active_agents.discard(agent_id)
+            return
+        job_id = waiting.pop(0)
+    _get_executor().submit(run_build, job_id, agent_id)
+
+
+def cancel_job(job: BuildJob) -> BuildJob:
+    """Request cancellation; queued jobs stop immediately, running jobs at the next stage tick."""
+    BuildJob.objects.filter(pk=job.pk, status__in=BuildJob.ACTIVE_STATUSES).update(cancel_requested=True)
+    BuildJob.objects.filter(pk=job.pk, status=BuildJob.STATUS_QUEUED).update(
+        status=BuildJob.STATUS_CANCELLED, finished_at=timezone.now()
+    )
+    job.refresh_from_db()
+    return job
+
+
+def cancel_agent_jobs(agent: Agent) -> None:
+    for job in BuildJob.objects.filter(agent=agent, status__in=BuildJob.ACTIVE_STATUSES):
+        cancel_job(job)
+
+
+def run_build(job_id, agent_id: str) -> None:
+    """Execute a build job in a worker thread.
+
+    Builds of one agent are serialized across worker processes by the build lock.
+    It is only tried, never waited on: while another process builds the agent the
+    job stays queued (so later requests coalesce into it) and is retried after
+    ``BUILD_LOCK_RETRY_SECONDS`` without holding a pool thread.
+    """
+    close_old_connections()
+    retry = False
+    try:
+        with try_build_lock(agent_id) as acquired:
+            if acquired:
+                _run_build(job_id)
+            else:
+                retry = BuildJob.objects.filter(pk=job_id, status=BuildJob.STATUS_QUEUED).exists()
+    finally:
+        close_old_connections()
+        if retry:
+            timer = threading.Timer(
+                settings.BUILD_LOCK_RETRY_SECONDS, lambda: _get_executor().submit(run_build, job_id, agent_id)
+            )
+            timer.daemon = True
+            timer.start()
+        else:
+            _release(agent_id)
+
+
+def _run_build(job_id) -> None:
+    started = BuildJob.objects.filter(pk=job_id, status=BuildJob.STATUS_QUEUED, cancel_requested=False).update(
+        status=BuildJob.STATUS_RUNNING, started_at=timezone.now()
+    )
+    if not started:
+        return
+
+    job = BuildJob.objects.select_related("agent").get(pk=job_id)
+    agent = job.agent
+
+    def progress(stage: str, fraction: float) -> None:
+        updated = BuildJob.objects.filter(pk=job_id, cancel_requested=False).update(
+            stage=stage, progress=round(fraction, 4)
+        )
+        if not updated:
+            raise BuildCancelled()
+
+    try:
+        documents = list(agent.documents.all())
+        if not documents:
+            raise ValueError("Agent has no documents.")
+        # Digests recorded at upload spare hashing every file again on each build.
+        store_path = build_vectorstore(
+            [Path(doc.file.path) for doc in documents],
+            user_id=agent.owner_id,
+            agent_id=agent.id,
+            progress=progress,
+            index_type=agent.index_type,
+            chunking=agent.chunking,
+            quantization=agent.quantization,
+            digests=[doc.sha256 for doc in documents],
+            names=[doc.name for doc in documents],
+        )
+    except BuildCancelled:
+        _finish(job_id, BuildJob.STATUS_CANCELLED)
+        return
+    except Exception as exc:
+        _finish(job_id, BuildJob.STATUS_FAILED, error=str(exc))
+        return
+
+    agent_rows = Agent.objects.filter(pk=agent.pk)
+    if _cancel_requested(job_id) or not agent_rows.exists():
+        # A reset, delete or cancel raced the final swap; drop the index if nothing uses it.
+        if not agent_rows.exclude(store_path="").exists():
+            remove_store(store_path)
+        _finish(job_id, BuildJob.STATUS_CANCELLED)
+        return
+
+    agent_rows.update(store_path=str(store_path))
+    _finish(job_id, BuildJob.STATUS_SUCCEEDED)
+
+
+def _cancel_requested(job_id) -> bool:
+    return BuildJob.objects.filter(pk=job_id, cancel_requested=True).exists()
+
+
+def _finish(job_id, status: str, error: str = "") -> None:
+    fields = {"status": status, "error": error, "finished_at": timezone.now()}
+    if status == BuildJob.STATUS_SUCCEEDED:
+        fields["progress"] = 1.0
+    BuildJob.objects.filter(pk=job_id).update(**fields)
+    metrics.builds_total.inc(status=status)
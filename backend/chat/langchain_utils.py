@@ -1,121 +1,688 @@
+import asyncio
+import contextvars
+import hashlib
+import multiprocessing
+import os
 import shutil
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from itertools import repeat
 from pathlib import Path
-from typing import List, Optional, Tuple
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
 from operator import itemgetter
 
 from django.conf import settings
 
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from langchain_core.callbacks import BaseCallbackHandler
 from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnableLambda
+from langchain_core.runnables import Runnable, RunnableLambda
 
+import numpy as np
 from langchain_community.vectorstores import FAISS
 
+from . import metrics, retrieval
+from .cache import DiskVectorCache, LRUCache, SemanticCache
+from .chunking import ChunkingConfig, iter_chunks
+from .context import context_budget, estimate_tokens, pack_context
+from .embedding_backends import OnnxEmbeddings, split_backend
+from .indexing import (
+    INDEX_FILE,
+    apply_search_params,
+    create_index,
+    effective_search_params,
+    is_compact_store,
+    load_index_params,
+    open_store,
+    save_index_params,
+    write_store,
+)
+from .locks import SingleFlight, store_lock
+from .parsing import EXTRACTOR_VERSION, content_hash, extract_pages
+from .shards import Shard, load_shard, save_shard, shard_key
+
+
+# Parse results held at once per worker: one being consumed, one ready behind it.
+PARSE_WINDOW_PER_WORKER = 2
+
+
+def _bounded_map(executor, fn: Callable, window: int, *iterables) -> Iterator:
+    """``executor.map`` in input order with at most ``window`` tasks submitted or unconsumed,
+    so a large upload is neither queued whole nor buffered in memory ahead of the consumer."""
+    pending: Deque = deque()
+    for args in zip(*iterables):
+        if len(pending) >= window:
+            yield pending.popleft().result()
+        pending.append(executor.submit(fn, *args))
+    while pending:
+        yield pending.popleft().result()
+
+
+def iter_documents(
+    file_paths: List[Path],
+    on_file_done: Optional[Callable[[int], None]] = None,
+    digests: Optional[Sequence[Optional[str]]] = None,
+) -> Iterator[Document]:
+    """Yield one Document per non-empty page, parsing files in parallel processes.
+
+    Files are yielded in input order; ``on_file_done(n)`` is called after the
+    pages of the n-th file have been yielded. ``digests`` (content hashes, in the
+    same order) spare hashing the files again to find their cached text.
+    """
+    cache_root = str(settings.TEXT_CACHE_ROOT)
+    workers = min(settings.PARSE_WORKERS, len(file_paths))
+    digests = list(digests) if digests is not None else [None] * len(file_paths)
+
+    if workers > 1:
+        # Spawned (not forked) workers: builds run in threads, and forking a threaded
+        # process can deadlock the child.
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        results = _bounded_map(
+            executor, extract_pages, workers * PARSE_WINDOW_PER_WORKER, file_paths, repeat(cache_root), digests
+        )
+    else:
+        executor = None
+        results = (extract_pages(path, cache_root, digest) for path, digest in zip(file_paths, digests))
+
+    try:
+        for index, (path, pages) in enumerate(zip(file_paths, results), start=1):
+            for page_number, page_text in enumerate(pages, start=1):
+                text = page_text.strip()
+                if text:
+                    yield Document(
+                        page_content=text,
+                        metadata={"source": str(path), "page": page_number},
+                    )
+            if on_file_done is not None:
+                on_file_done(index)
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
 
 def load_documents(file_paths: List[Path]):
     """Load documents from different file types (without LangChain loaders)."""
-    from pypdf import PdfReader
-    import docx2txt
+    return list(iter_documents(file_paths))
 
-    documents: List[Document] = []
 
-    for path in file_paths:
-        suffix = path.suffix.lower()
-        text = ""
+# Process-wide embedding models keyed by model name. Loading sentence-transformers
+# weights takes seconds and hundreds of MB, so each worker loads a model once.
+_embeddings_registry: Dict[str, object] = {}
+_embeddings_stats: Dict[str, dict] = {}
+_embeddings_lock = threading.Lock()
+_embeddings_model_locks: Dict[str, threading.Lock] = {}
 
-        if suffix == ".pdf":
-            reader = PdfReader(str(path))
-            for page in reader.pages:
-                page_text = page.extract_text() or ""
-                text += page_text + "\n"
 
-        elif suffix in [".txt", ".md"]:
-            text = path.read_text(encoding="utf-8")
+def _rss_bytes() -> int:
+    """Return the current resident set size of this process (0 if unknown)."""
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return 0
+    # Fall back to peak RSS; reported in bytes on macOS and KiB elsewhere.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
 
-        elif suffix in [".docx", ".doc"]:
-            text = docx2txt.process(str(path))
 
-        else:
-            raise ValueError(f"Unsupported file type: {suffix}")
+# Query text -> embedding, keyed by model name. Chat retries and repeated questions
+# skip the CPU-bound encoder; the optional SQLite layer is shared across workers.
+# Vectors are kept as read-only float32 arrays and the cache is bounded by their bytes.
+_query_embedding_cache = LRUCache(
+    max_bytes=settings.QUERY_EMBEDDING_CACHE_MAX_BYTES, max_entries=settings.QUERY_EMBEDDING_CACHE_MAX_ENTRIES
+)
+_query_embedding_disk_cache: Optional[DiskVectorCache] = None
+_query_embedding_disk_lock = threading.Lock()
 
-        text = text.strip()
-        if not text:
-            continue
 
-        documents.append(
-            Document(
-                page_content=text,
-                metadata={"source": str(path)},
-            )
+def _get_disk_cache() -> Optional[DiskVectorCache]:
+    global _query_embedding_disk_cache
+    if _query_embedding_disk_cache is None and settings.QUERY_EMBEDDING_CACHE_PATH:
+        with _query_embedding_disk_lock:
+            if _query_embedding_disk_cache is None:
+                _query_embedding_disk_cache = DiskVectorCache(settings.QUERY_EMBEDDING_CACHE_PATH)
+    return _query_embedding_disk_cache
+
+
+def _cache_query_vector(key: Tuple[str, str], vector) -> np.ndarray:
+    vector = np.array(vector, dtype="float32")
+    vector.setflags(write=False)
+    _query_embedding_cache.set(key, vector, size=vector.nbytes)
+    return vector
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """Embeddings that memoize query vectors; document embedding is passed through."""
+
+    def __init__(self, inner: Embeddings, model_name: str):
+        self.inner = inner
+        self.model_name = model_name
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.inner.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_queries([text])[0].tolist()
+
+    def embed_queries(self, texts: List[str]) -> List[np.ndarray]:
+        """Embed queries as float32 arrays, computing only cache misses (in a single batch)."""
+        disk_cache = _get_disk_cache()
+        keys = [(self.model_name, " ".join(text.split())) for text in texts]
+        vectors: List[Optional[np.ndarray]] = [_query_embedding_cache.get(key) for key in keys]
+
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if disk_cache is not None:
+            for i in list(missing):
+                vector = disk_cache.get(self._disk_key(keys[i]))
+                if vector is not None:
+                    vectors[i] = _cache_query_vector(keys[i], vector)
+                    missing.remove(i)
+
+        if missing:
+            with metrics.timed("embed_query"):
+                computed = self.inner.embed_documents([keys[i][1] for i in missing])
+            for i, vector in zip(missing, computed):
+                vectors[i] = _cache_query_vector(keys[i], vector)
+                if disk_cache is not None:
+                    disk_cache.set(self._disk_key(keys[i]), vectors[i])
+        return vectors
+
+    @staticmethod
+    def _disk_key(key: Tuple[str, str]) -> str:
+        return hashlib.sha256("\0".join(key).encode("utf-8")).hexdigest()
+
+
+def query_embedding_cache_stats() -> dict:
+    stats = _query_embedding_cache.stats()
+    lookups = stats["hits"] + stats["misses"]
+    disk_cache = _query_embedding_disk_cache
+    stats["disk_hits"] = disk_cache.hits if disk_cache is not None else 0
+    stats["hit_rate"] = round((stats["hits"] + stats["disk_hits"]) / lookups, 4) if lookups else 0.0
+    return stats
+
+
+def _load_embeddings(model_name: str):
+    rss_before = _rss_bytes()
+    started = time.perf_counter()
+    backend, name = split_backend(model_name)
+    if backend == "onnx":
+        inner = OnnxEmbeddings(
+            name,
+            settings.ONNX_MODEL_ROOT,
+            quantize=settings.EMBEDDING_ONNX_QUANTIZE,
+            batch_size=settings.EMBEDDING_ONNX_BATCH_SIZE,
+            intra_op_threads=settings.EMBEDDING_ONNX_THREADS,
         )
+    else:
+        from langchain_community.embeddings import HuggingFaceEmbeddings
 
-    return documents
+        inner = HuggingFaceEmbeddings(model_name=name)
+    embeddings = CachedQueryEmbeddings(inner, model_name)
+    _embeddings_stats[model_name] = {
+        "load_seconds": round(time.perf_counter() - started, 3),
+        "rss_delta_bytes": max(_rss_bytes() - rss_before, 0),
+        "loaded_at": time.time(),
+    }
+    return embeddings
 
 
 def get_embeddings(model_hint: Optional[str] = None):
-    """Return HuggingFace embeddings."""
-    from langchain_community.embeddings import HuggingFaceEmbeddings
+    """Return embeddings for ``model_hint`` (default ``EMBEDDING_MODEL``), loading each model at most once per process.
+
+    Plain names load sentence-transformers models through HuggingFaceEmbeddings;
+    ``onnx:<name>`` runs the same model exported to ONNX Runtime (int8-quantized
+    unless ``EMBEDDING_ONNX_QUANTIZE=False``).
+    """
+    model_name = model_hint or settings.EMBEDDING_MODEL
+    embeddings = _embeddings_registry.get(model_name)
+    if embeddings is not None:
+        return embeddings
+
+    with _embeddings_lock:
+        model_lock = _embeddings_model_locks.setdefault(model_name, threading.Lock())
+    # Concurrent first requests for the same model wait for a single load.
+    with model_lock:
+        embeddings = _embeddings_registry.get(model_name)
+        if embeddings is None:
+            embeddings = _load_embeddings(model_name)
+            _embeddings_registry[model_name] = embeddings
+    return embeddings
+
+
+def embed_query(text: str, model_hint: Optional[str] = None) -> List[float]:
+    """Embed a single query with the shared embedding model."""
+    return get_embeddings(model_hint).embed_query(text)
+
+
+def register_embeddings(model_name: str, embeddings: Embeddings) -> None:
+    """Install an embeddings implementation under ``model_name`` (e.g. a local stand-in for benchmarks)."""
+    with _embeddings_lock:
+        _embeddings_registry[model_name] = CachedQueryEmbeddings(embeddings, model_name)
+
+
+def warm_up_embeddings(model_names: Optional[Iterable[str]] = None) -> Dict[str, dict]:
+    """Eagerly load embedding models (e.g. at worker boot) and return their load metrics."""
+    for model_name in model_names or [settings.EMBEDDING_MODEL]:
+        get_embeddings(model_name)
+    return embedding_stats()
+
+
+def embedding_stats() -> Dict[str, dict]:
+    """Return load time and memory metrics for the embedding models loaded in this process."""
+    return {name: dict(stats) for name, stats in _embeddings_stats.items()}
+
+
+ProgressCallback = Callable[[str, float], None]
+
+
+def _shard_config(model_name: str, chunking: ChunkingConfig) -> dict:
+    """Everything that determines a document's chunks and vectors besides its content."""
+    return {"embedding_model": model_name, "extractor": EXTRACTOR_VERSION, **chunking.cache_key()}
 
-    return HuggingFaceEmbeddings(
-        model_name=model_hint or "sentence-transformers/all-MiniLM-L6-v2"
-    )
 
+def build_vectorstore(
+    file_paths: List[Path],
+    user_id: int,
+    agent_id,
+    progress: Optional[ProgressCallback] = None,
+    index_type: str = "auto",
+    chunking: Optional[dict] = None,
+    quantization: str = "none",
+    digests: Optional[Sequence[Optional[str]]] = None,
+    names: Optional[Sequence[str]] = None,
+) -> Path:
+    """Build the FAISS store for a specific user/agent from documents and return its path.
+
+    ``progress(stage, fraction)`` is called as the parse, split, embed and save
+    stages advance; it may raise to abort the build. The new index is written to
+    a staging directory and swapped in at the end, so the previous index keeps
+    serving chats until the build completes. ``index_type`` is ``auto`` (chosen
+    from the chunk count), ``flat``, ``hnsw`` or ``ivf``. ``chunking`` holds the
+    agent's ``mode``/``chunk_size``/``chunk_overlap`` (see ``chunking.ChunkingConfig``).
+    ``quantization`` stores the index as ``fp16``/``int8`` scalar codes or ``binary``
+    Hamming codes instead of float32 (``none``); see ``indexing.create_index``.
+    ``digests`` are the files' content hashes (e.g. ``UploadedDocument.sha256``), in
+    ``file_paths`` order; files without one are hashed here. ``names`` (same order)
+    are recorded as each chunk's display-only ``name``, so citations show the uploaded
+    file name rather than the content-addressed storage name; ``source`` stays the
+    file path, which identifies the document.
+
+    Each document's chunks and vectors are kept as a shard keyed by content hash,
+    embedding model and chunking (``SHARD_ROOT``). Documents with a shard from any
+    earlier build, of any agent, are neither parsed nor embedded again; the index is
+    assembled from the shards.
+    """
+    report = progress or (lambda stage, fraction: None)
+    started = time.perf_counter()
 
-def build_vectorstore(file_paths: List[Path], user_id: int, agent_id) -> Tuple[FAISS, Path]:
-    """Build FAISS vectorstore from documents for a specific user/agent."""
-    documents = load_documents(file_paths)
-    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    split_docs = splitter.split_documents(documents)
     embeddings = get_embeddings()
-    vectorstore = FAISS.from_documents(split_docs, embeddings)
+    shard_root = Path(settings.SHARD_ROOT)
+    chunking_config = ChunkingConfig.from_params(chunking)
+    config = _shard_config(getattr(embeddings, "model_name", settings.EMBEDDING_MODEL), chunking_config)
+    # Identical content (e.g. deduplicated uploads) is indexed once.
+    paths_by_key: Dict[str, Path] = {}
+    digests_by_key: Dict[str, str] = {}
+    names_by_key: Dict[str, str] = {}
+    for path, digest, name in zip(
+        file_paths, digests or [None] * len(file_paths), names or [None] * len(file_paths)
+    ):
+        digest = digest or content_hash(path)
+        key = shard_key(digest, config)
+        if key not in paths_by_key:
+            paths_by_key[key], digests_by_key[key] = Path(path), digest
+            names_by_key[key] = name or Path(path).name
+    shards: Dict[str, Optional[Shard]] = {key: load_shard(shard_root, key) for key in paths_by_key}
+    missing = {str(path): key for key, path in paths_by_key.items() if shards[key] is None}
+    metrics.shard_lookups_total.inc(len(shards) - len(missing), result="hit")
+    metrics.shard_lookups_total.inc(len(missing), result="miss")
+
+    # Pages are chunked as they stream out of the parser pool, so only the chunks
+    # (not every parsed document) are held in memory.
+    missing_paths = [paths_by_key[key] for key in missing.values()]
+    pages = iter_documents(
+        missing_paths,
+        on_file_done=lambda n: report("parse", n / len(missing_paths)),
+        digests=[digests_by_key[key] for key in missing.values()],
+    )
+    new_chunks: Dict[str, List[Document]] = {key: [] for key in missing.values()}
+    with metrics.timed("build_parse_split"):
+        for chunk in iter_chunks(pages, chunking_config):
+            new_chunks[missing[chunk.metadata["source"]]].append(chunk)
+    report("split", 1.0)
+
+    texts = [doc.page_content for docs in new_chunks.values() for doc in docs]
+    new_vectors: List[List[float]] = []
+    batch_size = settings.EMBEDDING_BATCH_SIZE
+    with metrics.timed("build_embed"):
+        for start in range(0, len(texts), batch_size):
+            new_vectors.extend(embeddings.embed_documents(texts[start : start + batch_size]))
+            report("embed", len(new_vectors) / len(texts))
+    report("embed", 1.0)
+
+    offset = 0
+    for key, docs in new_chunks.items():
+        if not docs:
+            continue  # nothing extractable; the text cache makes retrying cheap
+        shard = Shard(
+            chunks=[
+                {"text": doc.page_content, "metadata": {k: v for k, v in doc.metadata.items() if k != "source"}}
+                for doc in docs
+            ],
+            vectors=np.asarray(new_vectors[offset : offset + len(docs)], dtype="float32"),
+        )
+        offset += len(docs)
+        save_shard(shard_root, key, shard)
+        shards[key] = shard
+
+    split_docs: List[Document] = []
+    blocks = []
+    for key in paths_by_key:
+        shard = shards[key]
+        if shard is None or not shard.chunks:
+            continue
+        split_docs.extend(
+            Document(
+                page_content=chunk["text"],
+                metadata={"source": str(paths_by_key[key]), "name": names_by_key[key], **chunk["metadata"]},
+            )
+            for chunk in shard.chunks
+        )
+        blocks.append(shard.vectors)
+    if not split_docs:
+        raise ValueError("No text could be extracted from the selected documents.")
+
+    with metrics.timed("build_index"):
+        vectors = np.concatenate(blocks).astype("float32", copy=False)
+        index, index_params = create_index(vectors, index_type, quantization)
+        index.add(vectors)
 
     root = Path(settings.VECTORSTORE_ROOT)
     root.mkdir(parents=True, exist_ok=True)
     store_path = root / f"user-{user_id}" / f"agent-{agent_id}"
+    staging_path = store_path.with_name(f"{store_path.name}.building-{uuid.uuid4().hex[:8]}")
+    staging_path.mkdir(parents=True, exist_ok=True)
+    try:
+        with metrics.timed("build_save"):
+            write_store(staging_path, index, split_docs)
+            save_index_params(staging_path, index_params)
+            report("save", 0.5)
+            with store_lock(store_path):
+                _swap_store(staging_path, store_path)
+    finally:
+        shutil.rmtree(staging_path, ignore_errors=True)
+    invalidate_vectorstore(store_path)
+    report("save", 1.0)
+    metrics.build_seconds.observe(time.perf_counter() - started)
+    return store_path
+
+
+def _swap_store(staging_path: Path, store_path: Path) -> None:
+    """Move a freshly built store into place, keeping the old one until the last moment."""
+    retired_path = None
     if store_path.exists():
-        shutil.rmtree(store_path, ignore_errors=True)
-    store_path.mkdir(parents=True, exist_ok=True)
-    vectorstore.save_local(str(store_path))
-    return vectorstore, store_path
+        retired_path = store_path.with_name(f"{store_path.name}.old-{uuid.uuid4().hex[:8]}")
+        os.replace(store_path, retired_path)
+    os.replace(staging_path, store_path)
+    if retired_path is not None:
+        shutil.rmtree(retired_path, ignore_errors=True)
 
 
-def load_vectorstore(store_path: Path) -> FAISS:
-    """Load FAISS vectorstore from disk."""
-    embeddings = get_embeddings()
-    return FAISS.load_local(
-        str(store_path),
-        embeddings,
-        allow_dangerous_deserialization=True,
-    )
+# Loaded vectorstores keyed by store path, bounded by the size of what they hold in
+# memory (the FAISS index, plus the pickled docstore for legacy stores) so per-worker
+# RAM stays capped.
+_vectorstore_cache = LRUCache(
+    max_bytes=settings.VECTORSTORE_CACHE_MAX_BYTES,
+    max_entries=settings.VECTORSTORE_CACHE_MAX_ENTRIES,
+)
+# A burst of chats to a cold agent shares one load instead of opening the index N times.
+_vectorstore_loads = SingleFlight()
+
+
+def store_version(store_path: Path) -> Optional[int]:
+    """Return the build version (index mtime) of a saved vectorstore, or None if missing."""
+    try:
+        return (Path(store_path) / INDEX_FILE).stat().st_mtime_ns
+    except OSError:
+        return None
+
+
+def _store_size(store_path: Path) -> int:
+    path = Path(store_path)
+    # Compact stores read chunk texts from SQLite on demand, so only the index counts.
+    names = [INDEX_FILE] if is_compact_store(path) else [INDEX_FILE, "index.pkl"]
+    return sum((path / name).stat().st_size for name in names if (path / name).exists())
+
+
+def load_vectorstore(store_path: Path, search_params: Optional[dict] = None) -> FAISS:
+    """Load FAISS vectorstore from disk, reusing the in-memory copy while it is current.
+
+    ``search_params`` (``nprobe``/``ef_search``) override the query-time defaults
+    persisted with the index.
+    """
+    key = str(store_path)
+    version = store_version(store_path)
+    cached = _vectorstore_cache.get(key)
+    # Another worker may have rebuilt the store; a changed version forces a reload.
+    # A missing version means a rebuild is mid-swap, so keep serving the cached copy.
+    if cached is not None and (version is None or cached[0] == version):
+        _, vectorstore, index_params = cached
+    else:
+        vectorstore, index_params = _vectorstore_loads.do((key, version), lambda: _open_vectorstore(store_path, version))
+
+    apply_search_params(vectorstore.index, effective_search_params(index_params, search_params))
+    return vectorstore
+
+
+def _open_vectorstore(store_path: Path, version: Optional[int]) -> Tuple[FAISS, dict]:
+    with metrics.timed("vectorstore_load"):
+        embeddings = get_embeddings()
+        if is_compact_store(store_path):
+            vectorstore = open_store(store_path, embeddings)
+        else:
+            # Stores built before the SQLite docstore keep their pickle until the next rebuild.
+            vectorstore = FAISS.load_local(
+                str(store_path),
+                embeddings,
+                allow_dangerous_deserialization=True,
+            )
+        index_params = load_index_params(store_path)
+    if version is not None:
+        _vectorstore_cache.set(str(store_path), (version, vectorstore, index_params), size=_store_size(store_path))
+    return vectorstore, index_params
+
+
+# Candidates retrieved per question; context packing trims them to the token budget.
+RETRIEVAL_K = 8
+
+
+def batch_similarity_search(
+    store_path: Path,
+    queries: List[str],
+    k: int = RETRIEVAL_K,
+    search_params: Optional[dict] = None,
+    retrieval_mode: str = "vector",
+) -> List[List[Document]]:
+    """Return the top-k documents for each query using one embedding call and one FAISS search."""
+    return retrieval.search(load_vectorstore(store_path, search_params), queries, k=k, mode=retrieval_mode)
+
+
+_cpu_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_cpu_executor() -> ThreadPoolExecutor:
+    global _cpu_executor
+    if _cpu_executor is None:
+        _cpu_executor = ThreadPoolExecutor(max_workers=settings.ASYNC_CPU_WORKERS, thread_name_prefix="async-cpu")
+    return _cpu_executor
+
+
+async def run_cpu_bound(func: Callable, *args):
+    """Run blocking work (query embedding, index loads and searches) off the event loop.
+
+    The pool is bounded by ``ASYNC_CPU_WORKERS`` so a burst of async chats queues for
+    CPU instead of spawning a thread per request; the caller's context (stage timings)
+    is carried into the worker thread.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_cpu_executor(), partial(contextvars.copy_context().run, func, *args))
+
+
+class SearchTarget(NamedTuple):
+    """A store to search in ``search_stores``; ``key`` identifies it in the results (e.g. an agent id)."""
+
+    key: str
+    store_path: Path
+    search_params: Optional[dict] = None
+
+
+def scored_search(
+    store_path: Path,
+    query: str,
+    k: int = RETRIEVAL_K,
+    search_params: Optional[dict] = None,
+    retrieval_mode: str = "vector",
+) -> List[Tuple[Document, float]]:
+    """Top-k ``(document, score)`` pairs for one query (see ``retrieval.search_with_scores``)."""
+    vectorstore = load_vectorstore(store_path, search_params)
+    return retrieval.search_with_scores(vectorstore, [query], k=k, mode=retrieval_mode)[0]
+
+
+def search_stores(
+    targets: List[SearchTarget], query: str, k: int = RETRIEVAL_K, retrieval_mode: str = "vector"
+) -> Tuple[List[Tuple[str, Document, float]], Dict[str, str]]:
+    """Search several stores concurrently and merge their hits by score.
+
+    Returns up to ``k`` ``(key, document, score)`` triples, best first, and the error
+    message of each store that failed (the others still answer). The query is
+    embedded once up front, so every store's search hits the query-embedding cache.
+    """
+    if not targets:
+        return [], {}
+    embed_query(query)
+    futures = {
+        target.key: _get_cpu_executor().submit(
+            contextvars.copy_context().run,
+            scored_search,
+            target.store_path,
+            query,
+            k,
+            target.search_params,
+            retrieval_mode,
+        )
+        for target in targets
+    }
+    hits: List[Tuple[str, Document, float]] = []
+    errors: Dict[str, str] = {}
+    for key, future in futures.items():
+        try:
+            hits.extend((key, doc, score) for doc, score in future.result())
+        except Exception as exc:
+            errors[key] = str(exc)
+    hits.sort(key=lambda hit: hit[2], reverse=True)
+    return hits[:k], errors
+
+
+def invalidate_vectorstore(store_path) -> None:
+    """Drop a vectorstore from this process's cache after it is rebuilt or removed."""
+    if store_path:
+        _vectorstore_cache.pop(str(store_path))
+
+
+def remove_store(store_path) -> None:
+    """Delete a store directory and drop it from this process's cache.
+
+    Holds the store lock so a removal cannot interleave with a build swapping in
+    a new index for the same agent.
+    """
+    if not store_path:
+        return
+    path = Path(store_path)
+    with store_lock(path):
+        invalidate_vectorstore(path)
+        if path.is_dir():
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def vectorstore_cache_stats() -> dict:
+    return {**_vectorstore_cache.stats(), "coalesced_loads": _vectorstore_loads.shared}
 
 
 def model_catalog():
     """Return a list of available models."""
     return [
-        {"id": "gemini-2.5-flash", "provider": "google", "label": "Google Gemini 2.5 Flash"},
-        {"id": "gpt-4", "provider": "openai", "label": "OpenAI GPT-4"},
-        {"id": "gpt-3.5-turbo", "provider": "openai", "label": "OpenAI GPT-3.5 Turbo"},
-        {"id": "claude-3-haiku", "provider": "anthropic", "label": "Anthropic Claude 3 Haiku"},
-        {"id": "gemini-pro", "provider": "google", "label": "Google Gemini Pro"},
-        {"id": "llama3-70b-8192", "provider": "groq", "label": "Groq Llama3-70B"},
+        {"id": "gemini-2.5-flash", "provider": "google", "label": "Google Gemini 2.5 Flash", "context_window": 1048576},
+        {"id": "gpt-4", "provider": "openai", "label": "OpenAI GPT-4", "context_window": 8192},
+        {"id": "gpt-3.5-turbo", "provider": "openai", "label": "OpenAI GPT-3.5 Turbo", "context_window": 16385},
+        {"id": "claude-3-haiku", "provider": "anthropic", "label": "Anthropic Claude 3 Haiku", "context_window": 200000},
+        {"id": "gemini-pro", "provider": "google", "label": "Google Gemini Pro", "context_window": 32760},
+        {"id": "llama3-70b-8192", "provider": "groq", "label": "Groq Llama3-70B", "context_window": 8192},
         {
             "id": "huggingface/mistralai/Mixtral-8x7B-Instruct-v0.1",
             "provider": "huggingface",
             "label": "HuggingFace Inference",
+            "context_window": 32768,
+        },
+        {
+            "id": "ollama/llama3",
+            "provider": "ollama",
+            "label": "Ollama Llama3 (local)",
+            "context_window": 8192,
         },
-        {"id": "ollama/llama3", "provider": "ollama", "label": "Ollama Llama3 (local)"},
     ]
 
 
-def get_chat_model(model: str, api_key: str, temperature: float, max_tokens: int):
-    """Return the selected chat model instance."""
-    provider = None
+# Provider clients and compiled QA chains are reused across requests so HTTP
+# connection pools (and their TLS sessions) survive between messages.
+_chat_model_cache = LRUCache(
+    max_entries=settings.CHAIN_CACHE_MAX_ENTRIES,
+    ttl=settings.CHAIN_CACHE_TTL_SECONDS,
+)
+_qa_chain_cache = LRUCache(
+    max_entries=settings.CHAIN_CACHE_MAX_ENTRIES,
+    ttl=settings.CHAIN_CACHE_TTL_SECONDS,
+)
+
+
+def _key_digest(api_key: str) -> str:
+    """Hash API keys before using them in cache keys."""
+    return hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()
+
+
+def model_info(model: str) -> Optional[dict]:
     for item in model_catalog():
         if item["id"] == model:
-            provider = item["provider"]
-            break
+            return item
+    return None
+
+
+def get_chat_model(model: str, api_key: str, temperature: float, max_tokens: int):
+    """Return the selected chat model instance, reusing a cached client when possible."""
+    key = (model, _key_digest(api_key), temperature, max_tokens)
+    llm = _chat_model_cache.get(key)
+    if llm is None:
+        llm = _create_chat_model(model, api_key, temperature, max_tokens)
+        _chat_model_cache.set(key, llm)
+    return llm
+
+
+def register_chat_model(model: str, api_key: str, temperature: float, max_tokens: int, llm) -> None:
+    """Install a chat model instance for a configuration (e.g. a fake LLM for benchmarks)."""
+    _chat_model_cache.set((model, _key_digest(api_key), temperature, max_tokens), llm)
+
+
+def _create_chat_model(model: str, api_key: str, temperature: float, max_tokens: int):
+    provider = (model_info(model) or {}).get("provider")
 
     if provider == "openai":
         from langchain_openai import ChatOpenAI
@@ -178,6 +745,44 @@ def get_chat_model(model: str, api_key: str, temperature: float, max_tokens: int
     raise ValueError(f"Unsupported model: {model}")
 
 
+class TokenUsageCallback(BaseCallbackHandler):
+    """Count LLM tokens per model, from provider usage metadata when reported.
+
+    Providers that report nothing (or only part of a stream) fall back to a
+    character-based estimate of the output.
+    """
+
+    def __init__(self, model: str):
+        self.model = model
+
+    def on_llm_end(self, response, **kwargs) -> None:
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    metrics.llm_tokens_total.inc(usage.get("input_tokens", 0), model=self.model, type="input")
+                    metrics.llm_tokens_total.inc(usage.get("output_tokens", 0), model=self.model, type="output")
+                else:
+                    metrics.llm_tokens_total.inc(estimate_tokens(generation.text), model=self.model, type="output")
+
+
+class QAChain(NamedTuple):
+    """The pieces of a retrieval QA chain.
+
+    ``retriever`` maps a query to documents, ``answer`` maps ``{"question", "docs"}``
+    (plus an optional rendered conversation ``history``) to the answer string, and
+    ``chain`` composes both from ``{"query"}``. ``rewrite`` turns ``{"history",
+    "question"}`` into a standalone search query and ``summarize`` folds
+    ``{"summary", "turns", "max_words"}`` into an updated conversation summary.
+    """
+
+    retriever: Runnable
+    answer: Runnable
+    chain: Runnable
+    rewrite: Runnable
+    summarize: Runnable
+
+
 def build_qa_chain(
     model: str,
     api_key: str,
@@ -185,6 +790,9 @@ def build_qa_chain(
     max_tokens: int,
     store_path: Path,
     system_prompt: str,
+    search_params: Optional[dict] = None,
+    retrieval_mode: str = "vector",
+    context_token_budget: Optional[int] = None,
 ):
     """Build a retrieval QA runnable chain with the given model and vectorstore.
 
@@ -192,18 +800,95 @@ def build_qa_chain(
         chain = build_qa_chain(...)
         answer = chain.invoke({"query": "Your question here"})
     """
+    return build_qa_parts(
+        model,
+        api_key,
+        temperature,
+        max_tokens,
+        store_path,
+        system_prompt,
+        search_params,
+        retrieval_mode,
+        context_token_budget,
+    ).chain
+
+
+def build_qa_parts(
+    model: str,
+    api_key: str,
+    temperature: float,
+    max_tokens: int,
+    store_path: Path,
+    system_prompt: str,
+    search_params: Optional[dict] = None,
+    retrieval_mode: str = "vector",
+    context_token_budget: Optional[int] = None,
+) -> QAChain:
+    """Like build_qa_chain(), but exposes retrieval and generation separately (e.g. for streaming)."""
     if not api_key:
         raise ValueError("API key is required to build the chat model.")
 
-    # 1) Load vectorstore + retriever
-    vectorstore = load_vectorstore(store_path)
-    retriever = vectorstore.as_retriever(search_kwargs={"k": 4})
+    cache_key = (
+        model,
+        _key_digest(api_key),
+        temperature,
+        max_tokens,
+        system_prompt or "",
+        str(store_path),
+        store_version(store_path),
+        tuple(sorted((search_params or {}).items())),
+        retrieval_mode,
+        context_token_budget,
+    )
+    parts = _qa_chain_cache.get(cache_key)
+    if parts is not None:
+        return parts
+    with metrics.timed("chain_build"):
+        parts = _compile_qa_parts(
+            model,
+            api_key,
+            temperature,
+            max_tokens,
+            store_path,
+            system_prompt,
+            search_params,
+            retrieval_mode,
+            context_token_budget,
+        )
+    _qa_chain_cache.set(cache_key, parts)
+    return parts
+
+
+def _compile_qa_parts(
+    model: str,
+    api_key: str,
+    temperature: float,
+    max_tokens: int,
+    store_path: Path,
+    system_prompt: str,
+    search_params: Optional[dict],
+    retrieval_mode: str,
+    context_token_budget: Optional[int],
+) -> QAChain:
+    # 1) Retriever: resolve the vectorstore per call so cached chains go through the
+    # vectorstore cache instead of pinning their own copy of the index.
+    def retrieve(query: str) -> List[Document]:
+        with metrics.timed("retrieve"):
+            vectorstore = load_vectorstore(store_path, search_params)
+            return retrieval.search(vectorstore, [query], k=RETRIEVAL_K, mode=retrieval_mode)[0]
+
+    retriever = RunnableLambda(retrieve)
+    info = model_info(model) or {}
+    token_budget = context_budget(info.get("context_window"), max_tokens, context_token_budget)
 
     def format_docs(docs: List[Document]) -> str:
-        return "\n\n".join(doc.page_content for doc in docs)
+        # Merge overlapping neighbours, drop near-duplicates and stay within the token budget.
+        return "\n\n".join(doc.page_content for doc in pack_context(docs, token_budget))
 
-    # 2) LLM
-    llm = get_chat_model(model, api_key, temperature, max_tokens)
+    # 2) LLM, reporting token usage to the metrics endpoint
+    llm = get_chat_model(model, api_key, temperature, max_tokens).with_config(
+        {"callbacks": [TokenUsageCallback(model)]}
+    )
 
     # 3) Prompt
     prompt = ChatPromptTemplate.from_messages(
@@ -215,21 +900,132 @@ def build_qa_chain(
             ),
             (
                 "human",
-                "Here is the relevant context:\n\n{context}\n\n"
+                "{history}Here is the relevant context:\n\n{context}\n\n"
                 "Question: {question}",
             ),
         ]
     )
 
-    # 4) Runnable chain: {"query": "..."} -> answer string
-    chain = (
+    def format_history(inputs: dict) -> str:
+        history = inputs.get("history")
+        return f"Conversation so far:\n{history}\n\n" if history else ""
+
+    # 4) Runnable chains: {"question", "docs"} -> answer, {"query": "..."} -> answer string
+    answer = (
         {
-            "question": itemgetter("query"),
-            "context": itemgetter("query") | retriever | RunnableLambda(format_docs),
+            "question": itemgetter("question"),
+            "context": itemgetter("docs") | RunnableLambda(format_docs),
+            "history": RunnableLambda(format_history),
         }
         | prompt
         | llm
         | StrOutputParser()
     )
+    chain = {"question": itemgetter("query"), "docs": itemgetter("query") | retriever} | answer
+
+    # 5) Conversation helpers: standalone retrieval queries and the rolling summary
+    rewrite = (
+        ChatPromptTemplate.from_messages(
+            [
+                (
+                    "system",
+                    "Rewrite the user's latest message as a standalone search query for a document "
+                    "search engine, resolving pronouns and references from the conversation. "
+                    "Reply with the query only.",
+                ),
+                ("human", "Conversation:\n{history}\n\nLatest message: {question}"),
+            ]
+        )
+        | llm
+        | StrOutputParser()
+    )
+    summarize = (
+        ChatPromptTemplate.from_messages(
+            [
+                (
+                    "system",
+                    "You maintain a running summary of a conversation. Merge the new lines into the "
+                    "current summary, keeping facts, names, decisions and open questions. "
+                    "Reply with the updated summary only, in at most {max_words} words.",
+                ),
+                ("human", "Current summary:\n{summary}\n\nNew lines:\n{turns}"),
+            ]
+        )
+        | llm
+        | StrOutputParser()
+    )
+
+    return QAChain(retriever=retriever, answer=answer, chain=chain, rewrite=rewrite, summarize=summarize)
+
+
+def source_name(doc: Document) -> str:
+    """File name to cite for a chunk: its upload name, or the stored file's name in older stores."""
+    return doc.metadata.get("name") or Path(doc.metadata.get("source", "")).name
+
+
+def source_metadata(docs: List[Document]) -> List[dict]:
+    """Describe retrieved chunks for API responses (file name and page)."""
+    return [{"source": source_name(doc), "page": doc.metadata.get("page")} for doc in docs]
+
+
+# Opt-in per-agent semantic answer caches. The fingerprint covers everything that
+# changes answers (store version, model, prompt, retrieval settings), so editing an
+# agent or rebuilding its KB starts a fresh cache and the stale one ages out.
+_semantic_caches = LRUCache(max_entries=settings.SEMANTIC_CACHE_MAX_AGENTS)
+
+
+def get_semantic_cache(fingerprint: tuple, threshold: float) -> SemanticCache:
+    cache = _semantic_caches.get(fingerprint)
+    if cache is None:
+        cache = SemanticCache(
+            threshold,
+            max_entries=settings.SEMANTIC_CACHE_MAX_ENTRIES,
+            ttl=settings.SEMANTIC_CACHE_TTL_SECONDS,
+        )
+        _semantic_caches.set(fingerprint, cache)
+    cache.threshold = threshold
+    return cache
+
+
+def semantic_cache_stats() -> dict:
+    return {"agents": len(_semantic_caches), **_semantic_caches.stats()}
+
+
+def chain_cache_stats() -> dict:
+    return {"chat_models": _chat_model_cache.stats(), "qa_chains": _qa_chain_cache.stats()}
+
+
+def _cache_metrics():
+    """Expose the in-process cache counters on the metrics endpoint."""
+    caches = {
+        "vectorstore": _vectorstore_cache.stats(),
+        "qa_chain": _qa_chain_cache.stats(),
+        "chat_model": _chat_model_cache.stats(),
+        "query_embedding": query_embedding_cache_stats(),
+    }
+    semantic = {"hits": 0, "misses": 0, "entries": 0, "evictions": 0, "bytes": 0}
+    for _, cache in _semantic_caches.items():
+        for name, value in cache.stats().items():
+            if name in semantic:
+                semantic[name] += value
+    caches["semantic"] = semantic
+
+    for name, metric_type, help, stat in (
+        ("rag_cache_hits_total", "counter", "Cache hits by cache.", "hits"),
+        ("rag_cache_misses_total", "counter", "Cache misses by cache.", "misses"),
+        ("rag_cache_evictions_total", "counter", "Cache evictions by cache.", "evictions"),
+        ("rag_cache_entries", "gauge", "Entries currently held by cache.", "entries"),
+        ("rag_cache_bytes", "gauge", "Bytes currently held by cache (where sized).", "bytes"),
+    ):
+        for cache_name, stats in caches.items():
+            yield name, metric_type, help, {"cache": cache_name}, stats.get(stat, 0)
+    yield (
+        "rag_query_embedding_disk_hits_total",
+        "counter",
+        "Query embeddings served from the shared SQLite cache.",
+        {},
+        caches["query_embedding"]["disk_hits"],
+    )
+
 
-    return chain
+metrics.register_collector(_cache_metrics)
@@ -0,0 +1,162 @@
+import hashlib
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, ContextManager, Dict, Hashable, Iterator, TypeVar
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows: locks only cover threads of one process
+    fcntl = None
+
+LOCK_DIR = ".locks"
+
+T = TypeVar("T")
+
+_thread_locks: Dict[str, threading.Lock] = {}
+_thread_locks_guard = threading.Lock()
+
+
+def _thread_lock(name: str) -> threading.Lock:
+    with _thread_locks_guard:
+        return _thread_locks.setdefault(name, threading.Lock())
+
+
+@contextmanager
+def file_lock(name: str) -> Iterator[None]:
+    """Hold an exclusive lock called ``name`` across the threads and worker processes of this host.
+
+    Backed by ``flock`` on a file under ``VECTORSTORE_ROOT/.locks``; the kernel releases
+    it if the holder dies, so a crashed worker cannot leave an agent locked.
+    """
+    lock_dir = Path(settings.VECTORSTORE_ROOT) / LOCK_DIR
+    lock_dir.mkdir(parents=True, exist_ok=True)
+    with _thread_lock(name):
+        if fcntl is None:
+            yield
+            return
+        with open(lock_dir / f"{name}.lock", "a+b") as handle:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+
+
+@contextmanager
+def try_file_lock(name: str) -> Iterator[bool]:
+    """Like ``file_lock``, but never waits: yields whether the lock was acquired."""
+    lock_dir = Path(settings.VECTORSTORE_ROOT) / LOCK_DIR
+    lock_dir.mkdir(parents=True, exist_ok=True)
+    thread_lock = _thread_lock(name)
+    if not thread_lock.acquire(blocking=False):
+        yield False
+        return
+    try:
+        if fcntl is None:
+            yield True
+            return
+        with open(lock_dir / f"{name}.lock", "a+b") as handle:
+            try:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+    finally:
+        thread_lock.release()
+
+
+def build_lock(agent_id) -> ContextManager[None]:
+    """Serialize vectorstore builds of one agent."""
+    return file_lock(f"build-agent-{agent_id}")
+
+
+def try_build_lock(agent_id) -> ContextManager[bool]:
+    """Non-blocking ``build_lock``: yields False while another thread or process builds the agent."""
+    return try_file_lock(f"build-agent-{agent_id}")
+
+
+_process_locks: Dict[str, object] = {}
+
+
+def hold_process_lock(name: str) -> None:
+    """Take ``name`` for the rest of this process's life (the kernel drops it when the process exits).
+
+    ``process_alive(name)`` in any process of the host then tells whether the holder still runs.
+    """
+    if name in _process_locks or fcntl is None:
+        return
+    lock_dir = Path(settings.VECTORSTORE_ROOT) / LOCK_DIR
+    lock_dir.mkdir(parents=True, exist_ok=True)
+    handle = open(lock_dir / f"{name}.lock", "a+b")
+    fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+    _process_locks[name] = handle
+
+
+def process_alive(name: str) -> bool:
+    """Whether a process still holds ``name`` via ``hold_process_lock``.
+
+    Without ``flock`` (Windows) other processes cannot be checked and are assumed alive.
+    """
+    if name in _process_locks or fcntl is None:
+        return True
+    path = Path(settings.VECTORSTORE_ROOT) / LOCK_DIR / f"{name}.lock"
+    if not path.exists():
+        return False
+    with open(path, "a+b") as handle:
+        try:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return True
+        fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+    path.unlink(missing_ok=True)
+    return False
+
+
+def store_lock(store_path) -> ContextManager[None]:
+    """Guard swapping in or deleting one store directory."""
+    digest = hashlib.sha256(str(Path(store_path).resolve()).encode("utf-8")).hexdigest()[:16]
+    return file_lock(f"store-{digest}")
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into one execution.
+
+    The first caller runs the function; callers arriving while it is in flight wait
+    for and share its result (or exception). Nothing is cached once it finishes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+        self.shared = 0
+
+    def do(self, key: Hashable, func: Callable[[], T]) -> T:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Future()
+            else:
+                self.shared += 1
+        if not leader:
+            return call.result()
+
+        try:
+            result = func()
+        except BaseException as exc:
+            call.set_exception(exc)
+            raise
+        else:
+            call.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
@@ -0,0 +1,370 @@
+import json
+import os
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from chat import langchain_utils, retrieval
+from chat.chunking import ChunkingConfig, iter_chunks
+from chat.indexing import EXACT_VECTORS_DTYPE, EXACT_VECTORS_FILE, QUANTIZATIONS, RescoringIndex, create_index
+from chat.langchain_utils import (
+    build_qa_parts,
+    build_vectorstore,
+    get_embeddings,
+    invalidate_vectorstore,
+    load_documents,
+    load_vectorstore,
+    register_chat_model,
+    register_embeddings,
+)
+
+BENCH_EMBEDDING_MODEL = "bench/deterministic-384"
+BENCH_CHAT_MODEL = "bench/fake-llm"
+BENCH_API_KEY = "bench"
+
+WORDS = (
+    "agent index vector query latency throughput cache shard token chunk page model provider "
+    "document embedding search recall budget worker process thread memory disk network request "
+    "response stream batch build parse split save load context answer source retrieval fusion"
+).split()
+
+
+def percentiles(samples: List[float]) -> dict:
+    """p50/p95/p99 (nearest-rank) of ``samples`` in milliseconds."""
+    ordered = sorted(samples)
+
+    def rank(p: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] * 1000, 3)
+
+    return {"p50_ms": rank(50), "p95_ms": rank(95), "p99_ms": rank(99), "samples": len(ordered)}
+
+
+def _sentence(rng: random.Random) -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(8, 18))]
+    if rng.random() < 0.2:
+        words.append(f"ERR-{rng.randint(1000, 9999)}")
+    return " ".join(words).capitalize() + "."
+
+
+def _page_lines(rng: random.Random, paragraphs: int) -> List[str]:
+    return [" ".join(_sentence(rng) for _ in range(5)) for _ in range(paragraphs)]
+
+
+def write_pdf(path: Path, pages: List[List[str]]) -> None:
+    """Write a minimal text-only PDF (one Helvetica text block per page) without extra dependencies."""
+
+    def escape(text: str) -> str:
+        return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for lines in pages:
+        body = "BT /F1 9 Tf 11 TL 36 806 Td " + " ".join(f"({escape(line)}) Tj T*" for line in lines) + " ET"
+        objects.append(f"<< /Length {len(body.encode('latin-1'))} >>\nstream\n{body}\nendstream")
+        content_id = len(objects)
+        objects.append(
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>"
+        )
+        page_ids.append(len(objects))
+    kids = " ".join(f"{i} 0 R" for i in page_ids)
+    objects[1] = f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>"
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{obj}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1")
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    path.write_bytes(bytes(out))
+
+
+def generate_corpus(root: Path, types: List[str], files: int, pages: int, paragraphs: int, seed: int) -> List[Path]:
+    """Create ``files`` synthetic documents of each type under ``root``."""
+    rng = random.Random(seed)
+    root.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for file_type in types:
+        for n in range(files):
+            path = root / f"doc-{n}.{file_type}"
+            page_texts = [_page_lines(rng, paragraphs) for _ in range(pages)]
+            if file_type == "pdf":
+                # Short lines so text stays on the page; extraction does not care about layout.
+                wrapped = [[line[i : i + 110] for line in lines for i in range(0, len(line), 110)] for lines in page_texts]
+                write_pdf(path, wrapped)
+            elif file_type == "docx":
+                import docx
+
+                document = docx.Document()
+                for lines in page_texts:
+                    for line in lines:
+                        document.add_paragraph(line)
+                document.save(str(path))
+            else:
+                path.write_text("\n\n".join("\n".join(lines) for lines in page_texts), encoding="utf-8")
+            paths.append(path)
+    return paths
+
+
+def _chunking_config(mode: str) -> ChunkingConfig:
+    # ~250 tokens is about the 1000 characters of the other modes.
+    return ChunkingConfig(mode, 250, 50) if mode == "tokens" else ChunkingConfig(mode, 1000, 200)
+
+
+def _dir_size(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
+def _rss_bytes() -> Optional[int]:
+    """Resident set size of this process (Linux only; None elsewhere)."""
+    try:
+        resident_pages = int(Path("/proc/self/statm").read_text().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE")
+
+
+def _index_bytes(index) -> dict:
+    """Bytes of an index as stored: the searched index (resident once loaded) and the
+    re-scoring vectors saved beside it (memory-mapped; only candidate rows are paged in)."""
+    import faiss
+
+    if isinstance(index, RescoringIndex):
+        serialize = faiss.serialize_index_binary if index.binary else faiss.serialize_index
+        resident = len(serialize(index.inner))
+        exact = np.asarray(index.exact, dtype=EXACT_VECTORS_DTYPE).nbytes
+    else:
+        resident, exact = len(faiss.serialize_index(index)), 0
+    return {"index_bytes": resident, "exact_vectors_bytes": exact, "disk_bytes": resident + exact}
+
+
+def quantization_report(vectors: np.ndarray, queries: np.ndarray, index_type: str, k: int) -> dict:
+    """Resident and on-disk bytes, search latency and recall@k of each quantization
+    against an exact flat search. Ratios are relative to the float32 index."""
+    exact, _ = create_index(vectors, "flat")
+    exact.add(vectors)
+    _, truth = exact.search(queries, k)
+    report = {}
+    for quantization in QUANTIZATIONS:
+        index, _ = create_index(vectors, index_type, quantization)
+        index.add(vectors)
+        started = time.perf_counter()
+        _, found = index.search(queries, k)
+        seconds = time.perf_counter() - started
+        recall = np.mean([len(set(a) & set(b)) / k for a, b in zip(truth.tolist(), found.tolist())])
+        report[quantization] = {
+            **_index_bytes(index),
+            f"recall_at_{k}": round(float(recall), 4),
+            "search_ms_per_query": round(seconds * 1000 / len(queries), 4),
+        }
+    baseline = report["none"]["index_bytes"]
+    for entry in report.values():
+        entry["memory_ratio"] = round(entry["index_bytes"] / baseline, 4)
+        entry["disk_ratio"] = round(entry["disk_bytes"] / baseline, 4)
+    return report
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark parsing, splitting, embedding, vectorstore build/load and retrieval on a synthetic "
+        "corpus with a local embedding stand-in and fake LLM; prints JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--types", default="pdf,txt,docx", help="Comma-separated file types to generate.")
+        parser.add_argument("--files", type=int, default=4, help="Files per type.")
+        parser.add_argument("--pages", type=int, default=20, help="Pages per file.")
+        parser.add_argument("--paragraphs", type=int, default=6, help="Paragraphs per page.")
+        parser.add_argument("--queries", type=int, default=200, help="Distinct queries for latency percentiles.")
+        parser.add_argument("--index-type", default="auto", choices=["auto", "flat", "hnsw", "ivf"])
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--chunking-mode", default="recursive", choices=["recursive", "tokens", "structure"])
+        parser.add_argument("--quantization", default="none", choices=list(QUANTIZATIONS))
+        parser.add_argument(
+            "--real-embeddings",
+            action="store_true",
+            help="Use the configured sentence-transformers model instead of the deterministic stand-in.",
+        )
+        parser.add_argument("--output", help="Write the JSON report to this file instead of stdout.")
+
+    def handle(self, *args, **options):
+        from django.conf import settings
+
+        workdir = Path(tempfile.mkdtemp(prefix="rag-bench-"))
+        embedding_model = settings.EMBEDDING_MODEL if options["real_embeddings"] else BENCH_EMBEDDING_MODEL
+        try:
+            with override_settings(
+                VECTORSTORE_ROOT=workdir / "vectorstores",
+                TEXT_CACHE_ROOT=workdir / "textcache",
+                SHARD_ROOT=workdir / "shards",
+                EMBEDDING_MODEL=embedding_model,
+            ):
+                report = self._run(workdir, options)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            Path(options["output"]).write_text(output + "\n", encoding="utf-8")
+        else:
+            self.stdout.write(output)
+
+    def _run(self, workdir: Path, options) -> dict:
+        from langchain_core.embeddings import DeterministicFakeEmbedding
+        from langchain_core.language_models import FakeListChatModel
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+        if not options["real_embeddings"]:
+            register_embeddings(BENCH_EMBEDDING_MODEL, DeterministicFakeEmbedding(size=384))
+        register_chat_model(
+            BENCH_CHAT_MODEL, BENCH_API_KEY, 0.0, 256, FakeListChatModel(responses=["Benchmark answer."])
+        )
+
+        types = [t.strip() for t in options["types"].split(",") if t.strip()]
+        paths = generate_corpus(
+            workdir / "corpus", types, options["files"], options["pages"], options["paragraphs"], options["seed"]
+        )
+        report = {
+            "commit": self._git_commit(),
+            "config": {
+                k: options[k]
+                for k in (
+                    "types",
+                    "files",
+                    "pages",
+                    "paragraphs",
+                    "queries",
+                    "index_type",
+                    "chunking_mode",
+                    "quantization",
+                    "seed",
+                )
+            },
+            "embedding_model": get_embeddings().model_name,
+            "corpus": {"files": len(paths), "bytes": sum(p.stat().st_size for p in paths)},
+        }
+
+        started = time.perf_counter()
+        documents = load_documents(paths)
+        parse_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        load_documents(paths)
+        report["parse"] = {
+            "seconds": round(parse_seconds, 4),
+            "pages": len(documents),
+            "pages_per_sec": round(len(documents) / parse_seconds, 1),
+            "cached_seconds": round(time.perf_counter() - started, 4),
+        }
+
+        # The LangChain splitter builds used before the chunking engine, as a baseline.
+        splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200, add_start_index=True)
+        started = time.perf_counter()
+        baseline = splitter.split_documents(documents)
+        split_seconds = time.perf_counter() - started
+        report["split"] = {
+            "langchain_recursive": {
+                "seconds": round(split_seconds, 4),
+                "chunks": len(baseline),
+                "chunks_per_sec": round(len(baseline) / split_seconds, 1),
+            }
+        }
+        for mode in ("recursive", "tokens", "structure"):
+            config = _chunking_config(mode)
+            started = time.perf_counter()
+            mode_chunks = list(iter_chunks(documents, config))
+            split_seconds = time.perf_counter() - started
+            report["split"][mode] = {
+                "seconds": round(split_seconds, 4),
+                "chunks": len(mode_chunks),
+                "chunks_per_sec": round(len(mode_chunks) / split_seconds, 1),
+            }
+            if mode == options["chunking_mode"]:
+                chunks = mode_chunks
+
+        texts = [chunk.page_content for chunk in chunks]
+        started = time.perf_counter()
+        vectors = np.asarray(get_embeddings().embed_documents(texts), dtype="float32")
+        embed_seconds = time.perf_counter() - started
+        report["embed"] = {"seconds": round(embed_seconds, 4), "chunks_per_sec": round(len(texts) / embed_seconds, 1)}
+
+        started = time.perf_counter()
+        # The build chunks exactly as the split phase above did, so chunk counts and throughput line up.
+        chunking = _chunking_config(options["chunking_mode"])._asdict()
+        build_options = {
+            "index_type": options["index_type"],
+            "chunking": chunking,
+            "quantization": options["quantization"],
+        }
+        store_path = build_vectorstore(paths, user_id=0, agent_id="bench", **build_options)
+        build_seconds = time.perf_counter() - started
+        report["build"] = {
+            "seconds": round(build_seconds, 4),
+            "chunks_per_sec": round(len(chunks) / build_seconds, 1),
+            # Everything on disk: index, docstore and any re-scoring vectors.
+            "store_bytes": _dir_size(store_path),
+            "exact_vectors_bytes": (
+                (store_path / EXACT_VECTORS_FILE).stat().st_size if (store_path / EXACT_VECTORS_FILE).exists() else 0
+            ),
+            "index_params": json.loads((store_path / "index_params.json").read_text()),
+        }
+        # Second build of the same documents reuses every per-document shard.
+        started = time.perf_counter()
+        build_vectorstore(paths, user_id=0, agent_id="bench", **build_options)
+        report["build"]["rebuild_seconds"] = round(time.perf_counter() - started, 4)
+
+        invalidate_vectorstore(store_path)
+        rss_before = _rss_bytes()
+        started = time.perf_counter()
+        vectorstore = load_vectorstore(store_path)
+        report["load"] = {"cold_seconds": round(time.perf_counter() - started, 4)}
+        if rss_before is not None:
+            # Memory-mapped vectors are not resident until searched, so this stays well below the index size.
+            report["load"]["rss_bytes"] = _rss_bytes() - rss_before
+        started = time.perf_counter()
+        load_vectorstore(store_path)
+        report["load"]["cached_seconds"] = round(time.perf_counter() - started, 6)
+
+        rng = random.Random(options["seed"] + 1)
+        queries = [_sentence(rng) for _ in range(options["queries"])]
+        query_vectors = np.asarray(get_embeddings().embed_documents(queries), dtype="float32")
+        report["quantization"] = quantization_report(
+            vectors, query_vectors, options["index_type"], langchain_utils.RETRIEVAL_K
+        )
+        report["search"] = {}
+        for mode in ("vector", "hybrid"):
+            samples = []
+            for query in queries:
+                # Unique text per mode so the query-embedding cache does not hide encoder cost.
+                started = time.perf_counter()
+                retrieval.search(vectorstore, [f"{mode} {query}"], k=langchain_utils.RETRIEVAL_K, mode=mode)
+                samples.append(time.perf_counter() - started)
+            report["search"][mode] = percentiles(samples)
+
+        qa = build_qa_parts(BENCH_CHAT_MODEL, BENCH_API_KEY, 0.0, 256, store_path, "")
+        samples = []
+        for query in queries:
+            started = time.perf_counter()
+            qa.chain.invoke({"query": f"answer {query}"})
+            samples.append(time.perf_counter() - started)
+        report["answer_fake_llm"] = percentiles(samples)
+        return report
+
+    @staticmethod
+    def _git_commit() -> str:
+        try:
+            return subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return ""
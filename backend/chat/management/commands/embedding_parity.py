@@ -0,0 +1,48 @@
+import json
+import random
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from chat.embedding_backends import ONNX_PREFIX, embedding_parity, split_backend
+from chat.langchain_utils import get_embeddings
+from chat.management.commands.bench_pipeline import WORDS
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare an embedding backend (default: the ONNX export of EMBEDDING_MODEL) against the "
+        "sentence-transformers model on synthetic text; fails if cosine similarity drops below --min-cosine."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reference", help="Reference model (default: EMBEDDING_MODEL without backend prefix).")
+        parser.add_argument("--candidate", help="Candidate model (default: onnx:<reference>).")
+        parser.add_argument("--texts", type=int, default=256)
+        parser.add_argument("--min-cosine", type=float, default=0.99)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        reference_name = options["reference"] or split_backend(settings.EMBEDDING_MODEL)[1]
+        candidate_name = options["candidate"] or f"{ONNX_PREFIX}{reference_name}"
+
+        rng = random.Random(options["seed"])
+        # Mixed lengths so truncation and length bucketing are both exercised.
+        texts = [
+            " ".join(rng.choice(WORDS) for _ in range(rng.choice([4, 16, 64, 256])))
+            for _ in range(options["texts"])
+        ]
+
+        report = {"reference": reference_name, "candidate": candidate_name}
+        models = {"reference": get_embeddings(reference_name), "candidate": get_embeddings(candidate_name)}
+        for label, embeddings in models.items():
+            started = time.perf_counter()
+            embeddings.embed_documents(texts)
+            seconds = time.perf_counter() - started
+            report[f"{label}_texts_per_sec"] = round(len(texts) / seconds, 1)
+        report.update(embedding_parity(models["reference"], models["candidate"], texts))
+
+        self.stdout.write(json.dumps(report, indent=2))
+        if report["cosine_min"] < options["min_cosine"]:
+            raise CommandError(f"Minimum cosine similarity {report['cosine_min']} is below {options['min_cosine']}.")
@@ -0,0 +1,43 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from . import metrics
+
+
+class ServerTimingMiddleware:
+    """Add a ``Server-Timing`` header with the stages timed while handling the request.
+
+    Streaming responses only report the stages completed before the body starts;
+    everything still lands in the stage histograms on ``/api/metrics``. Works in
+    both sync (WSGI) and async (ASGI) stacks, so async views stay on the event loop.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        started = time.perf_counter()
+        with metrics.collect_timings() as timings:
+            response = self.get_response(request)
+        return self._add_header(response, timings, started)
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        with metrics.collect_timings() as timings:
+            response = await self.get_response(request)
+        return self._add_header(response, timings, started)
+
+    @staticmethod
+    def _add_header(response, timings, started: float):
+        timings.append(("total", time.perf_counter() - started))
+        response["Server-Timing"] = metrics.server_timing(timings)
+        return response
@@ -0,0 +1,35 @@
+# Generated by Django 6.0 on 2026-10-17 09:00
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def backfill_sha256(apps, schema_editor):
+    UploadedDocument = apps.get_model('chat', 'UploadedDocument')
+    for doc in UploadedDocument.objects.filter(sha256=''):
+        hasher = hashlib.sha256()
+        try:
+            with doc.file.open('rb') as fh:
+                for block in fh.chunks():
+                    hasher.update(block)
+        except (OSError, ValueError):
+            continue
+        doc.sha256 = hasher.hexdigest()
+        doc.save(update_fields=['sha256'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0003_agent_api_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadeddocument',
+            name='sha256',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64),
+        ),
+        migrations.RunPython(backfill_sha256, migrations.RunPython.noop),
+    ]
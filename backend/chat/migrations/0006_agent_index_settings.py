@@ -0,0 +1,28 @@
+# Generated by Django 6.0 on 2026-10-17 11:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0005_buildjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='agent',
+            name='index_type',
+            field=models.CharField(choices=[('auto', 'Auto (by chunk count)'), ('flat', 'Flat (exact)'), ('hnsw', 'HNSW'), ('ivf', 'IVF')], default='auto', max_length=16),
+        ),
+        migrations.AddField(
+            model_name='agent',
+            name='search_nprobe',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='agent',
+            name='search_ef_search',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-17 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0006_agent_index_settings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='agent',
+            name='retrieval_mode',
+            field=models.CharField(choices=[('vector', 'Vector'), ('hybrid', 'Hybrid (BM25 + vector)')], default='vector', max_length=16),
+        ),
+    ]
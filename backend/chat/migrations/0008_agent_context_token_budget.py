@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-17 13:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0007_agent_retrieval_mode'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='agent',
+            name='context_token_budget',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
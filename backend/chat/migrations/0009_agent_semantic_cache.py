@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-17 14:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0008_agent_context_token_budget'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='agent',
+            name='semantic_cache_enabled',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='agent',
+            name='semantic_cache_threshold',
+            field=models.FloatField(default=0.95),
+        ),
+    ]
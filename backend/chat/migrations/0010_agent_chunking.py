@@ -0,0 +1,28 @@
+# Generated by Django 6.0 on 2026-10-17 15:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0009_agent_semantic_cache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='agent',
+            name='chunking_mode',
+            field=models.CharField(choices=[('recursive', 'Characters'), ('tokens', 'Tokens'), ('structure', 'Structure-aware (headings, pages)')], default='recursive', max_length=16),
+        ),
+        migrations.AddField(
+            model_name='agent',
+            name='chunk_size',
+            field=models.PositiveIntegerField(default=1000),
+        ),
+        migrations.AddField(
+            model_name='agent',
+            name='chunk_overlap',
+            field=models.PositiveIntegerField(default=200),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-17 16:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0010_agent_chunking'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='agent',
+            name='quantization',
+            field=models.CharField(choices=[('none', 'None (float32)'), ('fp16', 'Scalar float16'), ('int8', 'Scalar int8 (re-scored)'), ('binary', 'Binary (Hamming prefilter, re-scored)')], default='none', max_length=16),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-17 18:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0012_conversation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='buildjob',
+            name='worker_id',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
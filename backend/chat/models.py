@@ -10,6 +10,7 @@ class UploadedDocument(models.Model):
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name="documents")
     name = models.CharField(max_length=255)
     file = models.FileField(upload_to="uploads/")
+    sha256 = models.CharField(max_length=64, blank=True, default="", db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self) -> str:
@@ -17,6 +18,28 @@ class UploadedDocument(models.Model):
 
 
 class Agent(models.Model):
+    INDEX_TYPE_CHOICES = [
+        ("auto", "Auto (by chunk count)"),
+        ("flat", "Flat (exact)"),
+        ("hnsw", "HNSW"),
+        ("ivf", "IVF"),
+    ]
+    RETRIEVAL_MODE_CHOICES = [
+        ("vector", "Vector"),
+        ("hybrid", "Hybrid (BM25 + vector)"),
+    ]
+    CHUNKING_MODE_CHOICES = [
+        ("recursive", "Characters"),
+        ("tokens", "Tokens"),
+        ("structure", "Structure-aware (headings, pages)"),
+    ]
+    QUANTIZATION_CHOICES = [
+        ("none", "None (float32)"),
+        ("fp16", "Scalar float16"),
+        ("int8", "Scalar int8 (re-scored)"),
+        ("binary", "Binary (Hamming prefilter, re-scored)"),
+    ]
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name="agents")
     name = models.CharField(max_length=255)
@@ -26,9 +49,124 @@ class Agent(models.Model):
     system_prompt = models.TextField(blank=True, default="")
     api_key = models.CharField(max_length=255, blank=True, default="")
     store_path = models.CharField(max_length=512)
+    index_type = models.CharField(max_length=16, choices=INDEX_TYPE_CHOICES, default="auto")
+    search_nprobe = models.PositiveIntegerField(null=True, blank=True)
+    search_ef_search = models.PositiveIntegerField(null=True, blank=True)
+    retrieval_mode = models.CharField(max_length=16, choices=RETRIEVAL_MODE_CHOICES, default="vector")
+    context_token_budget = models.PositiveIntegerField(null=True, blank=True)
+    semantic_cache_enabled = models.BooleanField(default=False)
+    semantic_cache_threshold = models.FloatField(default=0.95)
+    chunking_mode = models.CharField(max_length=16, choices=CHUNKING_MODE_CHOICES, default="recursive")
+    chunk_size = models.PositiveIntegerField(default=1000)
+    chunk_overlap = models.PositiveIntegerField(default=200)
+    quantization = models.CharField(max_length=16, choices=QUANTIZATION_CHOICES, default="none")
     documents = models.ManyToManyField(UploadedDocument, related_name="agents", blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self) -> str:
         return self.name
+
+    @property
+    def search_params(self) -> dict:
+        """Query-time FAISS overrides (IVF ``nprobe``, HNSW ``ef_search``) set on this agent."""
+        return {
+            key: value
+            for key, value in (("nprobe", self.search_nprobe), ("ef_search", self.search_ef_search))
+            if value
+        }
+
+    @property
+    def chunking(self) -> dict:
+        """Chunking settings passed to vectorstore builds."""
+        return {"mode": self.chunking_mode, "chunk_size": self.chunk_size, "chunk_overlap": self.chunk_overlap}
+
+
+class BuildJob(models.Model):
+    """A background vectorstore build for an agent, with per-stage progress."""
+
+    STATUS_QUEUED = "queued"
+    STATUS_RUNNING = "running"
+    STATUS_SUCCEEDED = "succeeded"
+    STATUS_FAILED = "failed"
+    STATUS_CANCELLED = "cancelled"
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, "Queued"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_SUCCEEDED, "Succeeded"),
+        (STATUS_FAILED, "Failed"),
+        (STATUS_CANCELLED, "Cancelled"),
+    ]
+    ACTIVE_STATUSES = (STATUS_QUEUED, STATUS_RUNNING)
+
+    STAGE_CHOICES = [
+        ("parse", "Parse"),
+        ("split", "Split"),
+        ("embed", "Embed"),
+        ("save", "Save"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name="build_jobs")
+    agent = models.ForeignKey(Agent, on_delete=models.CASCADE, related_name="build_jobs")
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_QUEUED, db_index=True)
+    stage = models.CharField(max_length=16, choices=STAGE_CHOICES, blank=True, default="")
+    progress = models.FloatField(default=0.0)
+    error = models.TextField(blank=True, default="")
+    cancel_requested = models.BooleanField(default=False)
+    # Process that runs the job (see jobs.WORKER_ID); used to detect orphans after a restart.
+    worker_id = models.CharField(max_length=64, blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self) -> str:
+        return f"{self.agent_id} ({self.status})"
+
+
+class Conversation(models.Model):
+    """A server-side chat session with one agent.
+
+    Turns older than the prompt window are folded into ``summary``;
+    ``summarized_through`` is the id of the last turn the summary covers.
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name="conversations")
+    agent = models.ForeignKey(Agent, on_delete=models.CASCADE, related_name="conversations")
+    title = models.CharField(max_length=255, blank=True, default="")
+    summary = models.TextField(blank=True, default="")
+    summarized_through = models.BigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-updated_at"]
+
+    def __str__(self) -> str:
+        return self.title or str(self.id)
+
+
+class ConversationTurn(models.Model):
+    ROLE_USER = "user"
+    ROLE_ASSISTANT = "assistant"
+    ROLE_CHOICES = [
+        (ROLE_USER, "User"),
+        (ROLE_ASSISTANT, "Assistant"),
+    ]
+
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name="turns")
+    role = models.CharField(max_length=16, choices=ROLE_CHOICES)
+    content = models.TextField()
+    tokens = models.PositiveIntegerField(default=0)
+    search_query = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["id"]
+
+    def __str__(self) -> str:
+        return f"{self.conversation_id} {self.role}"
@@ -0,0 +1,12 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class NewestFirstCursorPagination(CursorPagination):
+    """Cursor pagination over ``-created_at``: constant cost per page however deep the
+    client scrolls, and stable while rows are added (unlike offset pagination)."""
+
+    ordering = "-created_at"
+    page_size = settings.API_PAGE_SIZE
+    page_size_query_param = "page_size"
+    max_page_size = settings.API_MAX_PAGE_SIZE
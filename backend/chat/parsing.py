@@ -0,0 +1,79 @@
+# Text extraction for uploaded documents. Kept free of Django settings and
+# LangChain imports so it can run in spawned parser processes.
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import List, Optional
+
+SUPPORTED_SUFFIXES = [".pdf", ".txt", ".md", ".docx", ".doc"]
+
+# Bump when text extraction changes so cached extractions are regenerated.
+EXTRACTOR_VERSION = 1
+
+
+def content_hash(source) -> str:
+    """Return the SHA-256 hex digest of a file path or an (uploaded) file object."""
+    hasher = hashlib.sha256()
+    if isinstance(source, (str, Path)):
+        with open(source, "rb") as fh:
+            for block in iter(lambda: fh.read(1024 * 1024), b""):
+                hasher.update(block)
+        return hasher.hexdigest()
+
+    if hasattr(source, "chunks"):
+        for block in source.chunks():
+            hasher.update(block)
+    else:
+        for block in iter(lambda: source.read(1024 * 1024), b""):
+            hasher.update(block)
+    source.seek(0)
+    return hasher.hexdigest()
+
+
+def _parse_pages(path: Path) -> List[str]:
+    """Extract raw text from a file, one entry per page for PDFs."""
+    suffix = path.suffix.lower()
+
+    if suffix == ".pdf":
+        from pypdf import PdfReader
+
+        reader = PdfReader(str(path))
+        return [page.extract_text() or "" for page in reader.pages]
+
+    if suffix in [".txt", ".md"]:
+        return [path.read_text(encoding="utf-8")]
+
+    if suffix in [".docx", ".doc"]:
+        import docx2txt
+
+        return [docx2txt.process(str(path))]
+
+    raise ValueError(f"Unsupported file type: {suffix}")
+
+
+def extract_pages(path: Path, cache_root: Path, digest: Optional[str] = None) -> List[str]:
+    """Return the extracted pages of a file, cached on disk by content hash + extractor version.
+
+    Pass the file's ``digest`` (``content_hash``) when already known to skip re-hashing it.
+    """
+    path = Path(path)
+    suffix = path.suffix.lower()
+    if suffix not in SUPPORTED_SUFFIXES:
+        raise ValueError(f"Unsupported file type: {suffix}")
+
+    cache_root = Path(cache_root)
+    cache_file = cache_root / f"{digest or content_hash(path)}-v{EXTRACTOR_VERSION}.json"
+    try:
+        return json.loads(cache_file.read_text(encoding="utf-8"))["pages"]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    pages = _parse_pages(path)
+    cache_root.mkdir(parents=True, exist_ok=True)
+    # Write-then-rename so concurrent builds never read a partial cache file.
+    tmp_file = cache_file.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp_file.write_text(json.dumps({"pages": pages}), encoding="utf-8")
+    os.replace(tmp_file, cache_file)
+    return pages
@@ -0,0 +1,118 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from django.conf import settings
+from langchain_core.documents import Document
+
+from . import metrics
+
+# Reciprocal-rank fusion constant from Cormack et al.; dampens the weight of top ranks.
+RRF_K = 60
+# Candidates taken from each leg before fusion.
+HYBRID_CANDIDATES = 20
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.RETRIEVAL_WORKERS, thread_name_prefix="retrieval")
+    return _executor
+
+
+def vector_search(vectorstore, queries: Sequence[str], k: int) -> List[List[Tuple[Hashable, float]]]:
+    """Embed all queries in one call and return ``(docstore id, L2 distance)`` pairs from a single FAISS search."""
+    embeddings = vectorstore.embedding_function
+    embed = getattr(embeddings, "embed_queries", embeddings.embed_documents)
+    vectors = np.asarray(embed(list(queries)), dtype="float32")
+    if vectorstore._normalize_L2:
+        import faiss
+
+        faiss.normalize_L2(vectors)
+    with metrics.timed("faiss_search"):
+        distances, indices = vectorstore.index.search(vectors, k)
+    return [
+        [(vectorstore.index_to_docstore_id[i], float(d)) for i, d in zip(row, row_distances) if i != -1]
+        for row, row_distances in zip(indices, distances)
+    ]
+
+
+def vector_search_ids(vectorstore, queries: Sequence[str], k: int) -> List[List[Hashable]]:
+    """Docstore ids only of ``vector_search``."""
+    return [[doc_id for doc_id, _ in hits] for hits in vector_search(vectorstore, queries, k)]
+
+
+def similarity(distance: float) -> float:
+    """Map a squared L2 distance to cosine similarity (exact for unit-normalised embeddings)."""
+    return 1.0 - distance / 2.0
+
+
+def lexical_search_ids(vectorstore, query: str, k: int) -> List[Hashable]:
+    """BM25 hits from the store's inverted index (empty for stores without one)."""
+    lexical_search = getattr(vectorstore.docstore, "lexical_search", None)
+    if lexical_search is None:
+        return []
+    with metrics.timed("bm25_search"):
+        return lexical_search(query, k)
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[Hashable]], k: int) -> List[Hashable]:
+    """Merge ranked id lists by summing 1 / (RRF_K + rank) and return the top ``k`` ids."""
+    return [doc_id for doc_id, _ in fused_scores(rankings, k)]
+
+
+def fused_scores(rankings: Sequence[Sequence[Hashable]], k: int) -> List[Tuple[Hashable, float]]:
+    """``reciprocal_rank_fusion`` with each id's fused score."""
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (RRF_K + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+
+def fetch_documents(vectorstore, hits: Sequence[Tuple[Hashable, float]]) -> List[Tuple[Document, float]]:
+    """Resolve ``(docstore id, score)`` pairs to documents, skipping ids missing from the docstore."""
+    docs = []
+    for doc_id, score in hits:
+        doc = vectorstore.docstore.search(doc_id)
+        if isinstance(doc, Document):
+            docs.append((doc, score))
+    return docs
+
+
+def search_with_scores(
+    vectorstore, queries: Sequence[str], k: int = 4, mode: str = "vector"
+) -> List[List[Tuple[Document, float]]]:
+    """Return the top-k ``(document, score)`` pairs for each query, best first.
+
+    ``vector`` ranks by embedding distance only; scores are cosine similarities (see
+    ``similarity``), comparable across stores built with the same embedding model.
+    ``hybrid`` also runs BM25 over the store's lexical index (concurrently with the
+    vector leg) and fuses both rankings with reciprocal-rank fusion; scores are the
+    fused RRF scores.
+    """
+    if mode != "hybrid":
+        return [
+            fetch_documents(vectorstore, [(doc_id, similarity(distance)) for doc_id, distance in hits])
+            for hits in vector_search(vectorstore, queries, k)
+        ]
+
+    candidates = max(k, HYBRID_CANDIDATES)
+    # Each task runs in a copy of the caller's context so its timings reach the request's Server-Timing.
+    lexical_futures = [
+        _get_executor().submit(contextvars.copy_context().run, lexical_search_ids, vectorstore, query, candidates)
+        for query in queries
+    ]
+    vector_rankings = vector_search_ids(vectorstore, queries, candidates)
+    return [
+        fetch_documents(vectorstore, fused_scores([vector_ids, future.result()], k))
+        for vector_ids, future in zip(vector_rankings, lexical_futures)
+    ]
+
+
+def search(vectorstore, queries: Sequence[str], k: int = 4, mode: str = "vector") -> List[List[Document]]:
+    """Return the top-k documents for each query (``search_with_scores`` without the scores)."""
+    return [[doc for doc, _ in hits] for hits in search_with_scores(vectorstore, queries, k, mode)]
@@ -1,8 +1,9 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
 from rest_framework import serializers
 
-from .models import Agent, UploadedDocument
+from .models import Agent, BuildJob, Conversation, ConversationTurn, UploadedDocument
 
 User = get_user_model()
 
@@ -28,15 +29,53 @@ class RegisterSerializer(serializers.ModelSerializer):
         )
 
 
-class UploadedDocumentSerializer(serializers.ModelSerializer):
+def _csv(value):
+    return {part.strip() for part in (value or "").split(",") if part.strip()}
+
+
+class SparseFieldsMixin:
+    """Let a request trim the response with ``?fields=a,b`` (keep only these) or
+    ``?omit=a,b`` (drop these), e.g. ``?omit=documents`` to skip nested documents.
+
+    Applies only to the top-level serializer of a request that passes ``request`` in
+    its context.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get("request")
+        if request is None:
+            return
+        keep, omit = _csv(request.query_params.get("fields")), _csv(request.query_params.get("omit"))
+        for name in list(self.fields):
+            if (keep and name not in keep) or name in omit:
+                self.fields.pop(name)
+
+    @staticmethod
+    def includes(request, name: str) -> bool:
+        """Whether ``name`` survives the request's field selection (e.g. to skip a prefetch)."""
+        keep, omit = _csv(request.query_params.get("fields")), _csv(request.query_params.get("omit"))
+        return (not keep or name in keep) and name not in omit
+
+
+def _owned_documents(request, ids):
+    """Resolve ``ids`` to the user's documents in one query; any foreign or unknown id fails."""
+    docs = list(UploadedDocument.objects.filter(id__in=ids, owner=request.user))
+    if len(docs) != len(set(ids)):
+        raise serializers.ValidationError("One or more documents do not belong to you.")
+    return docs
+
+
+class UploadedDocumentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = UploadedDocument
-        fields = ["id", "name", "file", "created_at"]
-        read_only_fields = ["id", "created_at", "name"]
+        fields = ["id", "name", "file", "sha256", "created_at"]
+        read_only_fields = ["id", "created_at", "name", "sha256"]
 
 
-class AgentSerializer(serializers.ModelSerializer):
+class AgentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     documents = UploadedDocumentSerializer(many=True, read_only=True)
+    documents_count = serializers.SerializerMethodField()
 
     class Meta:
         model = Agent
@@ -49,11 +88,46 @@ class AgentSerializer(serializers.ModelSerializer):
             "system_prompt",
             "api_key",
             "store_path",
+            "index_type",
+            "search_nprobe",
+            "search_ef_search",
+            "retrieval_mode",
+            "context_token_budget",
+            "semantic_cache_enabled",
+            "semantic_cache_threshold",
+            "chunking_mode",
+            "chunk_size",
+            "chunk_overlap",
+            "quantization",
             "documents",
+            "documents_count",
             "created_at",
             "updated_at",
         ]
-        read_only_fields = ["id", "store_path", "documents", "created_at", "updated_at"]
+        read_only_fields = ["id", "store_path", "documents", "documents_count", "created_at", "updated_at"]
+
+    def get_documents_count(self, agent):
+        # Annotated by list/retrieve querysets; count() reuses a prefetch when there is one.
+        count = getattr(agent, "documents_count", None)
+        return agent.documents.count() if count is None else count
+
+
+class BuildJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = BuildJob
+        fields = [
+            "id",
+            "agent",
+            "status",
+            "stage",
+            "progress",
+            "error",
+            "cancel_requested",
+            "created_at",
+            "started_at",
+            "finished_at",
+        ]
+        read_only_fields = fields
 
 
 class AgentCreateSerializer(serializers.Serializer):
@@ -63,16 +137,29 @@ class AgentCreateSerializer(serializers.Serializer):
     max_tokens = serializers.IntegerField(default=512)
     system_prompt = serializers.CharField(allow_blank=True, required=False, default="")
     api_key = serializers.CharField(write_only=True)
+    index_type = serializers.ChoiceField(choices=Agent.INDEX_TYPE_CHOICES, default="auto")
+    search_nprobe = serializers.IntegerField(min_value=1, required=False, allow_null=True)
+    search_ef_search = serializers.IntegerField(min_value=1, required=False, allow_null=True)
+    retrieval_mode = serializers.ChoiceField(choices=Agent.RETRIEVAL_MODE_CHOICES, default="vector")
+    context_token_budget = serializers.IntegerField(min_value=1, required=False, allow_null=True)
+    semantic_cache_enabled = serializers.BooleanField(default=False)
+    semantic_cache_threshold = serializers.FloatField(min_value=0.0, max_value=1.0, default=0.95)
+    chunking_mode = serializers.ChoiceField(choices=Agent.CHUNKING_MODE_CHOICES, default="recursive")
+    chunk_size = serializers.IntegerField(min_value=50, max_value=20000, default=1000)
+    chunk_overlap = serializers.IntegerField(min_value=0, default=200)
+    quantization = serializers.ChoiceField(choices=Agent.QUANTIZATION_CHOICES, default="none")
     document_ids = serializers.ListField(
         child=serializers.IntegerField(), allow_empty=False, required=True
     )
 
+    def validate(self, attrs):
+        if attrs["chunk_overlap"] >= attrs["chunk_size"]:
+            raise serializers.ValidationError({"chunk_overlap": "Must be smaller than chunk_size."})
+        return attrs
+
     def validate_document_ids(self, value):
-        request = self.context["request"]
-        docs = UploadedDocument.objects.filter(id__in=value, owner=request.user)
-        if docs.count() != len(set(value)):
-            raise serializers.ValidationError("One or more documents do not belong to you.")
-        return value
+        """Validated as the list of the user's UploadedDocument instances."""
+        return _owned_documents(self.context["request"], value)
 
 
 class AgentUpdateSerializer(serializers.Serializer):
@@ -82,16 +169,24 @@ class AgentUpdateSerializer(serializers.Serializer):
     max_tokens = serializers.IntegerField(required=False)
     system_prompt = serializers.CharField(required=False, allow_blank=True)
     api_key = serializers.CharField(required=False, allow_blank=False)
+    index_type = serializers.ChoiceField(choices=Agent.INDEX_TYPE_CHOICES, required=False)
+    search_nprobe = serializers.IntegerField(min_value=1, required=False, allow_null=True)
+    search_ef_search = serializers.IntegerField(min_value=1, required=False, allow_null=True)
+    retrieval_mode = serializers.ChoiceField(choices=Agent.RETRIEVAL_MODE_CHOICES, required=False)
+    context_token_budget = serializers.IntegerField(min_value=1, required=False, allow_null=True)
+    semantic_cache_enabled = serializers.BooleanField(required=False)
+    semantic_cache_threshold = serializers.FloatField(min_value=0.0, max_value=1.0, required=False)
+    chunking_mode = serializers.ChoiceField(choices=Agent.CHUNKING_MODE_CHOICES, required=False)
+    chunk_size = serializers.IntegerField(min_value=50, max_value=20000, required=False)
+    chunk_overlap = serializers.IntegerField(min_value=0, required=False)
+    quantization = serializers.ChoiceField(choices=Agent.QUANTIZATION_CHOICES, required=False)
     document_ids = serializers.ListField(
         child=serializers.IntegerField(), allow_empty=True, required=False
     )
 
     def validate_document_ids(self, value):
-        request = self.context["request"]
-        docs = UploadedDocument.objects.filter(id__in=value, owner=request.user)
-        if docs.count() != len(set(value)):
-            raise serializers.ValidationError("One or more documents do not belong to you.")
-        return value
+        """Validated as the list of the user's UploadedDocument instances."""
+        return _owned_documents(self.context["request"], value)
 
     def validate_api_key(self, value):
         if value is not None and value.strip() == "":
@@ -103,3 +198,46 @@ class ChatRequestSerializer(serializers.Serializer):
     agent_id = serializers.UUIDField()
     message = serializers.CharField()
     api_key = serializers.CharField(required=False, allow_blank=False)
+    conversation_id = serializers.UUIDField(required=False)
+
+
+class ConversationTurnSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ConversationTurn
+        fields = ["id", "role", "content", "search_query", "created_at"]
+        read_only_fields = fields
+
+
+class ConversationSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Conversation
+        fields = ["id", "agent", "title", "summary", "created_at", "updated_at"]
+        read_only_fields = fields
+
+
+class ConversationDetailSerializer(ConversationSerializer):
+    turns = ConversationTurnSerializer(many=True, read_only=True)
+
+    class Meta(ConversationSerializer.Meta):
+        fields = ConversationSerializer.Meta.fields + ["turns"]
+        read_only_fields = fields
+
+
+class ConversationCreateSerializer(serializers.Serializer):
+    agent_id = serializers.UUIDField()
+    title = serializers.CharField(max_length=255, allow_blank=True, required=False, default="")
+
+
+class SearchRequestSerializer(serializers.Serializer):
+    query = serializers.CharField()
+    agent_id = serializers.UUIDField(required=False)
+    k = serializers.IntegerField(min_value=1, max_value=settings.SEARCH_MAX_K, default=8)
+    retrieval_mode = serializers.ChoiceField(choices=Agent.RETRIEVAL_MODE_CHOICES, required=False)
+
+
+class ChatBatchRequestSerializer(serializers.Serializer):
+    agent_id = serializers.UUIDField()
+    questions = serializers.ListField(
+        child=serializers.CharField(), allow_empty=False, max_length=settings.CHAT_BATCH_MAX_QUESTIONS
+    )
+    api_key = serializers.CharField(required=False, allow_blank=False)
@@ -0,0 +1,66 @@
+# Per-document embedding shards. Each shard holds the chunks and vectors of one
+# document's content for one embedding model and chunking configuration, so agent
+# indexes are assembled from shards and only new or changed documents are embedded.
+import hashlib
+import json
+import os
+import shutil
+import uuid
+from pathlib import Path
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+
+VECTORS_FILE = "vectors.npy"
+CHUNKS_FILE = "chunks.json"
+
+
+class Shard(NamedTuple):
+    """Chunk texts/metadata (without ``source``) and their float32 embeddings, in the same order."""
+
+    chunks: List[dict]
+    vectors: np.ndarray
+
+
+def shard_key(sha256: str, config: dict) -> str:
+    """Name of the shard for a document's content under an embedding/chunking ``config``."""
+    digest = hashlib.sha256(json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+    return f"{sha256}-{digest}"
+
+
+def load_shard(root: Path, key: str) -> Optional[Shard]:
+    path = Path(root) / key
+    try:
+        chunks = json.loads((path / CHUNKS_FILE).read_text(encoding="utf-8"))
+        vectors = np.load(path / VECTORS_FILE)
+    except (OSError, ValueError):
+        return None
+    if len(chunks) != len(vectors):
+        return None
+    return Shard(chunks, vectors)
+
+
+def save_shard(root: Path, key: str, shard: Shard) -> None:
+    """Write a shard atomically; if another build wrote the same shard first, keep that one."""
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    staging = root / f".{key}.{uuid.uuid4().hex[:8]}"
+    staging.mkdir()
+    try:
+        np.save(staging / VECTORS_FILE, np.asarray(shard.vectors, dtype="float32"))
+        (staging / CHUNKS_FILE).write_text(json.dumps(shard.chunks), encoding="utf-8")
+        try:
+            os.replace(staging, root / key)
+        except OSError:
+            pass  # already written by a concurrent build (same content, same result)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+def remove_shards(root: Path, sha256: str) -> None:
+    """Delete every shard built from a document's content (all models/configurations)."""
+    root = Path(root)
+    if not root.is_dir():
+        return
+    for path in root.glob(f"{sha256}-*"):
+        shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,843 @@
+import json
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.runnables import RunnableLambda
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import jobs
+from .cache import DiskVectorCache, LRUCache, SemanticCache
+from .chunking import ChunkingConfig, iter_chunks
+from .context import merge_adjacent
+from .conversations import aprepare_history, prepare_history, record_exchange
+from .embedding_backends import FP32_FILE, export_onnx_model
+from .indexing import DOCSTORE_FILE, RescoringIndex
+from .jobs import ORPHANED_ERROR, WORKER_ID, _run_build, cancel_job, enqueue_build, reap_orphaned_jobs
+from .langchain_utils import build_vectorstore, register_embeddings
+from .locks import SingleFlight, hold_process_lock, process_alive, try_build_lock
+from .models import Agent, BuildJob, Conversation, ConversationTurn, UploadedDocument
+from .retrieval import RRF_K, fused_scores, reciprocal_rank_fusion
+
+
+def _chunk(start, length=100, source="a.pdf", page=0):
+    text = "".join(chr(ord("a") + (start + i) % 26) for i in range(length))
+    return Document(page_content=text, metadata={"source": source, "page": page, "start_index": start})
+
+
+class MergeAdjacentTests(SimpleTestCase):
+    def test_merge_is_independent_of_rank_order(self):
+        merged = merge_adjacent([_chunk(160), _chunk(0), _chunk(80)])
+        self.assertEqual(len(merged), 1)
+        self.assertEqual(merged[0].metadata["start_index"], 0)
+        self.assertEqual(merged[0].page_content, _chunk(0, 260).page_content)
+
+    def test_disjoint_ranges_keep_rank_order(self):
+        merged = merge_adjacent([_chunk(500), _chunk(0), _chunk(50)])
+        self.assertEqual([doc.metadata["start_index"] for doc in merged], [500, 0])
+        self.assertEqual(merged[1].page_content, _chunk(0, 150).page_content)
+
+    def test_different_pages_are_not_merged(self):
+        merged = merge_adjacent([_chunk(0), _chunk(50, page=1)])
+        self.assertEqual(len(merged), 2)
+
+    def test_uploads_sharing_a_name_are_not_merged(self):
+        first = _chunk(0, source="uploads/1111.pdf")
+        second = _chunk(50, source="uploads/2222.pdf")
+        for chunk in (first, second):
+            chunk.metadata["name"] = "report.pdf"
+        merged = merge_adjacent([first, second])
+        self.assertEqual([doc.metadata["source"] for doc in merged], ["uploads/1111.pdf", "uploads/2222.pdf"])
+
+    def test_chunks_without_offsets_pass_through(self):
+        doc = Document(page_content="legacy", metadata={"source": "a.pdf"})
+        self.assertEqual(merge_adjacent([doc, _chunk(0)])[0], doc)
+
+
+class ChunkingTests(SimpleTestCase):
+    text = " ".join(f"Sentence number {i} talks about topic {i % 7}." for i in range(200))
+
+    def test_chunks_fit_size_and_point_into_the_page(self):
+        page = Document(page_content=self.text, metadata={"source": "a.txt", "page": 1})
+        chunks = list(iter_chunks([page], ChunkingConfig("recursive", 300, 60)))
+        self.assertGreater(len(chunks), 1)
+        for chunk in chunks:
+            self.assertLessEqual(len(chunk.page_content), 300)
+            start = chunk.metadata["start_index"]
+            self.assertEqual(self.text[start : start + len(chunk.page_content)], chunk.page_content)
+            self.assertEqual(chunk.metadata["page"], 1)
+
+    def test_consecutive_chunks_overlap_and_cover_the_page(self):
+        page = Document(page_content=self.text, metadata={})
+        chunks = list(iter_chunks([page], ChunkingConfig("recursive", 300, 60)))
+        self.assertEqual(chunks[0].metadata["start_index"], 0)
+        for previous, chunk in zip(chunks, chunks[1:]):
+            previous_end = previous.metadata["start_index"] + len(previous.page_content)
+            self.assertLess(chunk.metadata["start_index"], previous_end)
+        last = chunks[-1]
+        self.assertEqual(last.metadata["start_index"] + len(last.page_content), len(self.text))
+
+    def test_structure_mode_records_section(self):
+        text = "# Intro\n" + "Some words here. " * 10 + "\n\n# Usage\n" + "More words there. " * 10
+        chunks = list(iter_chunks([Document(page_content=text, metadata={})], ChunkingConfig("structure", 150, 20)))
+        sections = [chunk.metadata.get("section") for chunk in chunks]
+        self.assertEqual(sections, sorted(sections, key=["Intro", "Usage"].index))
+        self.assertEqual(set(sections), {"Intro", "Usage"})
+        usage = text.index("# Usage")
+        for chunk in chunks:
+            start = chunk.metadata["start_index"]
+            # Chunks never straddle the heading.
+            self.assertTrue(start + len(chunk.page_content) <= usage or start >= usage)
+
+    def test_unknown_mode_is_rejected(self):
+        with self.assertRaises(ValueError):
+            list(iter_chunks([Document(page_content="text", metadata={})], ChunkingConfig("words", 10, 0)))
+
+
+class ReciprocalRankFusionTests(SimpleTestCase):
+    def test_ids_found_by_both_rankings_win(self):
+        self.assertEqual(reciprocal_rank_fusion([["a", "b", "c"], ["c", "d", "a"]], 2), ["a", "c"])
+
+    def test_scores_sum_reciprocal_ranks(self):
+        scores = dict(fused_scores([["a", "b"], ["b"]], 5))
+        self.assertAlmostEqual(scores["a"], 1 / (RRF_K + 1))
+        self.assertAlmostEqual(scores["b"], 1 / (RRF_K + 2) + 1 / (RRF_K + 1))
+
+
+class _ReversedIndex:
+    """Stand-in compressed index returning candidates worst-first, padded with -1."""
+
+    def __init__(self, d):
+        self.d = d
+        self.vectors = np.empty((0, d), dtype="float32")
+
+    @property
+    def ntotal(self):
+        return len(self.vectors)
+
+    def add(self, codes):
+        self.vectors = np.vstack([self.vectors, codes])
+
+    def search(self, queries, k):
+        order = np.argsort(((queries[:, None, :] - self.vectors[None]) ** 2).sum(axis=2), axis=1)
+        labels = np.full((len(queries), k), -1, dtype="int64")
+        taken = order[:, : k - 1][:, ::-1]
+        labels[:, : taken.shape[1]] = taken
+        return None, labels
+
+
+class RescoringIndexTests(SimpleTestCase):
+    def test_candidates_are_reranked_by_exact_distance(self):
+        rng = np.random.default_rng(0)
+        vectors = rng.normal(size=(50, 8)).astype("float32")
+        queries = rng.normal(size=(3, 8)).astype("float32")
+        index = RescoringIndex(_ReversedIndex(8), factor=4)
+        index.add(vectors)
+
+        distances, labels = index.search(queries, 3)
+        stored = vectors.astype("float16").astype("float32")
+        exact = ((queries[:, None, :] - stored[None]) ** 2).sum(axis=2)
+        np.testing.assert_array_equal(labels, np.argsort(exact, axis=1)[:, :3])
+        self.assertTrue(np.all(np.diff(distances, axis=1) >= 0))
+        self.assertEqual(index.exact.dtype, np.float16)
+
+    def test_binary_codes_are_packed_bits(self):
+        index = RescoringIndex(_ReversedIndex(1), thresholds=np.zeros(8))
+        codes = index._codes(np.array([[1, -1, 1, -1, 1, -1, 1, -1]], dtype="float32"))
+        np.testing.assert_array_equal(codes, [[0b10101010]])
+
+
+class _CountingEmbeddings(DeterministicFakeEmbedding):
+    embedded: list = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return super().embed_documents(texts)
+
+
+class _StoreMixin:
+    """Builds real stores from text files, embedded by a counting stand-in model."""
+
+    def setUp(self):
+        super().setUp()
+        self.root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.model = f"test-{uuid.uuid4().hex}"
+        self.embeddings = _CountingEmbeddings(size=16)
+        register_embeddings(self.model, self.embeddings)
+        self.enterContext(
+            override_settings(
+                VECTORSTORE_ROOT=self.root / "stores",
+                SHARD_ROOT=self.root / "shards",
+                TEXT_CACHE_ROOT=self.root / "text",
+                PARSE_WORKERS=1,
+                EMBEDDING_MODEL=self.model,
+            )
+        )
+
+    def write(self, name, text):
+        path = self.root / name
+        path.write_text(text, encoding="utf-8")
+        return path
+
+    def build_store(self, agent_id, files):
+        """Build a store from ``{name: text}`` and return its path."""
+        paths = [self.write(f"{agent_id}-{name}", text) for name, text in files.items()]
+        return build_vectorstore(paths, user_id=1, agent_id=agent_id, names=list(files))
+
+
+class ShardReuseTests(_StoreMixin, SimpleTestCase):
+    """Agent builds embed only documents no earlier build has a shard for."""
+
+    def chunk_metadata(self, store_path):
+        with sqlite3.connect(store_path / DOCSTORE_FILE) as conn:
+            return [json.loads(row[0]) for row in conn.execute("SELECT metadata FROM chunks ORDER BY id")]
+
+    def test_second_agent_embeds_only_new_documents(self):
+        shared = self.write("shared.txt", "Shared handbook text. " * 20)
+        build_vectorstore([shared, self.write("first.txt", "Only in the first agent.")], user_id=1, agent_id="a")
+        self.embeddings.embedded.clear()
+
+        store = build_vectorstore(
+            [shared, self.write("second.txt", "Only in the second agent.")],
+            user_id=1,
+            agent_id="b",
+            names=["handbook.txt", "second.txt"],
+        )
+        self.assertEqual(self.embeddings.embedded, ["Only in the second agent."])
+        metadata = self.chunk_metadata(store)
+        self.assertEqual({m["name"] for m in metadata}, {"handbook.txt", "second.txt"})
+        self.assertEqual({m["source"] for m in metadata}, {str(shared), str(self.root / "second.txt")})
+
+    def test_chunking_change_re_embeds(self):
+        path = self.write("doc.txt", "Some text to index. " * 20)
+        build_vectorstore([path], user_id=1, agent_id="a")
+        self.embeddings.embedded.clear()
+        build_vectorstore([path], user_id=1, agent_id="a", chunking={"chunk_size": 100, "chunk_overlap": 0})
+        self.assertTrue(self.embeddings.embedded)
+
+
+class LRUCacheTests(SimpleTestCase):
+    def test_evicts_least_recently_used_by_bytes(self):
+        cache = LRUCache(max_bytes=100)
+        cache.set("a", 1, size=40)
+        cache.set("b", 2, size=40)
+        cache.get("a")
+        cache.set("c", 3, size=40)
+        self.assertNotIn("b", cache)
+        self.assertEqual(cache.stats()["bytes"], 80)
+
+    def test_rejects_entry_larger_than_cache(self):
+        cache = LRUCache(max_bytes=10)
+        self.assertFalse(cache.set("a", 1, size=11))
+        self.assertEqual(len(cache), 0)
+
+
+class DiskVectorCacheTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.cache = DiskVectorCache(Path(tmp.name) / "vectors.sqlite3")
+
+    def test_round_trip(self):
+        self.cache.set("q", [0.5, 1.5])
+        np.testing.assert_array_equal(self.cache.get("q"), np.array([0.5, 1.5], dtype="float32"))
+
+    def test_locked_database_is_a_miss(self):
+        conn = mock.Mock()
+        conn.execute.side_effect = sqlite3.OperationalError("database is locked")
+        with mock.patch.object(self.cache, "_connection", return_value=conn):
+            self.assertIsNone(self.cache.get("q"))
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 1))
+
+    def test_concurrent_lookups_are_all_counted(self):
+        self.cache.set("q", [1.0])
+
+        def lookup():
+            for _ in range(200):
+                self.cache.get("q")
+                self.cache.get("missing")
+
+        threads = [threading.Thread(target=lookup) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual((self.cache.hits, self.cache.misses), (800, 800))
+
+
+class OnnxExportTests(SimpleTestCase):
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+
+    def test_missing_packages_fail_before_exporting(self):
+        with mock.patch("chat.embedding_backends.find_spec", return_value=None):
+            with self.assertRaisesRegex(ImportError, "torch, transformers, onnx, onnxruntime"):
+                export_onnx_model("org/model", self.root)
+        self.assertFalse((self.root / "org__model").exists())
+
+    def test_cached_export_only_needs_quantization_packages(self):
+        target = self.root / "org__model"
+        target.mkdir()
+        (target / FP32_FILE).write_bytes(b"onnx")
+        with mock.patch("chat.embedding_backends.find_spec", return_value=None):
+            self.assertEqual(export_onnx_model("org/model", self.root, quantize=False), target / FP32_FILE)
+            with self.assertRaisesRegex(ImportError, "needs onnx, onnxruntime;"):
+                export_onnx_model("org/model", self.root)
+
+
+class ListQueryCountTests(TestCase):
+    """List and detail endpoints cost a fixed number of queries however many rows there are."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user("owner", password="secret")
+        cls.documents = [
+            UploadedDocument.objects.create(owner=cls.user, name=f"doc{i}.txt", file=f"uploads/doc{i}.txt")
+            for i in range(4)
+        ]
+        cls.agents = []
+        for i in range(3):
+            agent = Agent.objects.create(owner=cls.user, name=f"agent{i}", store_path="")
+            agent.documents.set(cls.documents[i:])
+            cls.agents.append(agent)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_agent_list(self):
+        with self.assertNumQueries(2):
+            response = self.client.get("/api/agents/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["results"]), 3)
+        self.assertEqual(sorted(a["documents_count"] for a in response.data["results"]), [2, 3, 4])
+
+    def test_agent_list_without_documents(self):
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/agents/", {"omit": "documents"})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("documents", response.data["results"][0])
+
+    def test_agent_retrieve(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(f"/api/agents/{self.agents[0].pk}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["documents"]), 4)
+
+    def test_document_list(self):
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/documents/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["results"]), 4)
+
+    def test_document_retrieve(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(f"/api/documents/{self.documents[0].pk}/")
+        self.assertEqual(response.status_code, 200)
+
+
+class AgentIndexSettingsTests(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.enterContext(override_settings(VECTORSTORE_ROOT=self.root))
+        user = get_user_model().objects.create_user("owner", password="secret")
+        self.agent = Agent.objects.create(owner=user, name="agent", store_path="")
+        self.agent.documents.set(
+            [UploadedDocument.objects.create(owner=user, name="doc.txt", file="uploads/doc.txt")]
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+
+    def test_change_during_first_build_restarts_it(self):
+        running = BuildJob.objects.create(
+            owner=self.agent.owner, agent=self.agent, status=BuildJob.STATUS_RUNNING, worker_id=WORKER_ID
+        )
+        response = self.client.patch(f"/api/agents/{self.agent.id}/", {"chunk_size": 500}, format="json")
+        self.assertEqual(response.status_code, 202)
+        running.refresh_from_db()
+        self.assertTrue(running.cancel_requested)
+        self.assertTrue(
+            BuildJob.objects.filter(agent=self.agent, status=BuildJob.STATUS_QUEUED, cancel_requested=False).exists()
+        )
+
+    def test_change_without_index_or_build_only_saves(self):
+        response = self.client.patch(f"/api/agents/{self.agent.id}/", {"chunk_size": 500}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["chunk_size"], 500)
+        self.assertFalse(BuildJob.objects.exists())
+
+
+def _fake_answer(inputs):
+    if inputs["question"] == "fail":
+        raise ValueError("model unavailable")
+    return f"answer to {inputs['question']}"
+
+
+def _fake_qa(**kwargs):
+    """QA parts that answer without a vectorstore or provider."""
+    return SimpleNamespace(
+        retriever=RunnableLambda(
+            lambda query: [
+                Document(page_content=query, metadata={"source": "uploads/1.txt", "name": "a.txt", "page": 0})
+            ]
+        ),
+        answer=RunnableLambda(_fake_answer),
+        rewrite=RunnableLambda(lambda inputs: f"standalone {inputs['question']}"),
+        summarize=RunnableLambda(lambda inputs: "summary"),
+    )
+
+
+@mock.patch("chat.views.build_qa_parts", _fake_qa)
+class ChatViewTests(TestCase):
+    """The sync and async chat views answer and record exchanges alike."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("owner", password="secret")
+        self.agent = Agent.objects.create(owner=self.user, name="agent", store_path="/stores/agent", api_key="key")
+        self.conversation = Conversation.objects.create(owner=self.user, agent=self.agent)
+        self.body = {"agent_id": str(self.agent.id), "conversation_id": str(self.conversation.id)}
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def expected(self, message, query):
+        return {
+            "answer": f"answer to {message}",
+            "sources": [{"source": "a.txt", "page": 0}],
+            "agent_id": str(self.agent.id),
+            "vectorstore": "/stores/agent",
+            "cached": False,
+            "conversation_id": str(self.conversation.id),
+            "search_query": query,
+        }
+
+    def test_sync_view(self):
+        first = self.client.post("/api/chat", {**self.body, "message": "one"}, format="json")
+        second = self.client.post("/api/chat", {**self.body, "message": "two"}, format="json")
+        self.assertEqual(first.json(), self.expected("one", "one"))
+        self.assertEqual(second.json(), self.expected("two", "standalone two"))
+        self.assertEqual(self.conversation.turns.count(), 4)
+
+    async def test_async_view(self):
+        headers = {"Authorization": f"Bearer {RefreshToken.for_user(self.user).access_token}"}
+        responses = [
+            await self.async_client.post(
+                "/api/chat/async", {**self.body, "message": message}, content_type="application/json", headers=headers
+            )
+            for message in ("one", "two")
+        ]
+        self.assertEqual(responses[0].json(), self.expected("one", "one"))
+        self.assertEqual(responses[1].json(), self.expected("two", "standalone two"))
+        self.assertEqual(await ConversationTurn.objects.filter(conversation=self.conversation).acount(), 4)
+
+    def test_unknown_conversation_is_not_found(self):
+        body = {**self.body, "conversation_id": str(uuid.uuid4()), "message": "one"}
+        self.assertEqual(self.client.post("/api/chat", body, format="json").status_code, 404)
+
+
+class BuildJobTests(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.enterContext(override_settings(VECTORSTORE_ROOT=self.root))
+        self.user = get_user_model().objects.create_user("owner", password="secret")
+        self.agent = Agent.objects.create(owner=self.user, name="agent", store_path="")
+        self.agent.documents.set(
+            [UploadedDocument.objects.create(owner=self.user, name="doc.txt", file="uploads/doc.txt")]
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def job(self, status=BuildJob.STATUS_QUEUED):
+        return BuildJob.objects.create(owner=self.user, agent=self.agent, status=status, worker_id=WORKER_ID)
+
+    def test_cancelling_a_queued_job_stops_it(self):
+        job = self.job()
+        response = self.client.post(f"/api/jobs/{job.id}/cancel/")
+        self.assertEqual(response.data["status"], BuildJob.STATUS_CANCELLED)
+        _run_build(job.id)
+        job.refresh_from_db()
+        self.assertEqual(job.status, BuildJob.STATUS_CANCELLED)
+
+    def test_running_job_stops_at_next_progress_tick(self):
+        job = self.job()
+
+        def build(*args, progress, **kwargs):
+            cancel_job(BuildJob.objects.get(pk=job.pk))
+            progress("embed", 0.5)
+            self.fail("progress should raise once cancellation is requested")
+
+        with mock.patch("chat.jobs.build_vectorstore", side_effect=build):
+            _run_build(job.id)
+        job.refresh_from_db()
+        self.assertEqual(job.status, BuildJob.STATUS_CANCELLED)
+        self.agent.refresh_from_db()
+        self.assertEqual(self.agent.store_path, "")
+
+    def test_successful_build_swaps_in_the_store(self):
+        job = self.job()
+        with mock.patch("chat.jobs.build_vectorstore", return_value=Path(self.root) / "agent"):
+            _run_build(job.id)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.progress), (BuildJob.STATUS_SUCCEEDED, 1.0))
+        self.agent.refresh_from_db()
+        self.assertEqual(self.agent.store_path, str(Path(self.root) / "agent"))
+
+    def test_failed_build_records_the_error(self):
+        job = self.job()
+        with mock.patch("chat.jobs.build_vectorstore", side_effect=ValueError("No text")):
+            _run_build(job.id)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error), (BuildJob.STATUS_FAILED, "No text"))
+
+
+class SingleFlightTests(SimpleTestCase):
+    def test_concurrent_calls_share_one_execution(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def load():
+            calls.append(1)
+            release.wait(5)
+            return "store"
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(flight.do("k", load))) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        deadline = time.monotonic() + 5
+        while flight.shared < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual((results, len(calls), flight.shared), (["store"] * 3, 1, 2))
+        # Nothing is cached once the call finished.
+        self.assertEqual(flight.do("k", lambda: "fresh"), "fresh")
+
+    def test_errors_propagate_to_the_caller(self):
+        with self.assertRaises(KeyError):
+            SingleFlight().do("k", lambda: {}["missing"])
+
+
+class FileLockTests(SimpleTestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        self.enterContext(override_settings(VECTORSTORE_ROOT=root))
+
+    def test_build_lock_is_not_waited_on(self):
+        with try_build_lock("agent") as acquired:
+            self.assertTrue(acquired)
+            other = []
+            thread = threading.Thread(target=lambda: other.append(try_build_lock("agent").__enter__()))
+            thread.start()
+            thread.join(5)
+            self.assertEqual(other, [False])
+        with try_build_lock("agent") as acquired:
+            self.assertTrue(acquired)
+
+    def test_process_liveness(self):
+        name = f"worker-{uuid.uuid4().hex}"
+        self.assertFalse(process_alive(name))
+        hold_process_lock(name)
+        self.assertTrue(process_alive(name))
+
+
+class OrphanedJobTests(TestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        self.enterContext(override_settings(VECTORSTORE_ROOT=root))
+        user = get_user_model().objects.create_user("owner", password="secret")
+        self.agent = Agent.objects.create(owner=user, name="agent", store_path="")
+
+    def job(self, worker_id, status=BuildJob.STATUS_QUEUED):
+        return BuildJob.objects.create(owner=self.agent.owner, agent=self.agent, status=status, worker_id=worker_id)
+
+    def test_jobs_of_exited_workers_are_failed(self):
+        orphaned = self.job("123-gone", BuildJob.STATUS_RUNNING)
+        live = self.job(WORKER_ID)
+        self.assertEqual(reap_orphaned_jobs(), 1)
+        orphaned.refresh_from_db()
+        live.refresh_from_db()
+        self.assertEqual((orphaned.status, orphaned.error), (BuildJob.STATUS_FAILED, ORPHANED_ERROR))
+        self.assertEqual(live.status, BuildJob.STATUS_QUEUED)
+
+    def test_enqueue_does_not_coalesce_into_an_orphaned_job(self):
+        orphaned = self.job("123-gone")
+        job = enqueue_build(self.agent)
+        self.assertNotEqual(job.pk, orphaned.pk)
+        self.assertEqual(job.worker_id, WORKER_ID)
+        self.assertEqual(enqueue_build(self.agent).pk, job.pk)
+
+    def test_startup_reap_runs_once_per_process(self):
+        self.enterContext(mock.patch.object(jobs, "_startup_reaped", threading.Event()))
+        with mock.patch("chat.jobs.reap_orphaned_jobs") as reap:
+            jobs.reap_orphaned_jobs_once()
+            jobs.reap_orphaned_jobs_once()
+        reap.assert_called_once_with()
+
+
+class SemanticCacheTests(SimpleTestCase):
+    def test_similar_query_is_served_the_cached_answer(self):
+        cache = SemanticCache(threshold=0.95, max_entries=10)
+        cache.store("How do refunds work?", [1.0, 0.0, 0.1], {"answer": "Within 30 days."})
+        hit = cache.lookup([0.9, 0.0, 0.1])
+        self.assertEqual(hit["answer"], "Within 30 days.")
+        self.assertGreaterEqual(hit["similarity"], 0.95)
+        self.assertIsNone(cache.lookup([0.0, 1.0, 0.0]))
+        self.assertEqual((cache.stats()["hits"], cache.stats()["misses"]), (1, 1))
+
+    def test_expired_answers_are_not_served(self):
+        cache = SemanticCache(threshold=0.9, max_entries=10, ttl=60)
+        with mock.patch("chat.cache.time.monotonic", return_value=1000.0):
+            cache.store("q", [1.0, 0.0], {"answer": "a"})
+        with mock.patch("chat.cache.time.monotonic", return_value=1061.0):
+            self.assertIsNone(cache.lookup([1.0, 0.0]))
+
+
+def _topic_vector(text):
+    return [1.0, 0.0] if "refund" in text else [0.0, 1.0]
+
+
+@mock.patch("chat.views.embed_query", _topic_vector)
+@mock.patch("chat.views.build_qa_parts", _fake_qa)
+class SemanticCacheViewTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("owner", password="secret")
+        self.agent = Agent.objects.create(
+            owner=self.user, name="agent", store_path="/stores/agent", api_key="key", semantic_cache_enabled=True
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def ask(self, message, **extra):
+        body = {"agent_id": str(self.agent.id), "message": message, **extra}
+        return self.client.post("/api/chat", body, format="json").json()
+
+    def test_repeated_question_is_answered_from_cache(self):
+        first = self.ask("How do refunds work?")
+        second = self.ask("how do refunds work")
+        self.assertFalse(first["cached"])
+        self.assertTrue(second["cached"])
+        self.assertEqual(second["answer"], first["answer"])
+        self.assertFalse(self.ask("Where is the office?")["cached"])
+
+    def test_editing_the_agent_starts_a_fresh_cache(self):
+        self.ask("How do refunds work?")
+        self.agent.system_prompt = "Answer briefly."
+        self.agent.save()
+        self.assertFalse(self.ask("How do refunds work?")["cached"])
+
+    def test_conversations_bypass_the_cache(self):
+        self.ask("How do refunds work?")
+        conversation = Conversation.objects.create(owner=self.user, agent=self.agent)
+        self.assertFalse(self.ask("How do refunds work?", conversation_id=str(conversation.id))["cached"])
+
+
+@mock.patch("chat.views.build_qa_parts", _fake_qa)
+class ChatBatchViewTests(_StoreMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        user = get_user_model().objects.create_user("owner", password="secret")
+        self.agent = Agent.objects.create(owner=user, name="agent", api_key="key")
+        self.agent.store_path = str(
+            self.build_store(
+                self.agent.id, {"refunds.txt": "Refunds take 30 days.", "office.txt": "The office is in Oslo."}
+            )
+        )
+        self.agent.save()
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+
+    def test_each_question_gets_its_answer_or_error(self):
+        questions = ["Refunds take 30 days.", "fail", "The office is in Oslo."]
+        response = self.client.post(
+            "/api/chat/batch", {"agent_id": str(self.agent.id), "questions": questions}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+        results = response.data["results"]
+        self.assertEqual([r["question"] for r in results], questions)
+        self.assertEqual(results[0]["answer"], "answer to Refunds take 30 days.")
+        self.assertEqual(results[0]["sources"][0], {"source": "refunds.txt", "page": 1})
+        self.assertEqual(results[1]["error"], "model unavailable")
+        self.assertNotIn("answer", results[1])
+        self.assertEqual(results[2]["sources"][0], {"source": "office.txt", "page": 1})
+
+    def test_agent_without_store_is_rejected(self):
+        self.agent.store_path = ""
+        self.agent.save()
+        response = self.client.post(
+            "/api/chat/batch", {"agent_id": str(self.agent.id), "questions": ["q"]}, format="json"
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class SearchViewTests(_StoreMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = get_user_model().objects.create_user("owner", password="secret")
+        self.hr = self.agent("hr", {"leave.txt": "Annual leave is 25 days."})
+        self.it = self.agent("it", {"vpn.txt": "Connect to the VPN before mounting drives."})
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def agent(self, name, files, owner=None):
+        agent = Agent.objects.create(owner=owner or self.user, name=name)
+        agent.store_path = str(self.build_store(agent.id, files))
+        agent.save()
+        return agent
+
+    def search(self, **body):
+        return self.client.post("/api/search", body, format="json")
+
+    def test_single_agent(self):
+        response = self.search(query="Annual leave is 25 days.", agent_id=str(self.hr.id), k=1)
+        self.assertEqual(response.status_code, 200)
+        [hit] = response.data["results"]
+        self.assertEqual(
+            (hit["agent_id"], hit["text"], hit["source"], hit["page"]),
+            (str(self.hr.id), "Annual leave is 25 days.", "leave.txt", 1),
+        )
+
+    def test_fan_out_searches_only_the_users_agents(self):
+        other = get_user_model().objects.create_user("other", password="secret")
+        self.agent("foreign", {"secret.txt": "Connect to the VPN before mounting drives."}, owner=other)
+        response = self.search(query="Connect to the VPN before mounting drives.")
+        self.assertEqual((response.data["agents_searched"], response.data["retrieval_mode"]), (2, "vector"))
+        results = response.data["results"]
+        self.assertEqual({hit["agent_id"] for hit in results}, {str(self.hr.id), str(self.it.id)})
+        self.assertEqual(results[0]["agent_id"], str(self.it.id))
+        self.assertEqual([hit["score"] for hit in results], sorted((hit["score"] for hit in results), reverse=True))
+
+    def test_failing_agent_is_reported_without_failing_the_search(self):
+        Agent.objects.filter(pk=self.hr.pk).update(store_path=str(self.root / "missing"))
+        response = self.search(query="Connect to the VPN before mounting drives.")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.data["errors"]), [str(self.hr.id)])
+        self.assertEqual({hit["agent_id"] for hit in response.data["results"]}, {str(self.it.id)})
+
+    def test_agent_without_store_is_rejected(self):
+        agent = Agent.objects.create(owner=self.user, name="empty")
+        self.assertEqual(self.search(query="q", agent_id=str(agent.id)).status_code, 400)
+
+
+@override_settings(CONVERSATION_WINDOW_TOKENS=25, CONVERSATION_SUMMARY_TOKENS=5)
+class ConversationSummaryTests(TestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_user("owner", password="secret")
+        agent = Agent.objects.create(owner=user, name="agent")
+        self.conversation = Conversation.objects.create(owner=user, agent=agent)
+        self.summaries = []
+        self.qa = SimpleNamespace(summarize=RunnableLambda(self.summarize))
+        for i in range(3):
+            self.exchange(i)
+
+    def exchange(self, i):
+        # 10 estimated tokens per turn.
+        record_exchange(
+            self.conversation, f"Question number {i} about the handbook?", f"Answer number {i} about the handbook..."
+        )
+
+    def summarize(self, inputs):
+        self.summaries.append(inputs)
+        return f"summary {len(self.summaries)}"
+
+    def test_turns_outside_the_window_are_folded_into_the_summary(self):
+        history = prepare_history(self.conversation, self.qa)
+        self.assertEqual(len(self.summaries), 1)
+        self.assertEqual(self.summaries[0]["summary"], "(none)")
+        self.assertIn("User: Question number 0", self.summaries[0]["turns"])
+        self.assertNotIn("number 2", self.summaries[0]["turns"])
+        self.assertEqual(history.summary, "summary 1")
+        self.assertEqual([role for role, _ in history.turns], ["user", "assistant"])
+        self.assertTrue(history.turns[0][1].startswith("Question number 2"))
+
+        self.conversation.refresh_from_db()
+        evicted = self.conversation.turns.order_by("id")[3]
+        self.assertEqual(self.conversation.summarized_through, evicted.id)
+
+    def test_only_newly_evicted_turns_are_summarized(self):
+        prepare_history(self.conversation, self.qa)
+        prepare_history(self.conversation, self.qa)
+        self.assertEqual(len(self.summaries), 1)
+
+        self.exchange(3)
+        history = prepare_history(self.conversation, self.qa)
+        self.assertEqual(self.summaries[1]["summary"], "summary 1")
+        self.assertIn("Question number 2", self.summaries[1]["turns"])
+        self.assertNotIn("Question number 1", self.summaries[1]["turns"])
+        self.assertEqual(history.summary, "summary 2")
+
+    def test_summary_is_capped(self):
+        self.qa = SimpleNamespace(summarize=RunnableLambda(lambda inputs: "word " * 100))
+        history = prepare_history(self.conversation, self.qa)
+        self.assertEqual(len(history.summary), 5 * 4)
+
+    async def test_async_history_matches(self):
+        history = await aprepare_history(self.conversation, self.qa)
+        self.assertEqual((history.summary, len(history.turns)), ("summary 1", 2))
+
+
+class ConversationFilterTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user("owner", password="secret"))
+
+    def test_malformed_agent_id_is_a_bad_request(self):
+        response = self.client.get("/api/conversations/", {"agent_id": "not-a-uuid"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("agent_id", response.data)
+
+
+class MetricsAuthTests(SimpleTestCase):
+    @override_settings(METRICS_TOKEN="")
+    def test_disabled_without_token(self):
+        self.assertEqual(self.client.get("/api/metrics").status_code, 403)
+
+    @override_settings(METRICS_TOKEN="s3cret")
+    def test_requires_matching_bearer_token(self):
+        self.assertEqual(self.client.get("/api/metrics").status_code, 401)
+        self.assertEqual(self.client.get("/api/metrics", HTTP_AUTHORIZATION="Bearer wrong").status_code, 401)
+        self.assertEqual(self.client.get("/api/metrics", HTTP_AUTHORIZATION="Bearer s3cret").status_code, 200)
+
+
+class DocumentUploadTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def _upload(self, username, filename):
+        client = APIClient()
+        client.force_authenticate(get_user_model().objects.create_user(username, password="secret"))
+        upload = SimpleUploadedFile(filename, b"same content", content_type="text/plain")
+        response = client.post("/api/documents/", {"file": upload}, format="multipart")
+        self.assertEqual(response.status_code, 201)
+        return UploadedDocument.objects.get(pk=response.data["id"])
+
+    def test_identical_uploads_share_a_hash_named_file(self):
+        first = self._upload("alice", "alice-notes.txt")
+        second = self._upload("bob", "bob-notes.txt")
+        self.assertEqual(first.file.name, second.file.name)
+        self.assertEqual(first.file.name, f"uploads/{first.sha256}.txt")
+        self.assertEqual((first.name, second.name), ("alice-notes.txt", "bob-notes.txt"))
@@ -3,18 +3,28 @@ from rest_framework.routers import DefaultRouter
 
 from .views import (
     AgentViewSet,
+    AsyncChatStreamView,
+    AsyncChatView,
+    BuildJobViewSet,
+    ChatBatchView,
+    ChatStreamView,
     ChatView,
+    ConversationViewSet,
     DocumentViewSet,
     LoginView,
+    MetricsView,
     MeView,
     ModelListView,
     RefreshView,
     RegisterView,
+    SearchView,
 )
 
 router = DefaultRouter()
 router.register(r"documents", DocumentViewSet, basename="documents")
 router.register(r"agents", AgentViewSet, basename="agents")
+router.register(r"jobs", BuildJobViewSet, basename="jobs")
+router.register(r"conversations", ConversationViewSet, basename="conversations")
 
 urlpatterns = [
     path("auth/register", RegisterView.as_view(), name="register"),
@@ -22,7 +32,13 @@ urlpatterns = [
     path("auth/refresh", RefreshView.as_view(), name="token_refresh"),
     path("auth/me", MeView.as_view(), name="me"),
     path("models", ModelListView.as_view(), name="list-models"),
+    path("metrics", MetricsView.as_view(), name="metrics"),
+    path("search", SearchView.as_view(), name="search"),
     path("chat", ChatView.as_view(), name="chat"),
+    path("chat/stream", ChatStreamView.as_view(), name="chat-stream"),
+    path("chat/batch", ChatBatchView.as_view(), name="chat-batch"),
+    path("chat/async", AsyncChatView.as_view(), name="chat-async"),
+    path("chat/async/stream", AsyncChatStreamView.as_view(), name="chat-async-stream"),
 ]
 
 urlpatterns += router.urls
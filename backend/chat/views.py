@@ -1,28 +1,66 @@
-import shutil
+import hashlib
+import hmac
+import json
+import time
+import uuid
 from pathlib import Path
+from typing import List
 
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Count
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from rest_framework import status, viewsets
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from langchain_core.documents import Document
+from rest_framework import exceptions, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.parsers import MultiPartParser
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
-from .langchain_utils import build_qa_chain, build_vectorstore, model_catalog
-from .models import Agent, UploadedDocument
+from . import metrics
+from .conversations import History, aprepare_history, asearch_query, prepare_history, record_exchange, search_query
+from .jobs import cancel_agent_jobs, cancel_job, enqueue_build
+from .langchain_utils import (
+    SearchTarget,
+    batch_similarity_search,
+    build_qa_parts,
+    embed_query,
+    get_semantic_cache,
+    model_catalog,
+    remove_store,
+    run_cpu_bound,
+    search_stores,
+    source_metadata,
+    source_name,
+    store_version,
+)
+from .models import Agent, BuildJob, Conversation, UploadedDocument
+from .pagination import NewestFirstCursorPagination
+from .parsing import content_hash
 from .serializers import (
     AgentCreateSerializer,
     AgentSerializer,
     AgentUpdateSerializer,
+    BuildJobSerializer,
+    ChatBatchRequestSerializer,
     ChatRequestSerializer,
+    ConversationCreateSerializer,
+    ConversationDetailSerializer,
+    ConversationSerializer,
     RegisterSerializer,
+    SearchRequestSerializer,
     UploadedDocumentSerializer,
 )
+from .shards import remove_shards
 
 User = get_user_model()
 
@@ -57,19 +95,44 @@ class DocumentViewSet(viewsets.ModelViewSet):
     serializer_class = UploadedDocumentSerializer
     permission_classes = [IsAuthenticated]
     parser_classes = [MultiPartParser]
+    pagination_class = NewestFirstCursorPagination
 
     def get_queryset(self):
         return UploadedDocument.objects.filter(owner=self.request.user).order_by("-created_at")
 
     def perform_create(self, serializer):
-        serializer.save(owner=self.request.user, name=serializer.validated_data["file"].name)
+        upload = serializer.validated_data["file"]
+        digest = content_hash(upload)
+        name = upload.name
+        # Files are stored under their content hash, so identical uploads share one file
+        # and its URL says nothing about who uploaded it first; ``name`` stays per record.
+        upload.name = f"{digest}{Path(name).suffix.lower()}"
+        field = UploadedDocument._meta.get_field("file")
+        stored_name = field.generate_filename(None, upload.name)
+        extra = {"file": stored_name} if field.storage.exists(stored_name) else {}
+        serializer.save(owner=self.request.user, name=name, sha256=digest, **extra)
+
+    def perform_destroy(self, instance):
+        digest = instance.sha256
+        instance.delete()
+        # Drop the document's embedding shards once no upload with that content remains.
+        if digest and not UploadedDocument.objects.filter(sha256=digest).exists():
+            remove_shards(settings.SHARD_ROOT, digest)
 
 
 class AgentViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
+    pagination_class = NewestFirstCursorPagination
 
     def get_queryset(self):
-        return Agent.objects.filter(owner=self.request.user).prefetch_related("documents")
+        queryset = Agent.objects.filter(owner=self.request.user)
+        if self.action in ("list", "retrieve"):
+            # Two queries per page however many agents and documents: the agents with
+            # their document counts, plus one prefetch unless ?omit=documents.
+            queryset = queryset.annotate(documents_count=Count("documents", distinct=True))
+            if AgentSerializer.includes(self.request, "documents"):
+                queryset = queryset.prefetch_related("documents")
+        return queryset
 
     def get_serializer_class(self):
         if self.action == "create":
@@ -79,20 +142,19 @@ class AgentViewSet(viewsets.ModelViewSet):
         return AgentSerializer
 
     def list(self, request, *args, **kwargs):
-        serializer = AgentSerializer(self.get_queryset(), many=True)
-        return Response(serializer.data)
+        page = self.paginate_queryset(self.get_queryset())
+        serializer = AgentSerializer(page, many=True, context={"request": request})
+        return self.get_paginated_response(serializer.data)
 
     def retrieve(self, request, *args, **kwargs):
         agent = self.get_object()
-        serializer = AgentSerializer(agent)
+        serializer = AgentSerializer(agent, context={"request": request})
         return Response(serializer.data)
 
     def create(self, request, *args, **kwargs):
         serializer = AgentCreateSerializer(data=request.data, context={"request": request})
         serializer.is_valid(raise_exception=True)
-        docs = list(
-            UploadedDocument.objects.filter(id__in=serializer.validated_data["document_ids"], owner=request.user)
-        )
+        docs = serializer.validated_data["document_ids"]
         agent = Agent.objects.create(
             owner=request.user,
             name=serializer.validated_data["name"],
@@ -101,14 +163,22 @@ class AgentViewSet(viewsets.ModelViewSet):
             max_tokens=serializer.validated_data["max_tokens"],
             system_prompt=serializer.validated_data.get("system_prompt", ""),
             api_key=serializer.validated_data["api_key"],
+            index_type=serializer.validated_data["index_type"],
+            search_nprobe=serializer.validated_data.get("search_nprobe"),
+            search_ef_search=serializer.validated_data.get("search_ef_search"),
+            retrieval_mode=serializer.validated_data["retrieval_mode"],
+            context_token_budget=serializer.validated_data.get("context_token_budget"),
+            semantic_cache_enabled=serializer.validated_data["semantic_cache_enabled"],
+            semantic_cache_threshold=serializer.validated_data["semantic_cache_threshold"],
+            chunking_mode=serializer.validated_data["chunking_mode"],
+            chunk_size=serializer.validated_data["chunk_size"],
+            chunk_overlap=serializer.validated_data["chunk_overlap"],
+            quantization=serializer.validated_data["quantization"],
             store_path="",  # set after vectorstore build
         )
         agent.documents.set(docs)
-        file_paths = [Path(doc.file.path) for doc in docs]
-        _, store_path = build_vectorstore(file_paths, user_id=request.user.id, agent_id=agent.id)
-        agent.store_path = str(store_path)
-        agent.save(update_fields=["store_path"])
-        return Response(AgentSerializer(agent).data, status=status.HTTP_201_CREATED)
+        job = enqueue_build(agent)
+        return self._build_accepted(agent, job)
 
     def partial_update(self, request, *args, **kwargs):
         agent = self.get_object()
@@ -130,45 +200,71 @@ class AgentViewSet(viewsets.ModelViewSet):
             agent.system_prompt = data["system_prompt"]
         if "api_key" in data:
             agent.api_key = data["api_key"]
-
+        if "search_nprobe" in data:
+            agent.search_nprobe = data["search_nprobe"]
+        if "search_ef_search" in data:
+            agent.search_ef_search = data["search_ef_search"]
+        if "retrieval_mode" in data:
+            agent.retrieval_mode = data["retrieval_mode"]
+        if "context_token_budget" in data:
+            agent.context_token_budget = data["context_token_budget"]
+        if "semantic_cache_enabled" in data:
+            agent.semantic_cache_enabled = data["semantic_cache_enabled"]
+        if "semantic_cache_threshold" in data:
+            agent.semantic_cache_threshold = data["semantic_cache_threshold"]
+        index_changed = False
+        for field in ("index_type", "chunking_mode", "chunk_size", "chunk_overlap", "quantization"):
+            if field in data and data[field] != getattr(agent, field):
+                setattr(agent, field, data[field])
+                index_changed = True
+        if agent.chunk_overlap >= agent.chunk_size:
+            return Response(
+                {"chunk_overlap": ["Must be smaller than chunk_size."]}, status=status.HTTP_400_BAD_REQUEST
+            )
+        if index_changed:
+            # Rebuild an existing index, and restart a first build that may already
+            # have read the old settings.
+            docs_changed = bool(agent.store_path) or BuildJob.objects.filter(
+                agent=agent, status__in=BuildJob.ACTIVE_STATUSES
+            ).exists()
+
+        has_documents = None
         if "document_ids" in data:
-            docs = list(UploadedDocument.objects.filter(id__in=data["document_ids"], owner=request.user))
-            agent.documents.set(docs)
+            agent.documents.set(data["document_ids"])
             docs_changed = True
+            has_documents = bool(data["document_ids"])
+        elif docs_changed:
+            has_documents = agent.documents.exists()
 
-        if docs_changed:
-            file_paths = [Path(doc.file.path) for doc in agent.documents.all()]
-            # Rebuild vectorstore because docs changed
-            self._safe_remove_store(agent.store_path)
-            if file_paths:
-                _, store_path = build_vectorstore(file_paths, user_id=request.user.id, agent_id=agent.id)
-                agent.store_path = str(store_path)
-            else:
-                agent.store_path = ""
+        if docs_changed and not has_documents:
+            cancel_agent_jobs(agent)
+            remove_store(agent.store_path)
+            agent.store_path = ""
 
+        # Save before enqueueing: the job may start immediately and reads the agent from the DB.
         agent.save()
+        if docs_changed and has_documents:
+            # Rebuild vectorstore because docs changed; the old index serves chats meanwhile
+            job = enqueue_build(agent)
+            return self._build_accepted(agent, job)
         return Response(AgentSerializer(agent).data)
 
     def destroy(self, request, *args, **kwargs):
         agent = self.get_object()
+        cancel_agent_jobs(agent)
         store_path = agent.store_path
         agent.delete()
-        self._safe_remove_store(store_path)
+        remove_store(store_path)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=True, methods=["post"])
     def rebuild(self, request, pk=None):
         agent = self.get_object()
-        docs = list(agent.documents.all())
-        if not docs:
+        if not agent.documents.exists():
             return Response({"detail": "Agent has no documents."}, status=status.HTTP_400_BAD_REQUEST)
 
-        file_paths = [Path(doc.file.path) for doc in docs]
-        self._safe_remove_store(agent.store_path)
-        _, store_path = build_vectorstore(file_paths, user_id=request.user.id, agent_id=agent.id)
-        agent.store_path = str(store_path)
-        agent.save(update_fields=["store_path"])
-        return Response(AgentSerializer(agent).data)
+        job = enqueue_build(agent)
+        return self._build_accepted(agent, job)
 
     @action(detail=True, methods=["post"])
     def reset_kb(self, request, pk=None):
@@ -176,19 +272,250 @@ class AgentViewSet(viewsets.ModelViewSet):
         Clears the agent's knowledge base and unlinks all documents.
         """
         agent = self.get_object()
-        self._safe_remove_store(agent.store_path)
+        cancel_agent_jobs(agent)
+        remove_store(agent.store_path)
         agent.store_path = ""
         agent.documents.clear()
         agent.save(update_fields=["store_path"])
         return Response(AgentSerializer(agent).data)
 
+    @action(detail=True, methods=["get"])
+    def jobs(self, request, pk=None):
+        agent = self.get_object()
+        serializer = BuildJobSerializer(agent.build_jobs.all()[:20], many=True)
+        return Response(serializer.data)
+
     @staticmethod
-    def _safe_remove_store(path_str: str):
-        if not path_str:
-            return
-        path = Path(path_str)
-        if path.exists() and path.is_dir():
-            shutil.rmtree(path, ignore_errors=True)
+    def _build_accepted(agent: Agent, job: BuildJob):
+        data = AgentSerializer(agent).data
+        data["job"] = BuildJobSerializer(job).data
+        return Response(data, status=status.HTTP_202_ACCEPTED)
+
+
+class BuildJobViewSet(viewsets.ReadOnlyModelViewSet):
+    serializer_class = BuildJobSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return BuildJob.objects.filter(owner=self.request.user)
+
+    @action(detail=True, methods=["post"])
+    def cancel(self, request, pk=None):
+        job = cancel_job(self.get_object())
+        return Response(BuildJobSerializer(job).data)
+
+
+class ConversationViewSet(viewsets.ModelViewSet):
+    """Server-side chat sessions; pass ``conversation_id`` to the chat endpoints to use one."""
+
+    permission_classes = [IsAuthenticated]
+    http_method_names = ["get", "post", "delete", "head", "options"]
+
+    def get_queryset(self):
+        queryset = Conversation.objects.filter(owner=self.request.user)
+        agent_id = self.request.query_params.get("agent_id")
+        if agent_id:
+            try:
+                agent_id = uuid.UUID(agent_id)
+            except ValueError:
+                raise exceptions.ValidationError({"agent_id": ["Must be a valid UUID."]})
+            queryset = queryset.filter(agent_id=agent_id)
+        if self.action == "retrieve":
+            queryset = queryset.prefetch_related("turns")
+        return queryset
+
+    def get_serializer_class(self):
+        if self.action == "create":
+            return ConversationCreateSerializer
+        if self.action == "retrieve":
+            return ConversationDetailSerializer
+        return ConversationSerializer
+
+    def create(self, request, *args, **kwargs):
+        serializer = ConversationCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        agent = get_object_or_404(Agent, id=serializer.validated_data["agent_id"], owner=request.user)
+        conversation = Conversation.objects.create(
+            owner=request.user, agent=agent, title=serializer.validated_data["title"]
+        )
+        return Response(ConversationSerializer(conversation).data, status=status.HTTP_201_CREATED)
+
+
+def _resolve_agent(request, data):
+    """Return (agent, api_key, error_response) for a validated chat request."""
+    agent = get_object_or_404(Agent, id=data["agent_id"], owner=request.user)
+    provided_key = data.get("api_key")
+    api_key = provided_key or agent.api_key
+    if not api_key:
+        return agent, None, Response({"detail": "Agent is missing an API key."}, status=status.HTTP_400_BAD_REQUEST)
+    if not agent.store_path:
+        return agent, None, Response({"detail": "Agent has no vectorstore."}, status=status.HTTP_400_BAD_REQUEST)
+    # optionally persist a newly provided key
+    if provided_key and provided_key != agent.api_key:
+        agent.api_key = provided_key
+        agent.save(update_fields=["api_key"])
+    return agent, api_key, None
+
+
+def _build_qa(agent: Agent, api_key: str):
+    return build_qa_parts(
+        model=agent.model,
+        api_key=api_key,
+        temperature=agent.temperature,
+        max_tokens=agent.max_tokens,
+        store_path=Path(agent.store_path),
+        system_prompt=agent.system_prompt,
+        search_params=agent.search_params,
+        retrieval_mode=agent.retrieval_mode,
+        context_token_budget=agent.context_token_budget,
+    )
+
+
+def _sse(event: str, payload) -> str:
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+
+class ChatTurn:
+    """One question to an agent, from request validation to the recorded exchange.
+
+    Shared by the sync and async chat views, which differ only in how the model is
+    called (``invoke``/``stream`` or ``ainvoke``/``astream``, with ``retrieve`` or
+    ``aretrieve``). The other steps are sync; async views run ``resolve`` and
+    ``record`` through ``sync_to_async`` and ``load`` in the CPU pool.
+    """
+
+    def __init__(self, agent: Agent, api_key: str, message: str, conversation=None):
+        self.agent = agent
+        self.api_key = api_key
+        self.message = message
+        self.conversation = conversation
+        self.qa = None
+        self.cache = None
+        self.query_vector = None
+        self.history = History()
+        self.query = message
+        self.docs: List[Document] = []
+        self.sources: List[dict] = []
+
+    @classmethod
+    def resolve(cls, request, data):
+        """Return (turn, error_response) for a validated chat request.
+
+        Raises ``Http404`` for an unknown agent or conversation (the conversation
+        must be the user's, with this agent; without one the chat is one-off).
+        """
+        agent, api_key, error = _resolve_agent(request, data)
+        if error is not None:
+            return None, error
+        conversation = None
+        if data.get("conversation_id"):
+            conversation = get_object_or_404(Conversation, id=data["conversation_id"], owner=request.user, agent=agent)
+        return cls(agent, api_key, data["message"], conversation), None
+
+    def load(self) -> None:
+        """Build the agent's QA chain and semantic cache (no database access)."""
+        self.qa = _build_qa(self.agent, self.api_key)
+        self.cache = self._semantic_cache()
+
+    def _semantic_cache(self):
+        """Return the agent's semantic answer cache, or None when it is disabled.
+
+        Answers within a conversation depend on its history, so they bypass the cache.
+        """
+        agent = self.agent
+        if not agent.semantic_cache_enabled or self.conversation is not None:
+            return None
+        fingerprint = (
+            str(agent.id),
+            store_version(Path(agent.store_path)),
+            agent.model,
+            agent.temperature,
+            agent.max_tokens,
+            hashlib.sha256(agent.system_prompt.encode("utf-8")).hexdigest(),
+            agent.retrieval_mode,
+            tuple(sorted(agent.search_params.items())),
+            agent.context_token_budget,
+        )
+        return get_semantic_cache(fingerprint, agent.semantic_cache_threshold)
+
+    def _lookup(self):
+        return self.cache.lookup(self.query_vector) if self.cache is not None else None
+
+    def _retrieved(self, docs: List[Document]) -> None:
+        self.docs = docs
+        self.sources = source_metadata(docs)
+
+    def retrieve(self):
+        """Return a semantic cache hit, or fetch the history and documents for answering."""
+        if self.cache is not None:
+            self.query_vector = embed_query(self.message)
+        hit = self._lookup()
+        if hit is None:
+            if self.conversation is not None:
+                self.history = prepare_history(self.conversation, self.qa)
+            self.query = search_query(self.qa, self.history, self.message)
+            self._retrieved(self.qa.retriever.invoke(self.query))
+        return hit
+
+    async def aretrieve(self):
+        """``retrieve`` for async views: model calls awaited, CPU-bound work in the pool."""
+        if self.cache is not None:
+            self.query_vector = await run_cpu_bound(embed_query, self.message)
+        hit = self._lookup()
+        if hit is None:
+            if self.conversation is not None:
+                self.history = await aprepare_history(self.conversation, self.qa)
+            self.query = await asearch_query(self.qa, self.history, self.message)
+            self._retrieved(await run_cpu_bound(self.qa.retriever.invoke, self.query))
+        return hit
+
+    def answer_input(self) -> dict:
+        return {"question": self.message, "docs": self.docs, "history": self.history.render()}
+
+    def record(self, answer: str) -> None:
+        """Cache the answer and append the exchange to the conversation, if any."""
+        if self.cache is not None:
+            self.cache.store(self.message, self.query_vector, {"answer": answer, "sources": self.sources})
+        if self.conversation is not None:
+            record_exchange(self.conversation, self.message, answer, self.query)
+
+    def cached_payload(self, hit: dict) -> dict:
+        return {**hit, "agent_id": str(self.agent.id), "vectorstore": self.agent.store_path, "cached": True}
+
+    def answer_payload(self, answer: str) -> dict:
+        return {
+            "answer": answer,
+            "sources": self.sources,
+            "agent_id": str(self.agent.id),
+            "vectorstore": self.agent.store_path,
+            "cached": False,
+            **self._conversation_fields(),
+        }
+
+    def _conversation_fields(self) -> dict:
+        if self.conversation is None:
+            return {}
+        return {"conversation_id": str(self.conversation.id), "search_query": self.query}
+
+    def cached_events(self, hit: dict) -> List[str]:
+        return [
+            _sse("sources", {"agent_id": str(self.agent.id), "sources": hit["sources"]}),
+            _sse("token", {"text": hit["answer"]}),
+            _sse("done", {"agent_id": str(self.agent.id), "cached": True}),
+        ]
+
+    def sources_event(self) -> str:
+        return _sse("sources", {"agent_id": str(self.agent.id), "sources": self.sources})
+
+    def done_event(self) -> str:
+        return _sse("done", {"agent_id": str(self.agent.id), "cached": False, **self._conversation_fields()})
+
+
+def _stream_response(events) -> StreamingHttpResponse:
+    response = StreamingHttpResponse(events, content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
 
 
 class ChatView(APIView):
@@ -197,35 +524,343 @@ class ChatView(APIView):
     def post(self, request):
         serializer = ChatRequestSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
+        turn, error = ChatTurn.resolve(request, serializer.validated_data)
+        if error is not None:
+            return error
+        turn.load()
+
+        try:
+            hit = turn.retrieve()
+            if hit is not None:
+                metrics.chat_requests_total.inc(endpoint="chat", outcome="cached")
+                return Response(turn.cached_payload(hit))
+            with metrics.timed("generate"):
+                answer = turn.qa.answer.invoke(turn.answer_input())
+        except Exception as exc:
+            metrics.chat_requests_total.inc(endpoint="chat", outcome="error")
+            return Response({"detail": str(exc)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        metrics.chat_requests_total.inc(endpoint="chat", outcome="answered")
+        turn.record(answer)
+        return Response(turn.answer_payload(answer))
+
+
+async def _iterate_in_thread(iterator):
+    """Yield from a sync generator, running each step in the request's sync thread.
+
+    Lets ASGI stream a sync generator event by event. If the client disconnects, the
+    generator is closed, which aborts the upstream model request.
+    """
+    done = object()
+    step = sync_to_async(next)
+    try:
+        while True:
+            item = await step(iterator, done)
+            if item is done:
+                return
+            yield item
+    finally:
+        await sync_to_async(iterator.close)()
+
+
+class ChatStreamView(ChatView):
+    """Server-sent events variant of ChatView.
+
+    Emits a ``sources`` event with the retrieved chunks, then ``token`` events as the
+    model generates, then ``done`` (or ``error``). Semantic cache hits are sent as a
+    single token.
+    """
+
+    def post(self, request):
+        serializer = ChatRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        turn, error = ChatTurn.resolve(request, serializer.validated_data)
+        if error is not None:
+            return error
+        turn.load()
+
+        events = self._events(turn)
+        if isinstance(request._request, ASGIRequest):
+            # Under ASGI Django buffers a sync iterator whole; step it from an async one instead.
+            events = _iterate_in_thread(events)
+        return _stream_response(events)
+
+    def _events(self, turn: ChatTurn):
+        try:
+            hit = turn.retrieve()
+        except Exception as exc:
+            metrics.chat_requests_total.inc(endpoint="stream", outcome="error")
+            yield _sse("error", {"detail": str(exc)})
+            return
+        if hit is not None:
+            metrics.chat_requests_total.inc(endpoint="stream", outcome="cached")
+            yield from turn.cached_events(hit)
+            return
+        yield turn.sources_event()
+
+        tokens = []
+        started = time.perf_counter()
+        stream = turn.qa.answer.stream(turn.answer_input())
+        try:
+            for token in stream:
+                tokens.append(token)
+                yield _sse("token", {"text": token})
+        except Exception as exc:
+            metrics.chat_requests_total.inc(endpoint="stream", outcome="error")
+            yield _sse("error", {"detail": str(exc)})
+            return
+        finally:
+            # The server closes this generator when the client disconnects; closing the
+            # upstream stream aborts the provider request instead of generating unseen tokens.
+            stream.close()
+            metrics.stage_seconds.observe(time.perf_counter() - started, stage="generate")
+        metrics.chat_requests_total.inc(endpoint="stream", outcome="answered")
+        turn.record("".join(tokens))
+        yield turn.done_event()
+
+
+class ChatBatchView(ChatView):
+    """Answer many questions against one agent in a single request.
+
+    Queries are embedded and searched in one batch, then the model is driven with
+    bounded concurrency; each item reports either an answer or an error.
+    """
+
+    def post(self, request):
+        serializer = ChatBatchRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
         data = serializer.validated_data
 
-        agent = get_object_or_404(Agent, id=data["agent_id"], owner=request.user)
-        provided_key = data.get("api_key")
-        api_key = provided_key or agent.api_key
-        if not api_key:
-            return Response({"detail": "Agent is missing an API key."}, status=status.HTTP_400_BAD_REQUEST)
-        if not agent.store_path:
-            return Response({"detail": "Agent has no vectorstore."}, status=status.HTTP_400_BAD_REQUEST)
-        # optionally persist a newly provided key
-        if provided_key and provided_key != agent.api_key:
-            agent.api_key = provided_key
-            agent.save(update_fields=["api_key"])
-
-        qa_chain = build_qa_chain(
-            model=agent.model,
-            api_key=api_key,
-            temperature=agent.temperature,
-            max_tokens=agent.max_tokens,
-            store_path=Path(agent.store_path),
-            system_prompt=agent.system_prompt,
-        )
+        agent, api_key, error = _resolve_agent(request, data)
+        if error is not None:
+            return error
 
+        qa = _build_qa(agent, api_key)
+        questions = data["questions"]
         try:
-            answer = qa_chain.invoke({"query": data["message"]})
+            with metrics.timed("retrieve"):
+                docs_per_question = batch_similarity_search(
+                    Path(agent.store_path),
+                    questions,
+                    search_params=agent.search_params,
+                    retrieval_mode=agent.retrieval_mode,
+                )
         except Exception as exc:
+            metrics.chat_requests_total.inc(endpoint="batch", outcome="error")
             return Response({"detail": str(exc)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-        return Response({"answer": answer, "agent_id": str(agent.id), "vectorstore": agent.store_path})
+        with metrics.timed("generate"):
+            answers = qa.answer.batch(
+                [{"question": q, "docs": docs} for q, docs in zip(questions, docs_per_question)],
+                config={"max_concurrency": settings.CHAT_BATCH_MAX_CONCURRENCY},
+                return_exceptions=True,
+            )
+        metrics.chat_requests_total.inc(endpoint="batch", outcome="answered")
+
+        results = []
+        for question, docs, answer in zip(questions, docs_per_question, answers):
+            item = {"question": question, "sources": source_metadata(docs)}
+            if isinstance(answer, Exception):
+                item["error"] = str(answer)
+            else:
+                item["answer"] = answer
+            results.append(item)
+        return Response({"agent_id": str(agent.id), "results": results})
+
+
+class AsyncChatView(View):
+    """Async variant of ChatView for ASGI deployments (same body and response).
+
+    The provider call is awaited with ``ainvoke`` instead of holding a worker thread
+    for the whole round-trip; query embedding, index loads and search run in the
+    bounded ``ASYNC_CPU_WORKERS`` pool and database access goes through
+    ``sync_to_async``. Authentication is the same JWT bearer token as the DRF views.
+    """
+
+    http_method_names = ["post"]
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # Token-authenticated like the DRF views, which are CSRF-exempt too.
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def post(self, request):
+        turn = await self._prepare(request)
+        if isinstance(turn, HttpResponse):
+            return turn
+
+        try:
+            hit = await turn.aretrieve()
+            if hit is not None:
+                metrics.chat_requests_total.inc(endpoint="async", outcome="cached")
+                return JsonResponse(turn.cached_payload(hit))
+            with metrics.timed("generate"):
+                answer = await turn.qa.answer.ainvoke(turn.answer_input())
+        except Exception as exc:
+            metrics.chat_requests_total.inc(endpoint="async", outcome="error")
+            return JsonResponse({"detail": str(exc)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        metrics.chat_requests_total.inc(endpoint="async", outcome="answered")
+        await sync_to_async(turn.record)(answer)
+        return JsonResponse(turn.answer_payload(answer))
+
+    async def _prepare(self, request):
+        """Authenticate and validate the request; return a loaded ChatTurn or an error response."""
+        try:
+            auth = await sync_to_async(JWTAuthentication().authenticate)(request)
+        except exceptions.AuthenticationFailed as exc:
+            return JsonResponse({"detail": str(exc.detail)}, status=status.HTTP_401_UNAUTHORIZED)
+        if auth is None:
+            return JsonResponse(
+                {"detail": "Authentication credentials were not provided."}, status=status.HTTP_401_UNAUTHORIZED
+            )
+        request.user = auth[0]
+
+        try:
+            body = json.loads(request.body or b"{}")
+        except ValueError:
+            return JsonResponse({"detail": "Request body must be JSON."}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = ChatRequestSerializer(data=body)
+        if not serializer.is_valid():
+            return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            turn, error = await sync_to_async(ChatTurn.resolve)(request, serializer.validated_data)
+        except Http404 as exc:
+            return JsonResponse({"detail": str(exc)}, status=status.HTTP_404_NOT_FOUND)
+        if error is not None:
+            return JsonResponse(error.data, status=error.status_code)
+        # A cold chain builds provider clients and stats the store; keep it off the loop.
+        await run_cpu_bound(turn.load)
+        return turn
+
+
+class AsyncChatStreamView(AsyncChatView):
+    """Async variant of ChatStreamView: the same SSE events, fed by ``astream``."""
+
+    async def post(self, request):
+        turn = await self._prepare(request)
+        if isinstance(turn, HttpResponse):
+            return turn
+        return _stream_response(self._events(turn))
+
+    async def _events(self, turn: ChatTurn):
+        try:
+            hit = await turn.aretrieve()
+        except Exception as exc:
+            metrics.chat_requests_total.inc(endpoint="async_stream", outcome="error")
+            yield _sse("error", {"detail": str(exc)})
+            return
+        if hit is not None:
+            metrics.chat_requests_total.inc(endpoint="async_stream", outcome="cached")
+            for event in turn.cached_events(hit):
+                yield event
+            return
+        yield turn.sources_event()
+
+        tokens = []
+        started = time.perf_counter()
+        stream = turn.qa.answer.astream(turn.answer_input())
+        try:
+            async for token in stream:
+                tokens.append(token)
+                yield _sse("token", {"text": token})
+        except Exception as exc:
+            metrics.chat_requests_total.inc(endpoint="async_stream", outcome="error")
+            yield _sse("error", {"detail": str(exc)})
+            return
+        finally:
+            # Cancelled on client disconnect; closing the stream aborts the provider request.
+            await stream.aclose()
+            metrics.stage_seconds.observe(time.perf_counter() - started, stage="generate")
+        metrics.chat_requests_total.inc(endpoint="async_stream", outcome="answered")
+        await sync_to_async(turn.record)("".join(tokens))
+        yield turn.done_event()
+
+
+class SearchView(APIView):
+    """Retrieval-only search: top-k chunks with scores, without calling a model.
+
+    With ``agent_id`` one agent's store is searched in its own retrieval mode;
+    without it, every agent of the user with a knowledge base is searched
+    concurrently and the hits are merged by score (vector mode unless
+    ``retrieval_mode`` is given, so scores are comparable). No provider key is needed.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = SearchRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        if "agent_id" in data:
+            agent = get_object_or_404(Agent, id=data["agent_id"], owner=request.user)
+            if not agent.store_path:
+                return Response({"detail": "Agent has no vectorstore."}, status=status.HTTP_400_BAD_REQUEST)
+            agents = [agent]
+            mode = data.get("retrieval_mode", agent.retrieval_mode)
+            scope = "agent"
+        else:
+            agents = list(
+                Agent.objects.filter(owner=request.user)
+                .exclude(store_path="")
+                .only("id", "store_path", "search_nprobe", "search_ef_search")
+            )
+            mode = data.get("retrieval_mode", "vector")
+            scope = "all"
+
+        targets = [SearchTarget(str(agent.id), Path(agent.store_path), agent.search_params) for agent in agents]
+        with metrics.timed("retrieve"):
+            hits, errors = search_stores(targets, data["query"], k=data["k"], retrieval_mode=mode)
+        if scope == "agent" and errors:
+            metrics.search_requests_total.inc(scope=scope, outcome="error")
+            return Response({"detail": errors[targets[0].key]}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        metrics.search_requests_total.inc(scope=scope, outcome="ok")
+
+        results = [
+            {
+                "agent_id": key,
+                "score": round(score, 6),
+                "text": doc.page_content,
+                "source": source_name(doc),
+                "page": doc.metadata.get("page"),
+                "section": doc.metadata.get("section"),
+                "start_index": doc.metadata.get("start_index"),
+            }
+            for key, doc, score in hits
+        ]
+        return Response(
+            {
+                "query": data["query"],
+                "retrieval_mode": mode,
+                "agents_searched": len(targets),
+                "results": results,
+                "errors": errors,
+            }
+        )
+
+
+class MetricsView(APIView):
+    """Prometheus text-format metrics for this worker process.
+
+    Scrapers must send ``METRICS_TOKEN`` as a bearer token; with no token configured
+    the endpoint is disabled.
+    """
+
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        token = settings.METRICS_TOKEN
+        if not token:
+            return Response(
+                {"detail": "Metrics are disabled: METRICS_TOKEN is not set."}, status=status.HTTP_403_FORBIDDEN
+            )
+        supplied = request.headers.get("Authorization", "").encode()
+        if not hmac.compare_digest(supplied, f"Bearer {token}".encode()):
+            return Response({"detail": "Invalid metrics token."}, status=status.HTTP_401_UNAUTHORIZED)
+        return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 class ModelListView(APIView):
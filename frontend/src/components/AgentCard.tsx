@@ -1,14 +1,16 @@
 import React from "react";
-import { Agent } from "../types";
+import { Agent, BuildJob } from "../types";
+import BuildJobStatus from "./BuildJobStatus";
 
 type Props = {
   agent: Agent;
+  job?: BuildJob;
   onChat: (agent: Agent) => void;
   onEdit: (agent: Agent) => void;
   onDelete: (agent: Agent) => void;
 };
 
-const AgentCard: React.FC<Props> = ({ agent, onChat, onEdit, onDelete }) => {
+const AgentCard: React.FC<Props> = ({ agent, job, onChat, onEdit, onDelete }) => {
   const updated = new Date(agent.updated_at || agent.created_at);
   return (
     <div className="card p-4 space-y-3">
@@ -28,11 +30,18 @@ const AgentCard: React.FC<Props> = ({ agent, onChat, onEdit, onDelete }) => {
         </div>
       </div>
       <div className="flex items-center gap-3 text-xs text-slate-600">
-        <span className="pill-muted">{agent.documents.length} docs</span>
+        <span className="pill-muted">{agent.documents_count} docs</span>
         <span>Updated {updated.toLocaleDateString()}</span>
       </div>
+      {job && job.status !== "succeeded" && <BuildJobStatus job={job} />}
       <div className="flex gap-2">
-        <button className="btn-primary flex-1" onClick={() => onChat(agent)}>
+        {/* Chat needs a built index; during a rebuild the previous one keeps serving. */}
+        <button
+          className="btn-primary flex-1"
+          disabled={!agent.store_path}
+          title={agent.store_path ? undefined : "The knowledge base has not been built yet"}
+          onClick={() => onChat(agent)}
+        >
           Chat
         </button>
       </div>
@@ -2,12 +2,15 @@ import React, { useState } from "react";
 import {
   Agent,
   AgentSettings as AgentSettingsType,
+  BuildJob,
   ModelOption,
   UploadedDocument,
 } from "../types";
 import ModelSelector from "./ModelSelector";
 import AgentSettings from "./AgentSettings";
 import FileUploader from "./FileUploader";
+import BuildJobStatus from "./BuildJobStatus";
+import { isJobActive } from "../lib/api";
 
 type Props = {
   open: boolean;
@@ -22,8 +25,11 @@ type Props = {
   saving: boolean;
   rebuilding: boolean;
   resetting: boolean;
+  job?: BuildJob;
+  cancellingJob?: boolean;
   error: string;
   status?: string;
+  onCancelJob?: (job: BuildJob) => void;
   onClose: () => void;
   onChangeName: (val: string) => void;
   onChangeModel: (val: string) => void;
@@ -36,6 +42,9 @@ type Props = {
   onFileAdded: (doc: UploadedDocument) => void;
   onFileDeleted: (id: number) => void;
   onRefreshFiles: () => Promise<void>;
+  hasMoreFiles?: boolean;
+  loadingMoreFiles?: boolean;
+  onLoadMoreFiles?: () => void;
 };
 
 const AgentEditModal: React.FC<Props> = ({
@@ -51,8 +60,11 @@ const AgentEditModal: React.FC<Props> = ({
   saving,
   rebuilding,
   resetting,
+  job,
+  cancellingJob,
   error,
   status,
+  onCancelJob,
   onClose,
   onChangeName,
   onChangeModel,
@@ -65,10 +77,17 @@ const AgentEditModal: React.FC<Props> = ({
   onFileAdded,
   onFileDeleted,
   onRefreshFiles,
+  hasMoreFiles,
+  loadingMoreFiles,
+  onLoadMoreFiles,
 }) => {
   if (!open || !agent) return null;
   const [confirmReset, setConfirmReset] = useState(false);
   const [dangerOpen, setDangerOpen] = useState(false);
+  const building = rebuilding || (!!job && isJobActive(job));
+  // Documents are paged, so linked ones may not be loaded yet; list them first.
+  const loadedIds = new Set(documents.map((d) => d.id));
+  const choices = [...(agent.documents ?? []).filter((d) => !loadedIds.has(d.id)), ...documents];
 
   return (
     <div className="fixed inset-0 z-50 flex items-center justify-center bg-slate-900/70 px-3 py-4 md:px-4 md:py-6">
@@ -88,6 +107,8 @@ const AgentEditModal: React.FC<Props> = ({
             </button>
           </div>
 
+          {job && <BuildJobStatus job={job} cancelling={cancellingJob} onCancel={onCancelJob} />}
+
           <div className="grid gap-3 md:grid-cols-2">
             <label className="space-y-1 text-sm text-slate-700">
               Agent name
@@ -132,12 +153,12 @@ const AgentEditModal: React.FC<Props> = ({
                 <span className="pill-muted">{editDocIds.length} selected</span>
               </div>
               <div className="max-h-52 overflow-y-auto space-y-2">
-                {documents.length === 0 ? (
+                {choices.length === 0 ? (
                   <p className="text-sm text-slate-500">
                     No documents uploaded yet.
                   </p>
                 ) : (
-                  documents.map((doc) => (
+                  choices.map((doc) => (
                     <label
                       key={doc.id}
                       className="flex items-center gap-2 text-sm text-slate-700"
@@ -159,7 +180,10 @@ const AgentEditModal: React.FC<Props> = ({
                 <h4 className="text-sm font-semibold text-slate-800">
                   Manage knowledge base
                 </h4>
-                <span className="pill-muted">{documents.length} total</span>
+                <span className="pill-muted">
+                  {documents.length}
+                  {hasMoreFiles ? "+" : ""} total
+                </span>
               </div>
               <FileUploader
                 documents={documents}
@@ -172,6 +196,9 @@ const AgentEditModal: React.FC<Props> = ({
                   onFileDeleted(id);
                   onToggleDoc(id, false);
                 }}
+                hasMore={hasMoreFiles}
+                loadingMore={loadingMoreFiles}
+                onLoadMore={onLoadMoreFiles}
               />
             </div>
           </div>
@@ -207,11 +234,11 @@ const AgentEditModal: React.FC<Props> = ({
                 <div className="flex flex-col gap-2 md:flex-row md:justify-end md:items-center">
                   <button
                     className="btn-ghost md:min-w-[140px]"
-                    disabled={rebuilding || editDocIds.length === 0}
+                    disabled={building || editDocIds.length === 0}
                     onClick={onRebuild}
                     title="Rebuild vectorstore using selected documents"
                   >
-                    {rebuilding ? "Rebuilding..." : "Rebuild KB"}
+                    {building ? "Rebuilding..." : "Rebuild KB"}
                   </button>
                   <button
                     className="btn-ghost md:min-w-[140px] text-rose-600"
@@ -226,12 +253,10 @@ const AgentEditModal: React.FC<Props> = ({
                 {status && (
                   <div className="text-sm text-emerald-700">{status}</div>
                 )}
-                {(rebuilding || resetting) && (
+                {resetting && (
                   <div className="w-full">
                     <div className="mb-1 text-xs text-slate-600">
-                      {rebuilding
-                        ? "Rebuilding knowledge base…"
-                        : "Resetting knowledge base…"}
+                      Resetting knowledge base…
                     </div>
                     <div className="h-2 w-full overflow-hidden rounded-full bg-slate-200">
                       <div className="h-full w-1/3 animate-pulse rounded-full bg-accent" />
@@ -0,0 +1,54 @@
+import React from "react";
+import { isJobActive } from "../lib/api";
+import { BuildJob } from "../types";
+
+type Props = {
+  job: BuildJob;
+  cancelling?: boolean;
+  onCancel?: (job: BuildJob) => void;
+};
+
+const stageLabels: Record<BuildJob["stage"], string> = {
+  "": "",
+  parse: "Parsing documents",
+  split: "Splitting",
+  embed: "Embedding",
+  save: "Saving index",
+};
+
+const BuildJobStatus: React.FC<Props> = ({ job, cancelling, onCancel }) => {
+  if (job.status === "succeeded") {
+    return <div className="text-sm text-emerald-700">Knowledge base built successfully.</div>;
+  }
+  if (job.status === "failed") {
+    return <div className="text-sm text-rose-600">Knowledge base build failed{job.error ? `: ${job.error}` : "."}</div>;
+  }
+  if (job.status === "cancelled") {
+    return <div className="text-sm text-slate-600">Knowledge base build cancelled.</div>;
+  }
+
+  const label =
+    job.status === "queued"
+      ? "Waiting to build knowledge base…"
+      : `${stageLabels[job.stage] || "Building knowledge base"}… ${Math.round(job.progress * 100)}%`;
+  return (
+    <div className="w-full space-y-1">
+      <div className="flex items-center justify-between gap-2 text-xs text-slate-600">
+        <span>{job.cancel_requested ? "Cancelling…" : label}</span>
+        {onCancel && isJobActive(job) && !job.cancel_requested && (
+          <button className="btn-ghost text-xs text-rose-600" disabled={cancelling} onClick={() => onCancel(job)}>
+            {cancelling ? "Cancelling..." : "Cancel build"}
+          </button>
+        )}
+      </div>
+      <div className="h-2 w-full overflow-hidden rounded-full bg-slate-200">
+        <div
+          className={`h-full rounded-full bg-accent ${job.status === "queued" ? "w-1/3 animate-pulse" : ""}`}
+          style={job.status === "running" ? { width: `${Math.max(job.progress * 100, 5)}%` } : undefined}
+        />
+      </div>
+    </div>
+  );
+};
+
+export default BuildJobStatus;
@@ -1,15 +1,28 @@
 import React, { useRef, useState } from "react";
 import { UploadedDocument } from "../types";
 import { uploadFile, deleteDocument } from "../lib/api";
+import LoadMoreButton from "./LoadMoreButton";
 
 type Props = {
   documents: UploadedDocument[];
   onUploaded: (doc: UploadedDocument) => void;
   onRefresh?: () => Promise<void>;
   onDeleted?: (id: number) => void;
+  // Set when `documents` is one page of a longer list.
+  hasMore?: boolean;
+  loadingMore?: boolean;
+  onLoadMore?: () => void;
 };
 
-const FileUploader: React.FC<Props> = ({ documents, onUploaded, onRefresh, onDeleted }) => {
+const FileUploader: React.FC<Props> = ({
+  documents,
+  onUploaded,
+  onRefresh,
+  onDeleted,
+  hasMore = false,
+  loadingMore = false,
+  onLoadMore,
+}) => {
   const inputRef = useRef<HTMLInputElement | null>(null);
   const [uploading, setUploading] = useState(false);
   const [error, setError] = useState("");
@@ -71,7 +84,10 @@ const FileUploader: React.FC<Props> = ({ documents, onUploaded, onRefresh, onDel
           <p className="text-xs uppercase tracking-[0.2em] text-slate-500">Knowledge Base</p>
           <p className="text-sm text-slate-600">PDF, TXT, DOCX are supported. Multi-select enabled.</p>
         </div>
-        <span className="pill">{documents.length} file{documents.length === 1 ? "" : "s"}</span>
+        <span className="pill">
+          {documents.length}
+          {hasMore ? "+" : ""} file{documents.length === 1 && !hasMore ? "" : "s"}
+        </span>
       </div>
       <input
         ref={inputRef}
@@ -121,6 +137,7 @@ const FileUploader: React.FC<Props> = ({ documents, onUploaded, onRefresh, onDel
             ))}
           </ul>
         )}
+        {onLoadMore && <LoadMoreButton hasMore={hasMore} loading={loadingMore} onLoadMore={onLoadMore} />}
       </div>
     </div>
   );
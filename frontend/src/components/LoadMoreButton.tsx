@@ -0,0 +1,19 @@
+import React from "react";
+
+type Props = {
+  hasMore: boolean;
+  loading: boolean;
+  onLoadMore: () => void;
+  label?: string;
+};
+
+const LoadMoreButton: React.FC<Props> = ({ hasMore, loading, onLoadMore, label = "Load more" }) => {
+  if (!hasMore) return null;
+  return (
+    <button className="btn-ghost w-full text-sm" disabled={loading} onClick={onLoadMore}>
+      {loading ? "Loading..." : label}
+    </button>
+  );
+};
+
+export default LoadMoreButton;
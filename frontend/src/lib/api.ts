@@ -1,5 +1,25 @@
 import { http } from "./http";
-import { Agent, ModelOption, UploadedDocument } from "../types";
+import { Agent, BuildJob, ModelOption, Page, UploadedDocument } from "../types";
+
+const PAGE_SIZE = 50;
+
+export type PageResult<T> = { results: T[]; cursor: string | null };
+
+// Fetch one page; `cursor` (from a previous page) selects the next one. Only the cursor is
+// taken from `next`, so requests keep going through the same base URL (and dev proxy).
+const fetchPage = async <T>(
+  url: string,
+  params: Record<string, string | number> = {},
+  cursor: string | null = null
+): Promise<PageResult<T>> => {
+  const res = await http.get<Page<T>>(url, {
+    params: { page_size: PAGE_SIZE, ...params, ...(cursor ? { cursor } : {}) },
+  });
+  return {
+    results: res.data.results,
+    cursor: res.data.next ? new URL(res.data.next, window.location.origin).searchParams.get("cursor") : null,
+  };
+};
 
 export const register = async (username: string, password: string, email?: string) => {
   const res = await http.post("/auth/register", { username, password, email });
@@ -26,10 +46,8 @@ export const fetchModels = async (): Promise<ModelOption[]> => {
   return res.data;
 };
 
-export const fetchDocuments = async (): Promise<UploadedDocument[]> => {
-  const res = await http.get("/documents/");
-  return res.data;
-};
+export const fetchDocuments = (cursor: string | null = null): Promise<PageResult<UploadedDocument>> =>
+  fetchPage<UploadedDocument>("/documents/", {}, cursor);
 
 export const uploadFile = async (file: File): Promise<UploadedDocument> => {
   const form = new FormData();
@@ -44,10 +62,11 @@ export const deleteDocument = async (id: number) => {
   await http.delete(`/documents/${id}/`);
 };
 
-export const fetchAgents = async (): Promise<Agent[]> => {
-  const res = await http.get("/agents/");
-  return res.data;
-};
+export const fetchAgents = (
+  cursor: string | null = null,
+  options: { withDocuments?: boolean } = {}
+): Promise<PageResult<Agent>> =>
+  fetchPage<Agent>("/agents/", options.withDocuments === false ? { omit: "documents" } : {}, cursor);
 
 export const rebuildAgent = async (id: string): Promise<Agent> => {
   const res = await http.post(`/agents/${id}/rebuild/`);
@@ -59,6 +78,53 @@ export const resetAgentKb = async (id: string): Promise<Agent> => {
   return res.data;
 };
 
+export const fetchJob = async (id: string): Promise<BuildJob> => {
+  const res = await http.get(`/jobs/${id}/`);
+  return res.data;
+};
+
+export const cancelJob = async (id: string): Promise<BuildJob> => {
+  const res = await http.post(`/jobs/${id}/cancel/`);
+  return res.data;
+};
+
+export const fetchAgent = async (id: string): Promise<Agent> => {
+  const res = await http.get(`/agents/${id}/`);
+  return res.data;
+};
+
+// Most recent first.
+export const fetchAgentJobs = async (id: string): Promise<BuildJob[]> => {
+  const res = await http.get(`/agents/${id}/jobs/`);
+  return res.data;
+};
+
+const JOB_POLL_INTERVAL_MS = 1500;
+
+export const isJobActive = (job: BuildJob) => job.status === "queued" || job.status === "running";
+
+// Poll a build job until it finishes, reporting every update. Returns a function that stops polling.
+export const watchJob = (id: string, onUpdate: (job: BuildJob) => void): (() => void) => {
+  let stopped = false;
+  let timer: number | undefined;
+  const poll = async () => {
+    try {
+      const job = await fetchJob(id);
+      if (stopped) return;
+      onUpdate(job);
+      if (!isJobActive(job)) return;
+    } catch (err) {
+      console.error(err);
+    }
+    if (!stopped) timer = window.setTimeout(poll, JOB_POLL_INTERVAL_MS);
+  };
+  poll();
+  return () => {
+    stopped = true;
+    window.clearTimeout(timer);
+  };
+};
+
 export const deleteAgent = async (id: string) => {
   await http.delete(`/agents/${id}/`);
 };
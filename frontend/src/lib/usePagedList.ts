@@ -0,0 +1,33 @@
+import { useCallback, useState } from "react";
+import { PageResult } from "./api";
+
+// A cursor-paginated list: `reload` fetches (and returns) the first page, `loadMore` appends the next.
+// `fetchPage` must be stable (a module-level function or memoized callback).
+export const usePagedList = <T>(fetchPage: (cursor: string | null) => Promise<PageResult<T>>) => {
+  const [items, setItems] = useState<T[]>([]);
+  const [cursor, setCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+
+  const reload = useCallback(async (): Promise<T[]> => {
+    const page = await fetchPage(null);
+    setItems(page.results);
+    setCursor(page.cursor);
+    return page.results;
+  }, [fetchPage]);
+
+  const loadMore = useCallback(async () => {
+    if (!cursor) return;
+    setLoadingMore(true);
+    try {
+      const page = await fetchPage(cursor);
+      setItems((prev) => [...prev, ...page.results]);
+      setCursor(page.cursor);
+    } catch (err) {
+      console.error(err);
+    } finally {
+      setLoadingMore(false);
+    }
+  }, [fetchPage, cursor]);
+
+  return { items, setItems, hasMore: cursor !== null, loadingMore, reload, loadMore };
+};
@@ -1,18 +1,25 @@
-import React, { useEffect, useMemo, useState } from "react";
+import React, { useCallback, useEffect, useMemo, useRef, useState } from "react";
 import { useNavigate } from "react-router-dom";
 import AgentCard from "../components/AgentCard";
 import AgentEditModal from "../components/AgentEditModal";
+import LoadMoreButton from "../components/LoadMoreButton";
 import {
+  cancelJob,
+  fetchAgent,
+  fetchAgentJobs,
   fetchAgents,
   fetchDocuments,
   fetchModels,
+  isJobActive,
   updateAgent,
   deleteAgent,
   rebuildAgent,
   resetAgentKb,
+  watchJob,
 } from "../lib/api";
 import { extractError } from "../lib/errors";
-import { Agent, AgentSettings as AgentSettingsType, ModelOption, UploadedDocument } from "../types";
+import { usePagedList } from "../lib/usePagedList";
+import { Agent, AgentSettings as AgentSettingsType, BuildJob, ModelOption } from "../types";
 
 const defaultSettings: AgentSettingsType = {
   temperature: 0.2,
@@ -22,8 +29,22 @@ const defaultSettings: AgentSettingsType = {
 
 const AgentsPage: React.FC = () => {
   const navigate = useNavigate();
-  const [agents, setAgents] = useState<Agent[]>([]);
-  const [documents, setDocuments] = useState<UploadedDocument[]>([]);
+  const {
+    items: agents,
+    setItems: setAgents,
+    hasMore: hasMoreAgents,
+    loadingMore: loadingMoreAgents,
+    reload: reloadAgents,
+    loadMore: loadMoreAgents,
+  } = usePagedList(fetchAgents);
+  const {
+    items: documents,
+    setItems: setDocuments,
+    hasMore: hasMoreDocuments,
+    loadingMore: loadingMoreDocuments,
+    reload: reloadDocuments,
+    loadMore: loadMoreDocuments,
+  } = usePagedList(fetchDocuments);
   const [models, setModels] = useState<ModelOption[]>([]);
   const [loading, setLoading] = useState(true);
   const [search, setSearch] = useState("");
@@ -41,14 +62,46 @@ const AgentsPage: React.FC = () => {
   const [rebuilding, setRebuilding] = useState(false);
   const [resetting, setResetting] = useState(false);
   const [rebuildStatus, setRebuildStatus] = useState("");
+  // Latest build job per agent id, polled until it finishes.
+  const [jobs, setJobs] = useState<Record<string, BuildJob>>({});
+  const [cancellingJob, setCancellingJob] = useState(false);
+  const watchers = useRef<Record<string, () => void>>({});
+
+  const replaceAgent = (updated: Agent) => {
+    setAgents((prev) => prev.map((a) => (a.id === updated.id ? updated : a)));
+    setCurrentAgent((prev) => (prev?.id === updated.id ? updated : prev));
+  };
+
+  const stopWatching = (agentId: string) => {
+    watchers.current[agentId]?.();
+    delete watchers.current[agentId];
+  };
+
+  const trackJob = useCallback((job: BuildJob) => {
+    watchers.current[job.agent]?.();
+    setJobs((prev) => ({ ...prev, [job.agent]: job }));
+    watchers.current[job.agent] = watchJob(job.id, (update) => {
+      setJobs((prev) => ({ ...prev, [update.agent]: update }));
+      if (update.status === "succeeded") {
+        // The new index is live: refresh store_path so chat is enabled.
+        fetchAgent(update.agent).then(replaceAgent).catch(console.error);
+      }
+    });
+  }, []);
 
   useEffect(() => {
     const load = async () => {
       try {
-        const [agentList, docs, modelList] = await Promise.all([fetchAgents(), fetchDocuments(), fetchModels()]);
-        setAgents(agentList);
-        setDocuments(docs);
+        const [agentList, , modelList] = await Promise.all([reloadAgents(), reloadDocuments(), fetchModels()]);
         setModels(modelList);
+        // Agents with documents but no index yet are most likely still building.
+        agentList
+          .filter((a) => !a.store_path && a.documents_count > 0)
+          .forEach((a) =>
+            fetchAgentJobs(a.id)
+              .then(([latest]) => latest && trackJob(latest))
+              .catch(console.error)
+          );
       } catch (err) {
         console.error(err);
       } finally {
@@ -56,7 +109,8 @@ const AgentsPage: React.FC = () => {
       }
     };
     load();
-  }, []);
+    return () => Object.values(watchers.current).forEach((stop) => stop());
+  }, [trackJob, reloadAgents, reloadDocuments]);
 
   const filtered = useMemo(
     () => agents.filter((a) => a.name.toLowerCase().includes(search.toLowerCase())),
@@ -68,14 +122,20 @@ const AgentsPage: React.FC = () => {
     setEditName(agent.name);
     setEditModel(agent.model);
     setEditApiKey(agent.api_key || "");
-    setEditDocIds(agent.documents.map((d) => d.id));
+    setEditDocIds((agent.documents ?? []).map((d) => d.id));
     setEditSettings({
       temperature: agent.temperature,
       maxTokens: agent.max_tokens,
       systemPrompt: agent.system_prompt,
     });
     setEditError("");
+    setRebuildStatus("");
     setShowEdit(true);
+    if (!jobs[agent.id]) {
+      fetchAgentJobs(agent.id)
+        .then(([latest]) => latest && isJobActive(latest) && trackJob(latest))
+        .catch(console.error);
+    }
   };
 
   const saveEdit = async () => {
@@ -94,6 +154,8 @@ const AgentsPage: React.FC = () => {
       });
       setAgents((prev) => [updated, ...prev.filter((a) => a.id !== updated.id)]);
       setCurrentAgent(updated);
+      // Changing documents or index settings starts a rebuild.
+      if (updated.job) trackJob(updated.job);
       setShowEdit(false);
     } catch (err: any) {
       setEditError(extractError(err, "Failed to update agent"));
@@ -111,7 +173,8 @@ const AgentsPage: React.FC = () => {
       const updated = await rebuildAgent(currentAgent.id);
       setAgents((prev) => [updated, ...prev.filter((a) => a.id !== updated.id)]);
       setCurrentAgent(updated);
-      setRebuildStatus("Knowledge base rebuilt successfully.");
+      // 202 Accepted: the build runs in the background; progress is polled from the job.
+      if (updated.job) trackJob(updated.job);
     } catch (err: any) {
       setEditError(extractError(err, "Failed to rebuild knowledge base"));
     } finally {
@@ -119,6 +182,18 @@ const AgentsPage: React.FC = () => {
     }
   };
 
+  const cancelBuild = async (job: BuildJob) => {
+    setCancellingJob(true);
+    try {
+      const updated = await cancelJob(job.id);
+      setJobs((prev) => ({ ...prev, [updated.agent]: updated }));
+    } catch (err: any) {
+      setEditError(extractError(err, "Failed to cancel build"));
+    } finally {
+      setCancellingJob(false);
+    }
+  };
+
   const resetKb = async () => {
     if (!currentAgent) return;
     setResetting(true);
@@ -126,6 +201,12 @@ const AgentsPage: React.FC = () => {
     setRebuildStatus("");
     try {
       const updated = await resetAgentKb(currentAgent.id);
+      stopWatching(updated.id);
+      setJobs((prev) => {
+        const next = { ...prev };
+        delete next[updated.id];
+        return next;
+      });
       setAgents((prev) => [updated, ...prev.filter((a) => a.id !== updated.id)]);
       setCurrentAgent(updated);
       setEditDocIds([]);
@@ -167,6 +248,7 @@ const AgentsPage: React.FC = () => {
             <AgentCard
               key={agent.id}
               agent={agent}
+              job={jobs[agent.id]}
               onChat={() => navigate("/workspace")}
               onEdit={openEdit}
               onDelete={(a) => {
@@ -177,6 +259,14 @@ const AgentsPage: React.FC = () => {
           ))}
         </div>
       )}
+      {!loading && (
+        <LoadMoreButton
+          hasMore={hasMoreAgents}
+          loading={loadingMoreAgents}
+          onLoadMore={loadMoreAgents}
+          label="Load more agents"
+        />
+      )}
 
       <AgentEditModal
         open={showEdit}
@@ -191,6 +281,9 @@ const AgentsPage: React.FC = () => {
         saving={saving}
         rebuilding={rebuilding}
         resetting={resetting}
+        job={currentAgent ? jobs[currentAgent.id] : undefined}
+        cancellingJob={cancellingJob}
+        onCancelJob={cancelBuild}
         error={editError}
         status={rebuildStatus}
         onClose={() => setShowEdit(false)}
@@ -204,12 +297,14 @@ const AgentsPage: React.FC = () => {
         onSave={saveEdit}
         onRebuild={rebuildKb}
         onReset={resetKb}
-        onFileAdded={(doc) => setDocuments((prev) => [...prev, doc])}
+        onFileAdded={(doc) => setDocuments((prev) => [doc, ...prev])}
         onFileDeleted={(id) => setDocuments((prev) => prev.filter((d) => d.id !== id))}
         onRefreshFiles={async () => {
-          const docs = await fetchDocuments();
-          setDocuments(docs);
+          await reloadDocuments();
         }}
+        hasMoreFiles={hasMoreDocuments}
+        loadingMoreFiles={loadingMoreDocuments}
+        onLoadMoreFiles={loadMoreDocuments}
       />
 
       {showDelete && pendingDelete && (
@@ -236,6 +331,7 @@ const AgentsPage: React.FC = () => {
                   if (!pendingDelete) return;
                   try {
                     await deleteAgent(pendingDelete.id);
+                    stopWatching(pendingDelete.id);
                     setAgents((prev) => prev.filter((p) => p.id !== pendingDelete.id));
                     if (currentAgent?.id === pendingDelete.id) {
                       setCurrentAgent(null);
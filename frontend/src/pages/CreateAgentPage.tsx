@@ -1,12 +1,15 @@
-import React, { useEffect, useMemo, useState } from "react";
+import React, { useEffect, useMemo, useRef, useState } from "react";
 import { useNavigate } from "react-router-dom";
 import ModelSelector from "../components/ModelSelector";
 import AgentSettings from "../components/AgentSettings";
 import FileUploader from "../components/FileUploader";
 import Stepper from "../components/Stepper";
-import { createAgent, fetchDocuments, fetchModels } from "../lib/api";
+import BuildJobStatus from "../components/BuildJobStatus";
+import LoadMoreButton from "../components/LoadMoreButton";
+import { cancelJob, createAgent, fetchDocuments, fetchModels, watchJob } from "../lib/api";
 import { extractError } from "../lib/errors";
-import { AgentSettings as AgentSettingsType, ModelOption, UploadedDocument } from "../types";
+import { usePagedList } from "../lib/usePagedList";
+import { AgentSettings as AgentSettingsType, BuildJob, ModelOption } from "../types";
 
 const defaultSettings: AgentSettingsType = {
   temperature: 0.2,
@@ -27,7 +30,14 @@ const CreateAgentPage: React.FC = () => {
   const [saveKey, setSaveKey] = useState(true);
   const [settings, setSettings] = useState<AgentSettingsType>(defaultSettings);
   const [models, setModels] = useState<ModelOption[]>([]);
-  const [documents, setDocuments] = useState<UploadedDocument[]>([]);
+  const {
+    items: documents,
+    setItems: setDocuments,
+    hasMore: hasMoreDocs,
+    loadingMore: loadingMoreDocs,
+    reload: reloadDocuments,
+    loadMore: loadMoreDocs,
+  } = usePagedList(fetchDocuments);
   const [docSearch, setDocSearch] = useState("");
   const [selectedDocIds, setSelectedDocIds] = useState<number[]>([]);
   const [loadingModels, setLoadingModels] = useState(false);
@@ -35,15 +45,20 @@ const CreateAgentPage: React.FC = () => {
   const [creating, setCreating] = useState(false);
   const [status, setStatus] = useState("");
   const [error, setError] = useState("");
+  // Build of the created agent's knowledge base; chat opens once it has succeeded.
+  const [job, setJob] = useState<BuildJob | null>(null);
+  const [cancellingJob, setCancellingJob] = useState(false);
+  const stopWatching = useRef<(() => void) | null>(null);
+
+  useEffect(() => () => stopWatching.current?.(), []);
 
   useEffect(() => {
     const load = async () => {
       setLoadingModels(true);
       setLoadingDocs(true);
       try {
-        const [modelList, docs] = await Promise.all([fetchModels(), fetchDocuments()]);
+        const [modelList] = await Promise.all([fetchModels(), reloadDocuments()]);
         setModels(modelList);
-        setDocuments(docs);
       } catch (err) {
         console.error(err);
       } finally {
@@ -52,7 +67,7 @@ const CreateAgentPage: React.FC = () => {
       }
     };
     load();
-  }, []);
+  }, [reloadDocuments]);
 
   const filteredModels = useMemo(() => {
     if (providerFilter === "all") return models;
@@ -73,7 +88,7 @@ const CreateAgentPage: React.FC = () => {
     setError("");
     setStatus("");
     try {
-      await createAgent({
+      const agent = await createAgent({
         name,
         model,
         apiKey,
@@ -82,7 +97,12 @@ const CreateAgentPage: React.FC = () => {
         systemPrompt: settings.systemPrompt,
         documentIds: selectedDocIds,
       });
-      setStatus("Agent created successfully.");
+      setStatus("Agent created.");
+      if (agent.job) {
+        setJob(agent.job);
+        stopWatching.current?.();
+        stopWatching.current = watchJob(agent.job.id, setJob);
+      }
     } catch (err: any) {
       setError(extractError(err, "Failed to create agent"));
     } finally {
@@ -90,7 +110,21 @@ const CreateAgentPage: React.FC = () => {
     }
   };
 
+  const cancelBuild = async (current: BuildJob) => {
+    setCancellingJob(true);
+    try {
+      setJob(await cancelJob(current.id));
+    } catch (err: any) {
+      setError(extractError(err, "Failed to cancel build"));
+    } finally {
+      setCancellingJob(false);
+    }
+  };
+
   const reset = () => {
+    stopWatching.current?.();
+    stopWatching.current = null;
+    setJob(null);
     setStep(1);
     setName("My Agent");
     setModel("");
@@ -113,8 +147,18 @@ const CreateAgentPage: React.FC = () => {
       {status && (
         <div className="rounded-xl border border-emerald-200 bg-emerald-50 px-4 py-3 text-sm text-emerald-800">
           {status}
+          {job && (
+            <div className="mt-2">
+              <BuildJobStatus job={job} cancelling={cancellingJob} onCancel={cancelBuild} />
+            </div>
+          )}
           <div className="mt-2 flex flex-wrap gap-2">
-            <button className="btn-primary" onClick={() => navigate("/workspace")}>
+            <button
+              className="btn-primary"
+              disabled={job?.status !== "succeeded"}
+              title={job?.status === "succeeded" ? undefined : "Available once the knowledge base is built"}
+              onClick={() => navigate("/workspace")}
+            >
               Go to Chat
             </button>
             <button className="btn-ghost" onClick={reset}>
@@ -219,14 +263,13 @@ const CreateAgentPage: React.FC = () => {
               <FileUploader
                 documents={documents}
                 onUploaded={(doc) => {
-                  setDocuments((prev) => [...prev, doc]);
+                  setDocuments((prev) => [doc, ...prev]);
                   setSelectedDocIds((prev) => [...prev, doc.id]);
                 }}
                 onRefresh={async () => {
                   setLoadingDocs(true);
                   try {
-                    const docs = await fetchDocuments();
-                    setDocuments(docs);
+                    await reloadDocuments();
                   } finally {
                     setLoadingDocs(false);
                   }
@@ -264,6 +307,9 @@ const CreateAgentPage: React.FC = () => {
                       </button>
                     ))
                   )}
+                  {!loadingDocs && (
+                    <LoadMoreButton hasMore={hasMoreDocs} loading={loadingMoreDocs} onLoadMore={loadMoreDocs} />
+                  )}
                 </div>
               </div>
             </div>
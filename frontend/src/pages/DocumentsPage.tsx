@@ -1,10 +1,17 @@
 import React, { useEffect, useState } from "react";
 import FileUploader from "../components/FileUploader";
-import { fetchDocuments, uploadFile, deleteDocument } from "../lib/api";
-import { UploadedDocument } from "../types";
+import { fetchDocuments } from "../lib/api";
+import { usePagedList } from "../lib/usePagedList";
 
 const DocumentsPage: React.FC = () => {
-  const [documents, setDocuments] = useState<UploadedDocument[]>([]);
+  const {
+    items: documents,
+    setItems: setDocuments,
+    hasMore,
+    loadingMore,
+    reload,
+    loadMore,
+  } = usePagedList(fetchDocuments);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState("");
 
@@ -13,8 +20,7 @@ const DocumentsPage: React.FC = () => {
       setLoading(true);
       setError("");
       try {
-        const docs = await fetchDocuments();
-        setDocuments(docs);
+        await reload();
       } catch (err: any) {
         setError(err?.response?.data?.detail || "Failed to load documents");
       } finally {
@@ -22,7 +28,7 @@ const DocumentsPage: React.FC = () => {
       }
     };
     load();
-  }, []);
+  }, [reload]);
 
   return (
     <div className="mx-auto max-w-6xl space-y-4 px-4 py-6">
@@ -41,12 +47,14 @@ const DocumentsPage: React.FC = () => {
       ) : (
         <FileUploader
           documents={documents}
-          onUploaded={(doc) => setDocuments((prev) => [...prev, doc])}
+          onUploaded={(doc) => setDocuments((prev) => [doc, ...prev])}
           onRefresh={async () => {
-            const docs = await fetchDocuments();
-            setDocuments(docs);
+            await reload();
           }}
           onDeleted={(id) => setDocuments((prev) => prev.filter((d) => d.id !== id))}
+          hasMore={hasMore}
+          loadingMore={loadingMore}
+          onLoadMore={loadMore}
         />
       )}
     </div>
@@ -1,9 +1,14 @@
 import React, { useEffect, useState } from "react";
 import ChatWindow from "../components/ChatWindow";
+import LoadMoreButton from "../components/LoadMoreButton";
 import { fetchAgents, fetchModels, fetchMe, sendChat } from "../lib/api";
 import { setAuthToken } from "../lib/http";
+import { usePagedList } from "../lib/usePagedList";
 import { Agent, ModelOption } from "../types";
 
+// The picker only needs names and settings, not each agent's documents.
+const fetchChatAgents = (cursor: string | null) => fetchAgents(cursor, { withDocuments: false });
+
 type Props = {
   token: string;
   onLogout: () => void;
@@ -12,7 +17,7 @@ type Props = {
 const WorkspacePage: React.FC<Props> = ({ token, onLogout }) => {
   const [loadingBootstrap, setLoadingBootstrap] = useState(true);
   const [models, setModels] = useState<ModelOption[]>([]);
-  const [agents, setAgents] = useState<Agent[]>([]);
+  const { items: agents, hasMore, loadingMore, reload: reloadAgents, loadMore } = usePagedList(fetchChatAgents);
   const [currentAgent, setCurrentAgent] = useState<Agent | null>(null);
 
   useEffect(() => {
@@ -20,9 +25,8 @@ const WorkspacePage: React.FC<Props> = ({ token, onLogout }) => {
     const bootstrap = async () => {
       try {
         await fetchMe();
-        const [modelList, agentList] = await Promise.all([fetchModels(), fetchAgents()]);
+        const [modelList, agentList] = await Promise.all([fetchModels(), reloadAgents()]);
         setModels(modelList);
-        setAgents(agentList);
         setCurrentAgent(agentList[0] || null);
       } catch (err) {
         console.error(err);
@@ -32,7 +36,7 @@ const WorkspacePage: React.FC<Props> = ({ token, onLogout }) => {
       }
     };
     bootstrap();
-  }, [token, onLogout]);
+  }, [token, onLogout, reloadAgents]);
 
   const handleSend = async (message: string) => {
     if (!currentAgent) {
@@ -73,10 +77,11 @@ const WorkspacePage: React.FC<Props> = ({ token, onLogout }) => {
                   <option value="">Select agent</option>
                   {agents.map((a) => (
                     <option key={a.id} value={a.id}>
-                      {a.name}
+                      {a.store_path ? a.name : `${a.name} (building)`}
                     </option>
                   ))}
                 </select>
+                <LoadMoreButton hasMore={hasMore} loading={loadingMore} onLoadMore={loadMore} label="More agents" />
               </div>
             </div>
           </div>
@@ -86,11 +91,17 @@ const WorkspacePage: React.FC<Props> = ({ token, onLogout }) => {
             modelLabel={
               currentAgent ? models.find((m) => m.id === currentAgent.model)?.label || currentAgent.model : ""
             }
-            docCount={currentAgent ? currentAgent.documents.length : 0}
+            docCount={currentAgent ? currentAgent.documents_count : 0}
             systemPrompt={currentAgent ? currentAgent.system_prompt : ""}
             temperature={currentAgent ? currentAgent.temperature : 0.2}
-            agentReady={!!currentAgent}
-            agentError={!currentAgent ? "Create/select an agent first." : ""}
+            agentReady={!!currentAgent?.store_path}
+            agentError={
+              !currentAgent
+                ? "Create/select an agent first."
+                : !currentAgent.store_path
+                  ? "This agent's knowledge base is still building. Check its progress on the Agents page."
+                  : ""
+            }
           />
         </div>
       </div>
@@ -4,6 +4,7 @@ export type UploadedDocument = {
   id: number;
   name: string;
   file: string;
+  sha256: string;
   created_at: string;
 };
 
@@ -13,6 +14,19 @@ export type AgentSettings = {
   systemPrompt: string;
 };
 
+export type BuildJob = {
+  id: string;
+  agent: string;
+  status: "queued" | "running" | "succeeded" | "failed" | "cancelled";
+  stage: "" | "parse" | "split" | "embed" | "save";
+  progress: number;
+  error: string;
+  cancel_requested: boolean;
+  created_at: string;
+  started_at: string | null;
+  finished_at: string | null;
+};
+
 export type Agent = {
   id: string;
   name: string;
@@ -22,9 +36,18 @@ export type Agent = {
   system_prompt: string;
   api_key: string;
   store_path: string;
-  documents: UploadedDocument[];
+  // Omitted when listed with `omit=documents`; documents_count is always present.
+  documents?: UploadedDocument[];
+  documents_count: number;
   created_at: string;
   updated_at: string;
+  job?: BuildJob;
+};
+
+export type Page<T> = {
+  next: string | null;
+  previous: string | null;
+  results: T[];
 };
 
 export type ChatMessage = {